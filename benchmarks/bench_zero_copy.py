@@ -0,0 +1,70 @@
+# benchmarks/bench_zero_copy.py
+
+# Compares the old copy-heavy note paths with the buffer-oriented ones:
+#
+#   load + decrypt:  f.read() + three slices  vs  load_note_view (mmap) + memoryview slices
+#   encrypt + save:  salt + nonce + ciphertext concatenation + write  vs  header/body writev
+#
+# tracemalloc's peak is used as the measure of bytes copied through Python
+# buffers: the ciphertext and plaintext themselves are unavoidable, every extra
+# note-sized buffer is a copy. Usage: python benchmarks/bench_zero_copy.py [size in MiB]
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import storage
+from encryption import encrypt_data, encrypt_data_parts, decrypt_data, get_key
+
+PASSWORD = "benchmark"
+
+def old_load_and_decrypt(filename):
+    with open(os.path.join(storage.NOTES_DIR, filename), "rb") as f:
+        token = f.read()
+    salt, nonce, ciphertext = token[:16], token[16:28], token[28:]
+    return AESGCM(get_key(PASSWORD, salt)).decrypt(nonce, ciphertext, None)
+
+def new_load_and_decrypt(filename):
+    return decrypt_data(storage.load_note_view(filename), PASSWORD)
+
+def old_encrypt_and_save(data):
+    with open(os.path.join(storage.NOTES_DIR, "old.enc"), "wb") as f:
+        f.write(encrypt_data(data, PASSWORD))
+
+def new_encrypt_and_save(data):
+    storage.write_note_parts("new.enc", encrypt_data_parts(data, PASSWORD))
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+def report(name, size, old, new):
+    mib = 1024 * 1024
+    print(f"{name:<18} old {old[0] / mib:8.1f} MiB {old[1] * 1000:8.1f} ms   "
+          f"new {new[0] / mib:8.1f} MiB {new[1] * 1000:8.1f} ms   "
+          f"copies {old[0] / size:4.1f}x -> {new[0] / size:4.1f}x")
+
+def main():
+    size = int(sys.argv[1]) * 1024 * 1024 if len(sys.argv) > 1 else 32 * 1024 * 1024
+    data = os.urandom(size)
+    with tempfile.TemporaryDirectory() as tmp:
+        storage.NOTES_DIR = tmp
+        storage.save_note(encrypt_data(data, PASSWORD), "note")
+        print(f"Note size: {size // (1024 * 1024)} MiB (peak traced allocations per operation)")
+        report("load + decrypt", size, measure(old_load_and_decrypt, "note.enc"), measure(new_load_and_decrypt, "note.enc"))
+        report("encrypt + save", size, measure(old_encrypt_and_save, data), measure(new_encrypt_and_save, data))
+        storage.close_backends()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+# benchmarks/microbench.py
+
+# Microbenchmarks for the crypto and storage hot paths:
+#
+#   kdf.*         derive_key with the configured KDF (no key cache)
+#   crypto.*      encrypt_data / decrypt_data per payload size (key cached)
+#   storage.*     save_note / load_note of a 1 KiB note
+#   vault<N>.*    list_notes, indexed search and full-scan search over a
+#                 synthetic vault of N notes (see synthetic.py)
+#
+# Each benchmark is run in a loop long enough to time reliably, --repeat times;
+# the median seconds per operation is the figure compared against a baseline.
+# Results are written as JSON (--json); with --baseline, any benchmark slower
+# than baseline * (1 + --tolerance) is reported as a REGRESSION and the exit
+# status is 1. --save-baseline writes the results as the new baseline.
+#
+#   python benchmarks/microbench.py --vaults 1000,10000 --baseline benchmarks/baseline.json
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import synthetic
+import storage
+from encryption import decrypt_data, derive_key, encrypt_data, get_key
+from kdf import current_params
+from scan import scan_notes
+from vault import decrypt_note
+
+DEFAULT_VAULTS = "1000,10000,100000"
+PAYLOAD_SIZES = {"1KiB": 1024, "64KiB": 64 * 1024, "1MiB": 1024 * 1024, "16MiB": 16 * 1024 * 1024}
+SAMPLE_SECONDS = 0.05
+PASSWORD = "benchmark"
+
+def measure(func, repeat: int = 5) -> dict:
+    # Seconds per call of func(): loop until one sample takes SAMPLE_SECONDS, then
+    # take repeat samples of that many calls
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= SAMPLE_SECONDS or number >= 1000000:
+            break
+        number *= 10 if elapsed < SAMPLE_SECONDS / 10 else 2
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {"median": statistics.median(samples), "min": min(samples), "max": max(samples),
+            "number": number, "repeat": repeat}
+
+def crypto_benchmarks():
+    params = current_params()
+    salt = os.urandom(16)
+    get_key(PASSWORD, salt, params)
+    yield "kdf.derive_key." + params.algorithm, lambda: derive_key(PASSWORD, salt, params)
+    for label, size in PAYLOAD_SIZES.items():
+        payload = os.urandom(size)
+        token = encrypt_data(payload, PASSWORD, salt, params)
+        yield f"crypto.encrypt_data.{label}", lambda payload=payload: encrypt_data(payload, PASSWORD, salt, params)
+        yield f"crypto.decrypt_data.{label}", lambda token=token: decrypt_data(token, PASSWORD)
+    text = synthetic.note_text(random.Random(1)) * (1024 * 1024 // 200)
+    token = encrypt_data(text, PASSWORD, salt, params)
+    yield "crypto.encrypt_data.1MiB-text", lambda: encrypt_data(text, PASSWORD, salt, params)
+    yield "crypto.decrypt_data.1MiB-text", lambda: decrypt_data(token, PASSWORD)
+
+def storage_benchmarks(directory: str):
+    synthetic.use_directory(directory)
+    token = os.urandom(1024)
+    counter = iter(range(10 ** 9))
+    storage.save_note(token, "load")
+    yield "storage.save_note.1KiB", lambda: storage.save_note(token, f"n{next(counter)}")
+    yield "storage.load_note.1KiB", lambda: storage.load_note("load.enc")
+
+def search(vault, note_index, term: str) -> list:
+    # The CLI's search: index candidates (if any), then decrypt and match them
+    files = storage.list_notes()
+    if note_index is not None:
+        files = note_index.candidates(term, files)
+    found = []
+    for result in scan_notes(files, lambda token: decrypt_note(token, None, vault)):
+        if result.error is None and term in result.data.decode().lower():
+            found.append(result.filename)
+    return found
+
+def vault_benchmarks(directory: str, count: int):
+    vault, note_index = synthetic.build_vault(directory, count)
+    prefix = f"vault{count}"
+    yield prefix + ".list_notes", storage.list_notes
+    yield prefix + ".search.index", lambda: search(vault, note_index, synthetic.RARE_WORD)
+    yield prefix + ".search.scan", lambda: search(vault, None, synthetic.RARE_WORD)
+
+def run(vaults, repeat: int = 5, only: str = None, log=print) -> dict:
+    results = {}
+
+    def run_all(benchmarks):
+        for name, func in benchmarks:
+            if only and only not in name:
+                continue
+            results[name] = measure(func, repeat)
+            log(f"{name:<36} {results[name]['median'] * 1000:12.4f} ms")
+
+    old_notes_dir = storage.NOTES_DIR
+    try:
+        run_all(crypto_benchmarks())
+        with tempfile.TemporaryDirectory() as tmp:
+            run_all(storage_benchmarks(tmp))
+        for count in vaults:
+            with tempfile.TemporaryDirectory() as tmp:
+                run_all(vault_benchmarks(tmp, count))
+    finally:
+        storage.close_backends()
+        storage.NOTES_DIR = old_notes_dir
+    return results
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    # (name, current, baseline, ratio) for every benchmark slower than allowed
+    regressions = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result["median"] / base["median"]
+        if ratio > 1 + tolerance:
+            regressions.append((name, result["median"], base["median"], ratio))
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="ShadowNotes microbenchmarks")
+    parser.add_argument("--vaults", default=DEFAULT_VAULTS, help="synthetic vault sizes, comma-separated")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--save-baseline", help="write the results as a new baseline")
+    args = parser.parse_args(argv)
+    vaults = [int(n) for n in args.vaults.split(",") if n]
+    results = run(vaults, args.repeat, args.filter)
+    report = {
+        "meta": {"python": platform.python_version(), "platform": platform.platform(),
+                 "machine": platform.machine(), "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+        "results": results,
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    for name, current, base, ratio in regressions:
+        print(f"REGRESSION {name}: {current * 1000:.4f} ms vs baseline {base * 1000:.4f} ms ({ratio:.2f}x)")
+    missing = sorted(set(baseline) - set(results))
+    if missing and not args.filter:
+        print("Not run (in baseline):", ", ".join(missing))
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed beyond {args.tolerance:.0%}")
+        return 1
+    print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,338 @@
+# benchmarks/replay.py
+
+# Replays command traces recorded by the CLI (TRACE_FILE in config.py, see
+# src/cmdtrace.py) against a synthetic vault, headlessly, and reports
+# throughput and p50/p95/p99 latency per command.
+#
+# Each of --clients threads replays every session of the trace, --loops times.
+# A client numbers notes the way the recorded session did: a note the session
+# added is the one the client added, any older note is one of the synthetic
+# notes (each client has its own share of them, so one client's delete never
+# takes a note from under another). Commands go through the same calls as
+# main.py, with generated text of the recorded sizes. The search index, catalog
+# and todo journal belong to one process and are shared behind a lock; note
+# encryption, storage, history and scans run concurrently. --think replays the
+# recorded pauses between commands, scaled (0, the default, runs them back to
+# back). migrate, import and export touch the whole vault or the filesystem
+# outside it and are counted as skipped.
+#
+#   python benchmarks/replay.py trace.jsonl --notes 10000 --clients 4 --json replay.json
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import synthetic
+import storage
+from catalog import Catalog, PlaintextDigest
+from chunks import ChunkStore
+from cmdtrace import load_trace
+from history import NoteHistory, delete_history, record_edit
+from scan import scan_notes
+from stream import STREAM_MAGIC, load_note_stream, save_note_stream
+from todos import TodoJournal, week_ahead
+from vault import decrypt_note, decrypt_text, encrypt_note, needs_password
+
+NOTE_PASSWORD = "replay"
+TODOS_PER_CLIENT = 20
+SKIPPED = ("migrate", "import", "export")
+
+def percentile(ordered: list, q: float) -> float:
+    # Nearest-rank percentile of an already sorted list
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+def summarize(latencies: list, errors: int) -> dict:
+    ordered = sorted(latencies)
+    summary = {"count": len(ordered), "errors": errors}
+    if ordered:
+        summary.update(mean=sum(ordered) / len(ordered), p50=percentile(ordered, 50),
+                       p95=percentile(ordered, 95), p99=percentile(ordered, 99))
+    return summary
+
+class Workload:
+    # What the clients share: the vault, its index, catalog and todo journal
+    def __init__(self, directory: str, notes: int, clients: int, seed: int = 0):
+        self.vault, self.note_index = synthetic.build_vault(directory, notes, seed)
+        self.catalog = Catalog(self.vault)
+        self.catalog.rebuild()
+        self.journal = TodoJournal.open(os.path.join(directory, "todos.enc"), synthetic.MASTER_PASSWORD)
+        rng = random.Random(seed)
+        for _ in range(clients * TODOS_PER_CLIENT):
+            self.journal.add(synthetic.filler(rng, 30))
+        files = storage.list_notes()
+        rng.shuffle(files)
+        self.notes = [files[i::clients] for i in range(clients)]
+        todo_ids = [todo["id"] for todo in self.journal.items()]
+        self.todos = [todo_ids[i::clients] for i in range(clients)]
+        self.lock = threading.Lock()
+
+class Client:
+    def __init__(self, workload: Workload, number: int, seed: int = 0):
+        self.workload = workload
+        self.number = number
+        self.rng = random.Random(seed * 1000 + number)
+        self.notes = {}     # recorded note number -> filename, per session
+        self.todos = {}     # recorded todo id -> todo id, per session
+        self.spare_notes = list(workload.notes[number])
+        self.spare_todos = list(workload.todos[number])
+        self.added = 0
+        self.latencies = {}
+        self.errors = {}
+        self.skipped = 0
+
+    def start_session(self):
+        self.notes.clear()
+        self.todos.clear()
+
+    def note(self, number) -> str:
+        if number not in self.notes:
+            if not self.spare_notes:
+                raise LookupError("client has no synthetic notes left")
+            self.notes[number] = self.spare_notes.pop()
+        return self.notes[number]
+
+    def todo(self, number) -> int:
+        if number not in self.todos:
+            if not self.spare_todos:
+                raise LookupError("client has no synthetic todos left")
+            self.todos[number] = self.spare_todos.pop()
+        return self.todos[number]
+
+    def new_filename(self) -> str:
+        self.added += 1
+        return f"replay{self.number:03d}-{self.added:06d}"
+
+    def password(self, event) -> str:
+        return "" if event.get("vault", True) else NOTE_PASSWORD
+
+    def run(self, event):
+        op = event["op"]
+        if op in SKIPPED or not hasattr(self, "op_" + op.replace(".", "_")):
+            self.skipped += 1
+            return
+        start = time.perf_counter()
+        try:
+            getattr(self, "op_" + op.replace(".", "_"))(event)
+        except Exception:
+            self.errors[op] = self.errors.get(op, 0) + 1
+            return
+        self.latencies.setdefault(op, []).append(time.perf_counter() - start)
+
+    # Commands, following main.py
+
+    def op_add(self, event):
+        note_obj = {"content": synthetic.filler(self.rng, event.get("size", 0)),
+                    "tags": self.rng.sample(synthetic.TAGS, min(event.get("tags", 0), len(synthetic.TAGS)))}
+        note_json = json.dumps(note_obj).encode()
+        encrypted = encrypt_note(note_json, self.password(event), self.workload.vault)
+        filename = storage.save_note(encrypted, self.new_filename())
+        self.notes[event.get("note")] = filename
+        with self.workload.lock:
+            self.workload.note_index.update(filename, note_obj, encrypted)
+            self.workload.catalog.record(filename, note_json, note_obj, encrypted)
+
+    def op_read(self, event):
+        encrypted = storage.load_note_view(self.note(event.get("note")))
+        password = NOTE_PASSWORD if needs_password(encrypted) else None
+        json.loads(decrypt_note(encrypted, password, self.workload.vault).decode())
+
+    def op_edit(self, event):
+        filename = self.note(event.get("note"))
+        encrypted = storage.load_note(filename)
+        password = NOTE_PASSWORD if needs_password(encrypted) else None
+        decrypted = decrypt_note(encrypted, password, self.workload.vault)
+        note_obj = json.loads(decrypted.decode())
+        if event.get("size"):
+            note_obj["content"] = synthetic.filler(self.rng, event["size"])
+        if event.get("tags"):
+            note_obj["tags"] = self.rng.sample(synthetic.TAGS, min(event["tags"], len(synthetic.TAGS)))
+        new_note_json = json.dumps(note_obj).encode()
+        new_encrypted = encrypt_note(new_note_json, password, self.workload.vault, encrypted)
+        storage.write_note(filename, new_encrypted)
+        with self.workload.lock:
+            self.workload.note_index.update(filename, note_obj, new_encrypted)
+            self.workload.catalog.record(filename, new_note_json, note_obj, new_encrypted)
+        record_edit(filename, decrypted, new_note_json, password, self.workload.vault)
+
+    def op_delete(self, event):
+        filename = self.note(event.get("note"))
+        if not storage.delete_note(filename):
+            raise LookupError(filename)
+        delete_history(filename)
+        with self.workload.lock:
+            self.workload.note_index.remove(filename)
+            self.workload.catalog.remove(filename)
+
+    def op_list(self, event):
+        sort = event.get("sort", "name")
+        files = storage.list_notes()
+        with self.workload.lock:
+            self.workload.catalog.listing(files, sort, reverse=sort in ("created", "modified", "size"))
+
+    def op_search(self, event):
+        # A word about one synthetic note in a hundred contains if the recorded search matched
+        term = synthetic.RARE_WORD if event.get("matches") else synthetic.MISSING_WORD
+        files = storage.list_notes()
+        with self.workload.lock:
+            files = self.workload.note_index.candidates(term, files)
+        password = None if event.get("vault", True) else NOTE_PASSWORD
+        found = []
+        for result in scan_notes(files, lambda token: decrypt_text(token, password, self.workload.vault)):
+            if result.error is not None:
+                continue
+            if term in result.data.decode(errors="replace").lower():
+                found.append(result.filename)
+
+    def op_history(self, event):
+        filename = self.note(event.get("note"))
+        encrypted = storage.load_note_view(filename)
+        password = NOTE_PASSWORD if needs_password(encrypted) else None
+        history = NoteHistory.open(filename, password, self.workload.vault)
+        revisions = history.revisions()
+        if revisions:
+            history.get(revisions[-1][0])
+
+    def op_reindex(self, event):
+        with self.workload.lock:
+            self.workload.note_index.rebuild()
+            self.workload.catalog.rebuild()
+
+    def op_gc(self, event):
+        ChunkStore(self.workload.vault).collect_garbage()
+
+    def op_attach(self, event):
+        digest = PlaintextDigest(io.BytesIO(os.urandom(event.get("size", 0))))
+        password = self.password(event)
+        filename = save_note_stream(digest, self.new_filename(), password, self.workload.vault)
+        self.notes[event.get("note")] = filename
+        if not password:
+            with self.workload.lock:
+                self.workload.note_index.add_attachments([filename])
+                self.workload.catalog.record_attachments([(filename, digest)])
+
+    def op_extract(self, event):
+        filename = self.note(event.get("note"))
+        head = storage.read_note_head(filename, len(STREAM_MAGIC) + 1)
+        password = NOTE_PASSWORD if needs_password(head) else None
+        load_note_stream(filename, io.BytesIO(), password, self.workload.vault)
+
+    def op_todo_add(self, event):
+        due = (date.today() + timedelta(days=self.rng.randint(0, 14))).isoformat() if event.get("due") else None
+        with self.workload.lock:
+            todo = self.workload.journal.add(synthetic.filler(self.rng, event.get("size", 0)),
+                                             event.get("priority", "normal"), due)
+        self.todos[event.get("todo")] = todo["id"]
+
+    def op_todo_list(self, event):
+        with self.workload.lock:
+            self.workload.journal.query()
+
+    def op_todo_pending(self, event):
+        with self.workload.lock:
+            self.workload.journal.query("pending")
+
+    def op_todo_week(self, event):
+        with self.workload.lock:
+            self.workload.journal.query("pending", week_ahead())
+
+    def op_todo_done(self, event):
+        with self.workload.lock:
+            self.workload.journal.set_done(self.todo(event.get("todo")))
+
+    def op_todo_priority(self, event):
+        with self.workload.lock:
+            self.workload.journal.update(self.todo(event.get("todo")), priority=event.get("priority", "normal"))
+
+    def op_todo_due(self, event):
+        due = (date.today() + timedelta(days=self.rng.randint(0, 14))).isoformat() if event.get("due") else None
+        with self.workload.lock:
+            self.workload.journal.update(self.todo(event.get("todo")), due=due)
+
+    def op_todo_delete(self, event):
+        with self.workload.lock:
+            self.workload.journal.delete(self.todo(event.get("todo")))
+
+def play(client: Client, sessions: dict, loops: int, think: float):
+    for _ in range(loops):
+        for events in sessions.values():
+            client.start_session()
+            previous = None
+            for event in events:
+                if think and previous is not None:
+                    time.sleep(max(0.0, event.get("t", 0) - previous) * think)
+                previous = event.get("t", 0)
+                client.run(event)
+
+def replay(sessions: dict, notes: int = 1000, clients: int = 1, loops: int = 1, think: float = 0.0,
+           seed: int = 0, log=print) -> dict:
+    old_notes_dir = storage.NOTES_DIR
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            log(f"Building a vault of {notes} notes...")
+            workload = Workload(tmp, notes, clients, seed)
+            players = [Client(workload, number, seed) for number in range(clients)]
+            threads = [threading.Thread(target=play, args=(player, sessions, loops, think)) for player in players]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            wall = time.perf_counter() - start
+    finally:
+        storage.close_backends()
+        storage.NOTES_DIR = old_notes_dir
+    commands = {}
+    for op in sorted({op for player in players for op in list(player.latencies) + list(player.errors)}):
+        latencies = [latency for player in players for latency in player.latencies.get(op, [])]
+        commands[op] = summarize(latencies, sum(player.errors.get(op, 0) for player in players))
+    completed = sum(command["count"] for command in commands.values())
+    return {"wall": wall, "completed": completed, "throughput": completed / wall if wall else 0.0,
+            "skipped": sum(player.skipped for player in players), "commands": commands}
+
+def print_report(report: dict):
+    print(f"{'command':<16} {'count':>7} {'errors':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for op, command in report["commands"].items():
+        if command["count"]:
+            print(f"{op:<16} {command['count']:>7} {command['errors']:>6} {command['p50'] * 1000:>10.2f} "
+                  f"{command['p95'] * 1000:>10.2f} {command['p99'] * 1000:>10.2f}")
+        else:
+            print(f"{op:<16} {0:>7} {command['errors']:>6}")
+    print(f"{report['completed']} commands in {report['wall']:.2f} s: {report['throughput']:.1f} commands/s"
+          + (f" ({report['skipped']} skipped)" if report["skipped"] else ""))
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay ShadowNotes command traces against a synthetic vault")
+    parser.add_argument("trace", help="trace file recorded with TRACE_FILE")
+    parser.add_argument("--notes", type=int, default=1000, help="synthetic notes in the vault")
+    parser.add_argument("--clients", type=int, default=1, help="concurrent clients replaying the trace")
+    parser.add_argument("--loops", type=int, default=1, help="times each client replays the trace")
+    parser.add_argument("--think", type=float, default=0.0, help="scale of the recorded pauses, 0 = none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    args = parser.parse_args(argv)
+    sessions = load_trace(args.trace)
+    if not sessions:
+        print("No commands in", args.trace)
+        return 1
+    report = replay(sessions, args.notes, args.clients, args.loops, args.think, args.seed)
+    print_report(report)
+    if args.json:
+        report["meta"] = {"trace": os.path.basename(args.trace), "notes": args.notes, "clients": args.clients,
+                          "loops": args.loops, "think": args.think, "python": platform.python_version(),
+                          "cpus": os.cpu_count(), "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
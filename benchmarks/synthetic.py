@@ -0,0 +1,68 @@
+# benchmarks/synthetic.py
+
+# Synthetic vaults for the benchmarks: notes that look like the real thing
+# (JSON with a few sentences of content and a couple of tags), encrypted under a
+# fresh vault and written through the batched paths, with the search index built
+# once at the end. The same seed always gives the same notes.
+
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from index import NoteIndex, parse_note
+from vault import Vault, encrypt_notes
+
+MASTER_PASSWORD = "benchmark"
+BATCH_SIZE = 1000
+
+WORDS = ("meeting project budget travel invoice recipe garden server backup deploy review "
+         "family doctor insurance school holiday kitchen market report draft idea book film "
+         "music car repair bank tax password router printer update release ticket customer").split()
+TAGS = ("work", "home", "finance", "health", "ideas", "todo", "travel", "reading")
+
+# A word no synthetic note contains, and one about one note in a hundred does
+MISSING_WORD = "zeppelin"
+RARE_WORD = "orchid"
+
+def note_text(rng: random.Random) -> bytes:
+    sentences = []
+    for _ in range(rng.randint(1, 6)):
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 14))).capitalize() + ".")
+    if rng.random() < 0.01:
+        sentences.append(f"Remember the {RARE_WORD}.")
+    return json.dumps({"content": " ".join(sentences), "tags": rng.sample(TAGS, rng.randint(0, 2))}).encode()
+
+def filler(rng: random.Random, size: int) -> str:
+    # Sentence-like text of exactly size characters
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+def use_directory(directory: str):
+    # Point storage (and everything built on it) at directory
+    storage.close_backends()
+    storage.NOTES_DIR = directory
+
+def build_vault(directory: str, count: int, seed: int = 0):
+    # Fill directory with count notes; returns (vault, note index)
+    use_directory(directory)
+    vault = Vault.open(MASTER_PASSWORD)
+    rng = random.Random(seed)
+    note_index = NoteIndex(vault)
+    indexed = []
+    for start in range(0, count, BATCH_SIZE):
+        payloads = [note_text(rng) for _ in range(min(BATCH_SIZE, count - start))]
+        names = [f"note{start + i:06d}" for i in range(len(payloads))]
+        sealed = encrypt_notes(payloads, vault=vault)
+        saved = storage.save_notes(zip(sealed, names))
+        indexed.extend((filename, parse_note(payload), token) for filename, payload, token in zip(saved, payloads, sealed))
+    note_index.update_many(indexed)
+    return vault, note_index
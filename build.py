@@ -8,7 +8,7 @@ def main():
         # Do not use --windowed so a terminal opens
         "--name", "ShadowNotes",     # Output executable name
         "--paths=src",              # Include the src folder in the module search path
-        "src/merged.py"             # Entry point: the merged launcher script
+        "src/launch.py"             # Entry point: console CLI with arguments, launcher window without
     ]
     subprocess.run(command, check=True)
     
@@ -5,7 +5,31 @@ ShadowNotes Source Package
 --------------------------
 This package contains the main modules for the ShadowNotes application:
 - encryption: Handles encryption and decryption of notes.
-- storage: Manages saving and loading notes from the filesystem.
+- keycache: Caches derived keys for the current session.
+- kdf: Self-describing KDF parameters (PBKDF2 or scrypt) and calibration.
+- compress: Compression stage applied before notes are encrypted.
+- vault: Envelope encryption with a vault key and per-note data keys.
+- index: Encrypted inverted index for keyword and tag search.
+- scan: Parallel decrypt pipeline for vault-wide scans.
+- catalog: Encrypted metadata catalog (titles, tags, times, sizes, hashes).
+- metalog: Append-only encrypted log storing the index and catalog entries.
+- chunks: Deduplicating content-defined chunk store for large vault notes.
+- history: Per-note version history stored as encrypted deltas.
+- stream: Streaming segmented encryption for large notes and attachments.
+- bulk: Batched import and export of notes as plain text files.
+- tasks: Background task runner that hands results back to the Tk thread.
+- watch: Detects notes added, changed or deleted by other processes.
+- notelist: Sorted, filterable index of the notes shown in the GUI list.
+- widgets: Tk widgets shared by the GUI front-ends.
+- todos: Append-only, per-record encrypted todo journal.
+- durable: Durable atomic writes with group commit.
+- filelock: Exclusive file locks shared between processes.
+- cmdtrace: Records the shape of CLI commands for workload replay.
+- metrics: Counters and latency histograms behind the stats command.
+- storage: Manages saving and loading notes through the configured backend.
+- sqlite_backend: SQLite storage backend with batched WAL transactions.
+- container: Single-file log-structured storage backend with compaction.
 - config: Contains configuration constants.
 - main: The CLI entry point for ShadowNotes.
+- launch: Executable entry point; runs the CLI without importing Tk.
 """
@@ -0,0 +1,67 @@
+# src/bulk.py
+
+# Bulk import and export of notes as plain text files.
+#
+# Both directions go through the batch crypto API (vault.encrypt_notes /
+# decrypt_notes) BATCH_SIZE notes at a time: one key derivation per batch
+# instead of one per note, shared cipher contexts, and the AES-GCM work spread
+# over a thread pool. Attachments (streamed notes) are left to "extract".
+
+import json
+import os
+import storage
+from index import parse_note
+from scan import default_workers
+from stream import STREAM_MAGIC, is_stream
+from vault import decrypt_notes, encrypt_notes
+
+BATCH_SIZE = 500
+TEXT_EXTENSION = ".txt"
+
+def import_notes(directory: str, password: str = None, vault=None, workers: int = None, batch_size: int = BATCH_SIZE):
+    # Encrypt every .txt file in directory as a note named after the file. Returns
+    # (imported, skipped): imported holds (filename, plaintext, note_obj, encrypted)
+    # for index/catalog updates, skipped the files whose note name is already taken.
+    workers = workers or default_workers()
+    files = sorted(f for f in os.listdir(directory) if f.endswith(TEXT_EXTENSION))
+    imported, skipped = [], []
+    for start in range(0, len(files), batch_size):
+        names, note_objs = [], []
+        for f in files[start:start + batch_size]:
+            name = storage.note_filename(f[:-len(TEXT_EXTENSION)])
+            if storage.note_exists(name):
+                skipped.append(f)
+                continue
+            with open(os.path.join(directory, f), encoding="utf-8") as src:
+                note_objs.append({"content": src.read(), "tags": []})
+            names.append(name)
+        payloads = [json.dumps(note_obj).encode() for note_obj in note_objs]
+        sealed = encrypt_notes(payloads, password, vault, workers)
+        saved = storage.save_notes(zip(sealed, names))
+        imported.extend(zip(saved, payloads, note_objs, sealed))
+    return imported, skipped
+
+def export_notes(directory: str, password: str = None, vault=None, workers: int = None, batch_size: int = BATCH_SIZE):
+    # Decrypt every note that opens into directory/<name>.txt (content only).
+    # Returns (exported, failed) note filenames.
+    workers = workers or default_workers()
+    os.makedirs(directory, exist_ok=True)
+    names = storage.list_notes()
+    exported, failed = [], []
+    for start in range(0, len(names), batch_size):
+        batch = []
+        for filename in names[start:start + batch_size]:
+            # Streamed attachments are skipped on their header alone, never read whole
+            if not is_stream(storage.read_note_head(filename, len(STREAM_MAGIC))):
+                batch.append((filename, storage.load_note(filename)))
+        plaintexts = decrypt_notes([token for _, token in batch], password, vault, workers)
+        for (filename, _), plaintext in zip(batch, plaintexts):
+            if plaintext is None:
+                failed.append(filename)
+                continue
+            note_obj = parse_note(plaintext)
+            stem = filename[:-len(".enc")] if filename.endswith(".enc") else filename
+            with open(os.path.join(directory, stem + TEXT_EXTENSION), "w", encoding="utf-8") as dst:
+                dst.write(note_obj.get("content", "") if isinstance(note_obj, dict) else str(note_obj))
+            exported.append(filename)
+    return exported, failed
@@ -0,0 +1,189 @@
+# src/catalog.py
+
+# Encrypted metadata catalog for ShadowNotes.
+#
+# NOTES_DIR/.catalog holds one entry per note (title, tags, created/modified
+# time, plaintext size, stored size and SHA-256 of the plaintext) in a metadata
+# log encrypted with the vault key (see metalog.py). Reading the catalog gives a
+# sortable listing of the whole vault without opening any note. Each note write
+# appends one entry; a note written before a crash but missing from the catalog
+# simply shows up as uncatalogued until rebuild(). Attachments (see stream.py)
+# are catalogued untitled; their size and hash are taken as the plaintext
+# streams through, never from a whole decrypted copy. Notes sealed with their own
+# password are never catalogued, since their titles and hashes would be readable
+# with the master password alone.
+
+import hashlib
+import os
+from datetime import datetime
+import storage
+from index import parse_note
+from metalog import MetadataLog
+from scan import scan_notes
+from stream import STREAM_MAGIC, is_stream, load_note_stream
+from vault import decrypt_text, needs_password
+
+CATALOG_FILE = ".catalog"
+TITLE_LENGTH = 60
+SORT_KEYS = ("name", "title", "created", "modified", "size")
+
+def catalog_path() -> str:
+    return os.path.join(storage.NOTES_DIR, CATALOG_FILE)
+
+def note_title(note_obj) -> str:
+    content = note_obj.get("content", "") if isinstance(note_obj, dict) else str(note_obj)
+    for line in content.splitlines():
+        if line.strip():
+            return line.strip()[:TITLE_LENGTH]
+    return ""
+
+def make_entry(plaintext: bytes, note_obj, stored_size: int, created: str = None, modified: str = None) -> dict:
+    tags = list(note_obj.get("tags", [])) if isinstance(note_obj, dict) else []
+    return _entry(note_title(note_obj), tags, len(plaintext), stored_size,
+                  hashlib.sha256(plaintext).hexdigest(), created, modified)
+
+def _entry(title: str, tags: list, size: int, stored_size: int, sha256: str, created: str = None, modified: str = None) -> dict:
+    modified = modified or datetime.now().isoformat(timespec="seconds")
+    return {
+        "title": title,
+        "tags": tags,
+        "created": created or modified,
+        "modified": modified,
+        "size": size,
+        "stored_size": stored_size,
+        "sha256": sha256,
+    }
+
+class PlaintextDigest:
+    # Size and SHA-256 of plaintext passing through: wraps the source being
+    # attached (read), or is the sink a stored attachment is decrypted into (write)
+    def __init__(self, src=None):
+        self.src = src
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.src.read(size)
+        self.write(data)
+        return data
+
+    def readinto(self, buf) -> int:
+        n = self.src.readinto(buf)
+        self.write(memoryview(buf)[:n])
+        return n
+
+    def write(self, data) -> int:
+        self._sha256.update(data)
+        self.size += len(data)
+        return len(data)
+
+    def hexdigest(self) -> str:
+        return self._sha256.hexdigest()
+
+def attachment_digest(filename: str, vault) -> PlaintextDigest:
+    # Stream a vault-key attachment through a digest, in constant memory
+    digest = PlaintextDigest()
+    load_note_stream(filename, digest, None, vault)
+    return digest
+
+class Catalog(MetadataLog):
+    LEGACY_KEY = "entries"
+
+    def __init__(self, vault):
+        super().__init__(vault, catalog_path(), b"catalog")
+
+    def _clear(self):
+        self.entries = {}
+
+    def _put(self, filename: str, entry: dict):
+        self.entries[filename] = entry
+
+    def _delete(self, filename: str):
+        self.entries.pop(filename, None)
+
+    def _entries(self) -> dict:
+        return self.entries
+
+    def record(self, filename: str, plaintext: bytes, note_obj, encrypted: bytes):
+        # Call after the note itself has been written
+        self.record_many([(filename, plaintext, note_obj, encrypted)])
+
+    def record_many(self, rows):
+        # rows: (filename, plaintext, note_obj, encrypted); one append for the whole
+        # batch. A note with its own password loses any entry it had.
+        self.refresh()
+        puts, deletes = {}, []
+        for filename, plaintext, note_obj, encrypted in rows:
+            if needs_password(encrypted):
+                deletes.append(filename)
+                continue
+            previous = self.entries.get(filename)
+            created = previous["created"] if previous else None
+            puts[filename] = make_entry(plaintext, note_obj, len(encrypted), created)
+        self.commit(puts, deletes)
+
+    def record_attachments(self, rows):
+        # rows: (filename, PlaintextDigest) for vault-key attachments already written
+        self.refresh()
+        puts = {}
+        for filename, digest in rows:
+            previous = self.entries.get(filename)
+            created = previous["created"] if previous else None
+            stored_size = storage.stat_note(filename)[0]
+            puts[filename] = _entry("", [], digest.size, stored_size, digest.hexdigest(), created)
+        self.commit(puts)
+
+    def remove(self, filename: str):
+        self.commit(deletes=[filename])
+
+    def remove_many(self, filenames):
+        # One append for the whole batch
+        self.commit(deletes=filenames)
+
+    def listing(self, filenames, sort: str = "name", reverse: bool = False) -> list:
+        # (filename, entry) pairs for the given notes; uncatalogued notes get entry None
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort key '{sort}' (use one of: {', '.join(SORT_KEYS)})")
+        self.refresh()
+        rows = [(f, self.entries.get(f)) for f in filenames]
+        if sort == "name":
+            return sorted(rows, reverse=reverse)
+        catalogued = [row for row in rows if row[1] is not None]
+        uncatalogued = sorted(row for row in rows if row[1] is None)
+        catalogued.sort(key=lambda row: (row[1][sort], row[0]), reverse=reverse)
+        return catalogued + uncatalogued
+
+    def rebuild(self, workers: int = None):
+        # Re-create entries for every vault note that opens; returns the notes that could not
+        self.refresh()
+        created = {f: e["created"] for f, e in self.entries.items()}
+        entries = {}
+        failed = []
+        decrypt = lambda token: None if needs_password(token) else decrypt_text(token, None, self.vault)
+        def measure(filename, data):
+            # decrypt_text leaves attachments empty; stream them through a digest instead
+            if data or not is_stream(storage.read_note_head(filename, len(STREAM_MAGIC))):
+                return None
+            return attachment_digest(filename, self.vault)
+        for result in scan_notes(storage.list_notes(), decrypt, measure, workers):
+            if result.error:
+                failed.append(result.filename)
+                continue
+            if result.data is None:
+                continue
+            stored_size, mtime = storage.stat_note(result.filename)
+            modified = datetime.fromtimestamp(mtime).isoformat(timespec="seconds")
+            if result.value is not None:
+                entries[result.filename] = _entry("", [], result.value.size, stored_size, result.value.hexdigest(),
+                                                  created.get(result.filename), modified)
+            else:
+                entries[result.filename] = make_entry(result.data, parse_note(result.data), stored_size,
+                                                      created.get(result.filename), modified)
+        self.replace_all(entries)
+        return sorted(failed)
+
+def format_entry(filename: str, entry) -> str:
+    if entry is None:
+        return f"{filename}  (not catalogued)"
+    tags = f"  [{', '.join(entry['tags'])}]" if entry["tags"] else ""
+    return f"{filename}  {entry['modified'].replace('T', ' ')}  {entry['size']} B  {entry['title']}{tags}"
@@ -0,0 +1,220 @@
+# src/chunks.py
+
+# Deduplicating chunk store for large vault notes.
+#
+# A note of CHUNK_THRESHOLD bytes or more is cut into content-defined chunks:
+# a boundary may follow any line break whose preceding WINDOW bytes hash to
+# zero under CUT_MASK, so an insert or delete only moves the boundaries next to
+# it. Vault notes are JSON, where line breaks are the two-byte escape \n, so
+# both that escape and a raw newline byte count (every ~80 bytes in text, every
+# ~256 in binary data). A stretch with no such boundary (one long paragraph) is
+# cut after a space instead, under the stricter SPACE_CUT_MASK; only data with
+# neither falls back to MAX_CHUNK cuts. Candidates are found with a regex and
+# hashed with crc32, which keeps chunking far cheaper than hashing every byte
+# in Python. Each chunk is stored once per vault, compressed and encrypted,
+# under a keyed id:
+#
+#   id:     HMAC-SHA256(vault subkey, chunk plaintext)  (hex file name in NOTES_DIR/.chunks)
+#   chunk:  CHUNK_MAGIC + codec(1) + nonce(12) + AES-GCM(compressed chunk), id as associated data
+#   note:   MANIFEST_MAGIC + nonce(12) + AES-GCM(size(8) + (id(32) + chunk size(4)) per chunk)
+#
+# Ids are convergent within a vault only: equal chunks in one vault share a
+# file, while nothing links them to the same text in another vault. Copies
+# and edited versions of a large note store only the chunks that differ.
+# Chunks are made durable before the manifest that uses them is written, so a
+# crash can leave unused chunks but never a note with missing ones;
+# ChunkStore.collect_garbage removes unused chunks.
+
+import hashlib
+import hmac
+import os
+import re
+import struct
+import time
+import zlib
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import compress
+import durable
+import storage
+
+CHUNK_DIR = ".chunks"
+CHUNK_MAGIC = b"SNC\x01"
+MANIFEST_MAGIC = b"SNM\x01"
+ENTRY = struct.Struct("<32sI")
+TOTAL = struct.Struct("<Q")
+
+MIN_CHUNK = 2 * 1024
+MAX_CHUNK = 64 * 1024
+WINDOW = 48
+CUT_MASK = 0x7F
+SPACE_CUT_MASK = 0x7FF
+LINE_BREAK = re.compile(rb"\n|\\n")
+SPACE = re.compile(rb" ")
+
+GC_GRACE_SECONDS = 3600  # chunks newer than this may belong to a note being saved
+
+def is_manifest(token: bytes) -> bool:
+    return token[:len(MANIFEST_MAGIC)] == MANIFEST_MAGIC
+
+def _find_cut(data, view, candidates, mask: int, start: int, limit: int):
+    # End of the first candidate match in [start + MIN_CHUNK, limit] whose window hashes to zero
+    for match in candidates.finditer(data, start + MIN_CHUNK - 1, limit):
+        end = match.end()
+        if zlib.crc32(view[end - WINDOW:end]) & mask == 0:
+            return end
+    return None
+
+def chunk_boundaries(data) -> list:
+    # End offsets of the content-defined chunks of data
+    if not hasattr(data, "find"):
+        data = bytes(data)
+    view = memoryview(data)
+    size = len(data)
+    cuts = []
+    start = 0
+    while start < size:
+        limit = min(start + MAX_CHUNK, size)
+        cut = _find_cut(data, view, LINE_BREAK, CUT_MASK, start, limit)
+        if cut is None:
+            cut = _find_cut(data, view, SPACE, SPACE_CUT_MASK, start, limit) or limit
+        cuts.append(cut)
+        start = cut
+    return cuts
+
+class ChunkStore:
+    def __init__(self, vault, directory: str = None):
+        self.directory = directory or os.path.join(storage.NOTES_DIR, CHUNK_DIR)
+        self._id_key = vault.derive_key(b"chunk id")
+        self._chunk_cipher = AESGCM(vault.derive_key(b"chunk data"))
+        self._manifest_cipher = AESGCM(vault.derive_key(b"chunk manifest"))
+        self.written = 0  # chunks written by the last seal()
+        self.reused = 0   # chunks the last seal() found already stored
+
+    def chunk_id(self, data) -> bytes:
+        return hmac.new(self._id_key, data, hashlib.sha256).digest()
+
+    def _path(self, chunk_id: bytes) -> str:
+        return os.path.join(self.directory, chunk_id.hex())
+
+    def seal_parts(self, data):
+        # Store the chunks of data that are not stored yet; returns the manifest as
+        # (header + nonce, ciphertext) like Vault.encrypt_parts
+        os.makedirs(self.directory, exist_ok=True)
+        view = memoryview(data)
+        entries, pending = [], {}
+        start = 0
+        self.reused = 0
+        try:
+            for end in chunk_boundaries(data):
+                chunk = view[start:end]
+                chunk_id = self.chunk_id(chunk)
+                entries.append(ENTRY.pack(chunk_id, end - start))
+                path = self._path(chunk_id)
+                if path not in pending and not self._touch(path):
+                    pending[path] = self._write_chunk(path, chunk_id, chunk)
+                else:
+                    self.reused += 1
+                start = end
+            durable.committer(self.directory).commit((tmp_path, path) for path, tmp_path in pending.items())
+        except BaseException:
+            for tmp_path in pending.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+        self.written = len(pending)
+        body = TOTAL.pack(len(data)) + b"".join(entries)
+        nonce = os.urandom(12)
+        return MANIFEST_MAGIC + nonce, self._manifest_cipher.encrypt(nonce, body, MANIFEST_MAGIC)
+
+    def seal(self, data) -> bytes:
+        header, ciphertext = self.seal_parts(data)
+        return header + ciphertext
+
+    def _touch(self, path: str) -> bool:
+        # Mark a stored chunk as in use so collect_garbage spares it; False if absent
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write_chunk(self, path: str, chunk_id: bytes, chunk) -> str:
+        codec, payload = compress.compress(chunk)
+        associated = CHUNK_MAGIC + bytes([codec])
+        nonce = os.urandom(12)
+        f, tmp_path = durable.open_temp(path)
+        with f:
+            f.write(associated + nonce)
+            f.write(self._chunk_cipher.encrypt(nonce, payload, associated + chunk_id))
+        return tmp_path
+
+    def manifest(self, token: bytes):
+        # (plaintext size, [(chunk id, chunk size), ...]) of a manifest note
+        if not is_manifest(token):
+            raise ValueError("Not a chunked note")
+        view = memoryview(token)
+        start = len(MANIFEST_MAGIC)
+        try:
+            body = self._manifest_cipher.decrypt(view[start:start + 12], view[start + 12:], MANIFEST_MAGIC)
+        except Exception as e:
+            raise ValueError("Incorrect vault key or corrupted data") from e
+        return TOTAL.unpack_from(body)[0], list(ENTRY.iter_unpack(body[TOTAL.size:]))
+
+    def read_chunk(self, chunk_id: bytes) -> bytes:
+        try:
+            with open(self._path(chunk_id), "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Missing chunk {chunk_id.hex()}") from None
+        if blob[:len(CHUNK_MAGIC)] != CHUNK_MAGIC:
+            raise ValueError(f"Corrupted chunk {chunk_id.hex()}")
+        header = blob[:len(CHUNK_MAGIC) + 1]
+        view = memoryview(blob)
+        try:
+            payload = self._chunk_cipher.decrypt(view[len(header):len(header) + 12], view[len(header) + 12:], header + chunk_id)
+        except Exception as e:
+            raise ValueError(f"Corrupted chunk {chunk_id.hex()}") from e
+        return compress.decompress(header[-1], payload)
+
+    def open(self, token: bytes) -> bytes:
+        # Reassemble the plaintext of a manifest note
+        size, entries = self.manifest(token)
+        out = bytearray(size)
+        cache = {}
+        offset = 0
+        for chunk_id, chunk_size in entries:
+            chunk = cache.get(chunk_id)
+            if chunk is None:
+                chunk = self.read_chunk(chunk_id)
+                if len(chunk) != chunk_size:
+                    raise ValueError(f"Corrupted chunk {chunk_id.hex()}")
+                cache[chunk_id] = chunk
+            out[offset:offset + chunk_size] = chunk
+            offset += chunk_size
+        if offset != size:
+            raise ValueError("Corrupted chunk manifest")
+        return bytes(out)
+
+    def collect_garbage(self, grace_seconds: int = GC_GRACE_SECONDS) -> int:
+        # Delete chunks no note refers to; returns how many were removed. Chunks
+        # younger than grace_seconds are kept: their note may not be written yet.
+        if not os.path.isdir(self.directory):
+            return 0
+        used = set()
+        for filename in storage.list_notes():
+            try:
+                token = storage.load_note(filename)
+            except OSError:
+                continue
+            if is_manifest(token):
+                used.update(chunk_id.hex() for chunk_id, _ in self.manifest(token)[1])
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name in used or entry.stat().st_mtime > cutoff:
+                    continue
+                os.remove(entry.path)
+                removed += 1
+        durable.fsync_dir(self.directory)
+        return removed
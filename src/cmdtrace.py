@@ -0,0 +1,60 @@
+# src/cmdtrace.py
+
+# Command traces for the workload harness (benchmarks/replay.py).
+#
+# With TRACE_FILE set in config.py the CLI appends one JSON line per command:
+#
+#   {"session": "9f1c02ab", "t": 12.408, "op": "edit", "note": 3, "size": 812, "tags": null}
+#
+# t is seconds since the session started; the other fields are the shape of
+# what the command worked on (content sizes, tag counts, whether the vault key
+# was used, how many notes a search matched). Contents, filenames, search terms
+# and passwords are never written: a trace shows how the app is used, not what
+# is in it. Notes are numbered in order of first use within a session, so a
+# replay can tell a note added earlier in the session from an older one.
+
+import json
+import os
+import time
+from config import TRACE_FILE
+
+class TraceRecorder:
+    def __init__(self, path: str = TRACE_FILE):
+        self.session = os.urandom(4).hex()
+        self._start = time.monotonic()
+        self._notes = {}
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    @property
+    def enabled(self) -> bool:
+        return self._file is not None
+
+    def note(self, filename: str) -> int:
+        # Stable number for filename within this session
+        return self._notes.setdefault(filename, len(self._notes))
+
+    def record(self, op: str, **shape):
+        if self._file is None:
+            return
+        event = {"session": self.session, "t": round(time.monotonic() - self._start, 3), "op": op, **shape}
+        # One flushed line per command, so a crashed session still leaves a usable trace
+        self._file.write(json.dumps(event) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def load_trace(path: str) -> dict:
+    # session -> its events in recorded order; lines that are not events are skipped
+    sessions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line of a session that was killed
+            if isinstance(event, dict) and "op" in event:
+                sessions.setdefault(event.get("session", ""), []).append(event)
+    return sessions
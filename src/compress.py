@@ -0,0 +1,88 @@
+# src/compress.py
+
+# Compression stage of the encrypt pipeline.
+#
+# Ciphertext does not compress, so notes are compressed before they are sealed.
+# The codec is recorded in the (authenticated) note header as one byte:
+#
+#   0 = none, 1 = zlib, 2 = zstd (zstandard package), 3 = lz4 (lz4 package)
+#
+# zlib is always available; zstd and lz4 are used when installed. Small payloads
+# (under COMPRESS_MIN_SIZE) are stored raw, and so is anything that does not
+# shrink below COMPRESS_MAX_RATIO of its size. Large payloads are judged on a
+# sample first, so already-compressed data is not compressed in full for nothing.
+
+import zlib
+from config import COMPRESSION, COMPRESS_MIN_SIZE, COMPRESS_MAX_RATIO
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+NONE = 0
+ZLIB = 1
+ZSTD = 2
+LZ4 = 3
+
+SAMPLE_SIZE = 4 * 1024
+
+CODEC_NAMES = {NONE: "none", ZLIB: "zlib", ZSTD: "zstd", LZ4: "lz4"}
+
+def _zstd_compress(data):
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def _zstd_decompress(data):
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def _compressors():
+    codecs = {ZLIB: (lambda data: zlib.compress(data, 6), zlib.decompress)}
+    if zstandard is not None:
+        codecs[ZSTD] = (_zstd_compress, _zstd_decompress)
+    if lz4_frame is not None:
+        codecs[LZ4] = (lz4_frame.compress, lz4_frame.decompress)
+    return codecs
+
+CODECS = _compressors()
+
+def default_codec(name=COMPRESSION) -> int:
+    # The configured codec: "auto" is zstd if installed, else zlib; None stores raw
+    if not name:
+        return NONE
+    if name == "auto":
+        return ZSTD if ZSTD in CODECS else ZLIB
+    for codec, codec_name in CODEC_NAMES.items():
+        if codec_name == name:
+            if codec != NONE and codec not in CODECS:
+                raise ValueError(f"Compression codec {name} is not installed")
+            return codec
+    raise ValueError(f"Unknown compression codec: {name}")
+
+def compress(data, codec: int = None):
+    # (codec, payload): payload is data itself when compression was skipped
+    codec = default_codec() if codec is None else codec
+    size = len(data)
+    if codec == NONE or size < COMPRESS_MIN_SIZE:
+        return NONE, data
+    pack = CODECS[codec][0]
+    if size > 2 * SAMPLE_SIZE:
+        middle = size // 2 - SAMPLE_SIZE // 2
+        sample = memoryview(data)[middle:middle + SAMPLE_SIZE]
+        if len(pack(sample)) > COMPRESS_MAX_RATIO * SAMPLE_SIZE:
+            return NONE, data
+    packed = pack(data)
+    if len(packed) > COMPRESS_MAX_RATIO * size:
+        return NONE, data
+    return codec, packed
+
+def decompress(codec: int, data) -> bytes:
+    if codec == NONE:
+        return data
+    if codec not in CODECS:
+        raise ValueError(f"Note is compressed with {CODEC_NAMES.get(codec, codec)}, which is not installed")
+    return CODECS[codec][1](data)
@@ -2,10 +2,114 @@
 
 # Configuration settings for ShadowNotes
 
+import os
+
+# Key derivation for new notes and vaults: "pbkdf2" or "scrypt". Every blob records
+# the parameters it was written with, so changing these never breaks existing notes.
+# Run "python src/kdf.py" to calibrate them for this machine.
+KDF_ALGORITHM = "pbkdf2"
+
 # Number of iterations for key derivation (used in encryption)
 KDF_ITERATIONS = 100000
 
+# scrypt cost (N, a power of two), block size (r) and parallelism (p)
+SCRYPT_N = 2 ** 15
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Unlock latency kdf.calibrate() aims for, in seconds
+KDF_TARGET_SECONDS = 0.5
+
 # Default file extension for encrypted notes
 DEFAULT_NOTE_EXTENSION = ".enc"
 
+# Maximum number of derived keys kept in the in-process key cache
+KEY_CACHE_SIZE = 64
+
+# Seconds a cached derived key stays valid before PBKDF2 must run again
+KEY_CACHE_TTL = 900
+
+# Worker threads for vault-wide scans (search, reindex, migrate); None uses every core
+SCAN_WORKERS = None
+
+# Where notes are stored: "files" (one file per note), "container" (single log-structured
+# file) or "sqlite" (SQLite database)
+STORAGE_BACKEND = "files"
+
+# Container file used by the "container" backend, inside the notes directory
+CONTAINER_FILE = ".notes.snc"
+
+# Compact the container once this fraction of it is overwritten/deleted records...
+CONTAINER_COMPACT_RATIO = 0.5
+
+# ...and at least this many bytes are dead
+CONTAINER_COMPACT_MIN_BYTES = 1024 * 1024
+
+# Database file used by the "sqlite" backend, inside the notes directory
+SQLITE_FILE = ".notes.db"
+
+# Most connections the "sqlite" backend opens; threads beyond that wait for a free one
+SQLITE_POOL_SIZE = 8
+
+# Plaintext bytes per segment for streamed (large) notes and attachments
+STREAM_SEGMENT_SIZE = 64 * 1024
+
+# Plaintext bytes of a streamed note decrypted per preview chunk (GUI read view)
+STREAM_PREVIEW_SIZE = 16 * 1024
+
+# Notes at least this large are mmap-ed instead of read into memory (file backend)
+MMAP_THRESHOLD = 1024 * 1024
+
+# How often (ms) the GUIs collect results from background tasks; 16 ms is ~60 fps
+TASK_POLL_MS = 16
+
+# How often (ms) the GUIs check for notes changed by another process (see watch.py)
+WATCH_INTERVAL_MS = 2000
+
+# Use inotify on Linux to find changed notes without rescanning (file backend only)
+WATCH_INOTIFY = True
+
+# The todo journal is compacted into one snapshot once it holds more operations
+# than this and than live todos (see todos.py)
+TODO_COMPACT_MIN_RECORDS = 256
+
+# The search index and catalog logs are rewritten as one snapshot once they hold
+# more changes than this and than entries (see metalog.py)
+METADATA_COMPACT_MIN_RECORDS = 256
+
+# Sync note, index and vault writes to disk before reporting them saved, with every
+# storage backend; batches share one sync (see durable.py). False keeps atomic
+# replaces but skips syncing.
+DURABLE_WRITES = True
+
+# Compress notes before encrypting them: "auto" (zstd if installed, else zlib),
+# "zlib", "zstd", "lz4", or None to store them raw (see compress.py)
+COMPRESSION = "auto"
+
+# Notes smaller than this are never compressed
+COMPRESS_MIN_SIZE = 256
+
+# Compressed output larger than this fraction of the input is stored raw instead
+COMPRESS_MAX_RATIO = 0.9
+
+# Vault notes this large or larger are stored as deduplicated chunks (see chunks.py)
+CHUNK_THRESHOLD = 256 * 1024
+
+# Revisions kept per note in its history, and the age (days) after which they
+# are dropped; None keeps them regardless (see history.py)
+HISTORY_MAX_REVISIONS = 1000
+HISTORY_MAX_AGE_DAYS = None
+
+# Append a trace of CLI commands (their shape only: sizes and counts, never note
+# contents, names or passwords) to this file for benchmarks/replay.py; None
+# disables recording (see cmdtrace.py)
+TRACE_FILE = None
+
+# Count calls, bytes and latency of crypto, storage and CLI commands from startup;
+# "stats on" turns it on for a session either way (see metrics.py)
+METRICS = False
+
+# Where the packaged app (launch.py, merged.py) keeps the master password hash and todos
+USER_DATA_DIR = os.path.join(os.path.expanduser("~"), ".ShadowNotes")
+
 # You can add more configuration constants as your project grows.
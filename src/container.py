@@ -0,0 +1,345 @@
+# src/container.py
+
+# Single-file, log-structured storage backend for ShadowNotes.
+#
+# All notes live in one append-only container file (NOTES_DIR/.notes.snc):
+#
+#   CONTAINER_MAGIC, then records of
+#   op(1) + name length(2) + data length(4) + crc32(4) + mtime(8) + header crc32(4) + name + data
+#
+# The first crc32 covers op, name and data; the header crc32 covers the header
+# fields before it, so a record's lengths are only trusted once it matches.
+# A PUT record stores a note, a DEL record deletes it; the newest record for a
+# name wins. An in-memory offset index (name -> data offset) is built by
+# walking the records when the container is opened, so reads are one
+# seek + read. Overwritten and deleted records are dead space that compact()
+# reclaims by rewriting the live records into a fresh file; this runs
+# automatically once the dead fraction passes CONTAINER_COMPACT_RATIO.
+#
+# Several processes may share a container. Appends and compaction hold an
+# exclusive file lock (see filelock.py), catch up on records appended
+# elsewhere, and write at the end they scanned to, so writers never overwrite
+# each other; each append is fsynced (unless DURABLE_WRITES is off). Every
+# record's CRCs are checked when it is scanned. A record that fails a check is
+# only judged under the lock, since without it the record may be another
+# process's append in progress. Only a record that provably ends the file (a
+# partial header, or a sound header whose record runs to or past EOF) is a torn
+# append that the next append cuts off. A sound header whose data fails its
+# check is skipped as corrupt; a damaged header elsewhere makes the container
+# unreadable (ValueError) rather than letting an append truncate the records
+# after it. Containers in the first format (no header CRC) are rewritten in
+# this one when opened.
+
+import os
+import struct
+import threading
+import time
+import zlib
+from config import CONTAINER_FILE, CONTAINER_COMPACT_RATIO, CONTAINER_COMPACT_MIN_BYTES, DURABLE_WRITES
+from durable import fsync_dir
+from filelock import FileLock
+
+CONTAINER_MAGIC = b"SNC\x02"
+RECORD = struct.Struct("<BHIIdI")
+HEADER_FIELDS = RECORD.size - 4  # the bytes the header crc32 covers
+CONTAINER_MAGIC_V1 = b"SNC\x01"
+RECORD_V1 = struct.Struct("<BHIId")
+OP_PUT = 1
+OP_DEL = 2
+CRC_BLOCK = 1024 * 1024
+
+class ContainerBackend:
+    name = "container"
+
+    def __init__(self, directory: str, filename: str = CONTAINER_FILE):
+        self.path = os.path.join(directory, filename)
+        self._lock = threading.RLock()
+        self._flock = FileLock(self.path)
+        self._file = None
+        self._open()
+
+    def _open(self):
+        if not os.path.exists(self.path):
+            # Under the file lock, so a second process creating it cannot truncate the first's records
+            with self._flock:
+                if not os.path.exists(self.path):
+                    with open(self.path, "wb") as f:
+                        f.write(CONTAINER_MAGIC)
+                        f.flush()
+                        if DURABLE_WRITES:
+                            os.fsync(f.fileno())
+                    if DURABLE_WRITES:
+                        fsync_dir(os.path.dirname(self.path) or ".")
+        self._file = open(self.path, "r+b")
+        magic = self._file.read(len(CONTAINER_MAGIC))
+        if magic == CONTAINER_MAGIC_V1:
+            self._file.close()
+            self._upgrade()
+            self._file = open(self.path, "r+b")
+            magic = self._file.read(len(CONTAINER_MAGIC))
+        if magic != CONTAINER_MAGIC:
+            self._file.close()
+            raise ValueError(f"{self.path} is not a ShadowNotes container")
+        self._ino = os.fstat(self._file.fileno()).st_ino
+        self._index = {}  # name -> (data offset, data length, mtime)
+        self._live_bytes = 0
+        self._dead_bytes = 0
+        self._end = len(CONTAINER_MAGIC)
+        self._catch_up()
+
+    def _catch_up(self):
+        # Scan to EOF, taking the file lock if a record can only be judged under it
+        if not self._scan():
+            with self._flock:
+                self._scan()
+
+    def _scan(self):
+        # Apply every complete record between the last scanned offset and EOF; False
+        # if it stopped at a record that fails a check and the lock is not held
+        size = os.fstat(self._file.fileno()).st_size
+        f = self._file
+        while self._end + RECORD.size <= size:
+            f.seek(self._end)
+            header = f.read(RECORD.size)
+            op, name_len, data_len, crc, mtime, header_crc = RECORD.unpack(header)
+            if zlib.crc32(header[:HEADER_FIELDS]) != header_crc or op not in (OP_PUT, OP_DEL):
+                if not self._flock.held():
+                    return False
+                raise ValueError(f"Damaged record header at offset {self._end} in {self.path}")
+            record_size = RECORD.size + name_len + data_len
+            if self._end + record_size > size:
+                break  # torn append, or one in progress without the lock
+            name_bytes = f.read(name_len)
+            if self._data_crc(data_len, zlib.crc32(name_bytes, op)) != crc:
+                if not self._flock.held():
+                    return False
+                if self._end + record_size == size:
+                    break  # torn append
+                self._dead_bytes += record_size
+                self._end += record_size
+                continue
+            self._apply(op, name_bytes.decode(), data_len, mtime)
+        return True
+
+    def _data_crc(self, data_len: int, crc: int) -> int:
+        # CRC of the data_len bytes at the current position, read in blocks
+        while data_len:
+            block = self._file.read(min(data_len, CRC_BLOCK))
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            data_len -= len(block)
+        return crc
+
+    def _apply(self, op: int, name: str, data_len: int, mtime: float):
+        # Index the record at self._end and move past it
+        name_len = len(name.encode())
+        record_size = RECORD.size + name_len + data_len
+        previous = self._index.pop(name, None)
+        if previous is not None:
+            old_size = RECORD.size + name_len + previous[1]
+            self._live_bytes -= old_size
+            self._dead_bytes += old_size
+        if op == OP_PUT:
+            self._index[name] = (self._end + RECORD.size + name_len, data_len, mtime)
+            self._live_bytes += record_size
+        else:
+            self._dead_bytes += record_size
+        self._end += record_size
+
+    def _refresh(self):
+        # Pick up appends and compactions made by other processes
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._ino or st.st_size < self._end:
+            self._file.close()
+            self._open()
+        elif st.st_size > self._end:
+            self._catch_up()
+
+    def _append(self, records):
+        # records: (op, name, data) tuples, written with a single write() call. Call
+        # with the file lock held, after _refresh: the scan has judged everything up
+        # to EOF, so the records go at self._end, cutting off any torn append.
+        mtime = time.time()
+        parts = []
+        for op, name, data in records:
+            name_bytes = name.encode()
+            parts += [_pack_header(op, name_bytes, data, mtime), name_bytes, data]
+        f = self._file
+        if os.fstat(f.fileno()).st_size > self._end:
+            f.truncate(self._end)
+        f.seek(self._end)
+        f.write(b"".join(parts))
+        f.flush()
+        if DURABLE_WRITES:
+            os.fsync(f.fileno())
+        for op, name, data in records:
+            self._apply(op, name, len(data), mtime)
+
+    def _read_record(self, name: str) -> bytes:
+        offset, data_len, _ = self._index[name]
+        name_bytes = name.encode()
+        self._file.seek(offset - len(name_bytes) - RECORD.size)
+        op, _, _, crc, _, _ = RECORD.unpack(self._file.read(RECORD.size))
+        self._file.seek(offset)
+        data = self._file.read(data_len)
+        if zlib.crc32(data, zlib.crc32(name_bytes, op)) != crc:
+            raise ValueError(f"Corrupted record for {name} in {self.path}")
+        return data
+
+    def write(self, filename: str, data: bytes):
+        with self._lock, self._flock:
+            self._refresh()
+            self._append([(OP_PUT, filename, data)])
+            self.maybe_compact()
+
+    def write_many(self, items):
+        with self._lock, self._flock:
+            self._refresh()
+            self._append([(OP_PUT, filename, data) for filename, data in items])
+            self.maybe_compact()
+
+    def read(self, filename: str) -> bytes:
+        with self._lock:
+            self._refresh()
+            if filename not in self._index:
+                raise FileNotFoundError(f"No such note: '{filename}'")
+            return self._read_record(filename)
+
+    def read_head(self, filename: str, size: int) -> bytes:
+        # Unchecked: the CRC covers the whole record, which is not read
+        with self._lock:
+            self._refresh()
+            if filename not in self._index:
+                raise FileNotFoundError(f"No such note: '{filename}'")
+            offset, data_len, _ = self._index[filename]
+            self._file.seek(offset)
+            return self._file.read(min(size, data_len))
+
+    def delete(self, filename: str) -> bool:
+        with self._lock, self._flock:
+            self._refresh()
+            if filename not in self._index:
+                return False
+            self._append([(OP_DEL, filename, b"")])
+            self.maybe_compact()
+            return True
+
+    def exists(self, filename: str) -> bool:
+        with self._lock:
+            self._refresh()
+            return filename in self._index
+
+    def stat(self, filename: str):
+        with self._lock:
+            self._refresh()
+            if filename not in self._index:
+                raise FileNotFoundError(f"No such note: '{filename}'")
+            _, data_len, mtime = self._index[filename]
+            return data_len, mtime
+
+    def list(self) -> list:
+        with self._lock:
+            self._refresh()
+            return sorted(self._index)
+
+    def snapshot(self) -> dict:
+        # filename -> (stored size, mtime), the same values stat() returns
+        with self._lock:
+            self._refresh()
+            return {name: (data_len, mtime) for name, (_, data_len, mtime) in self._index.items()}
+
+    def change_token(self):
+        # Appends and compaction both touch the container file
+        return os.stat(self.path).st_mtime_ns
+
+    def dead_ratio(self) -> float:
+        total = self._live_bytes + self._dead_bytes
+        return self._dead_bytes / total if total else 0.0
+
+    def maybe_compact(self) -> bool:
+        if self._dead_bytes < CONTAINER_COMPACT_MIN_BYTES or self.dead_ratio() < CONTAINER_COMPACT_RATIO:
+            return False
+        try:
+            self.compact()
+        except OSError:
+            # e.g. another process holds the file open on Windows; retry on a later write
+            return False
+        return True
+
+    def compact(self):
+        # Rewrite only the live records, in their current order, then swap files;
+        # under the file lock, so no other process appends to the old file meanwhile
+        with self._lock, self._flock:
+            self._refresh()
+            tmp_path = self.path + ".compact"
+            with open(tmp_path, "wb") as out:
+                out.write(CONTAINER_MAGIC)
+                for name, (_, _, mtime) in sorted(self._index.items(), key=lambda item: item[1][0]):
+                    data = self._read_record(name)
+                    name_bytes = name.encode()
+                    out.write(_pack_header(OP_PUT, name_bytes, data, mtime))
+                    out.write(name_bytes)
+                    out.write(data)
+                out.flush()
+                os.fsync(out.fileno())
+            self._file.close()
+            try:
+                os.replace(tmp_path, self.path)
+            except OSError:
+                os.remove(tmp_path)
+                raise
+            finally:
+                self._open()
+
+    def _upgrade(self):
+        # Rewrite a first-format container (no header CRC) in the current format,
+        # keeping its live records; under the file lock, which other processes
+        # take before appending to it
+        with self._flock:
+            with open(self.path, "rb") as f:
+                if f.read(len(CONTAINER_MAGIC_V1)) != CONTAINER_MAGIC_V1:
+                    return  # another process upgraded it first
+                live = {}
+                size = os.fstat(f.fileno()).st_size
+                offset = len(CONTAINER_MAGIC_V1)
+                while offset + RECORD_V1.size <= size:
+                    op, name_len, data_len, crc, mtime = RECORD_V1.unpack(f.read(RECORD_V1.size))
+                    offset += RECORD_V1.size + name_len + data_len
+                    if op not in (OP_PUT, OP_DEL):
+                        raise ValueError(f"Damaged record header in {self.path}")
+                    if offset > size:
+                        break  # torn append
+                    name_bytes = f.read(name_len)
+                    if zlib.crc32(f.read(data_len), zlib.crc32(name_bytes, op)) != crc:
+                        continue
+                    live.pop(name_bytes, None)
+                    if op == OP_PUT:
+                        live[name_bytes] = (offset - data_len, data_len, mtime)
+                tmp_path = self.path + ".compact"
+                with open(tmp_path, "wb") as out:
+                    out.write(CONTAINER_MAGIC)
+                    for name_bytes, (data_offset, data_len, mtime) in live.items():
+                        f.seek(data_offset)
+                        data = f.read(data_len)
+                        out.write(_pack_header(OP_PUT, name_bytes, data, mtime))
+                        out.write(name_bytes)
+                        out.write(data)
+                    out.flush()
+                    os.fsync(out.fileno())
+            os.replace(tmp_path, self.path)
+            fsync_dir(os.path.dirname(self.path) or ".")
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+def _pack_header(op: int, name_bytes: bytes, data: bytes, mtime: float) -> bytes:
+    crc = zlib.crc32(data, zlib.crc32(name_bytes, op))
+    fields = RECORD.pack(op, len(name_bytes), len(data), crc, mtime, 0)[:HEADER_FIELDS]
+    return fields + struct.pack("<I", zlib.crc32(fields))
@@ -0,0 +1,172 @@
+# src/durable.py
+
+# Durable atomic writes with group commit.
+#
+# A file is written under a temporary name next to its target, its data is
+# made durable, it is renamed over the target and the directory is synced, so
+# after a crash the target holds either the old or the new contents. The syncs
+# are the expensive part, so GroupCommit shares them: everything waiting to be
+# committed in a directory at the same moment (one write_many batch, or writers
+# on several threads) goes out together:
+#
+#   1. one data sync for all temp files: syncfs() on Linux, fsync per file elsewhere
+#   2. every rename
+#   3. one fsync of the directory (skipped where directories cannot be opened)
+#
+# Temp names are unique (open_temp), so writers in several processes saving the
+# same file never share or truncate each other's temp file.
+#
+# The first writer to arrive commits for everyone queued behind it; the others
+# wait for that commit rather than issuing their own. DURABLE_WRITES = False
+# keeps the atomic rename but skips the syncs.
+
+import os
+import sys
+import tempfile
+import threading
+from config import DURABLE_WRITES
+
+_syncfs = False  # not looked up yet
+
+def _load_syncfs():
+    # syncfs(2) from the C library already loaded into the process; looked up on
+    # the first multi-file sync, so importing this module stays cheap
+    global _syncfs
+    if _syncfs is False:
+        _syncfs = None
+        if sys.platform.startswith("linux"):
+            import ctypes
+            try:
+                _syncfs = ctypes.CDLL(None, use_errno=True).syncfs
+            except (OSError, AttributeError):
+                pass
+    return _syncfs
+
+def fsync_path(path: str):
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def fsync_dir(directory: str):
+    # Makes renames and unlinks in directory durable; not possible on Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def sync_files(paths, directory: str):
+    # Flush the data of every path (all on directory's filesystem) to disk
+    if len(paths) > 1 and _load_syncfs() is not None:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            if _syncfs(fd) == 0:
+                return
+        finally:
+            os.close(fd)
+    for path in paths:
+        fsync_path(path)
+
+class GroupCommit:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.commits = 0          # group commits issued (one data sync each)
+        self._cond = threading.Condition()
+        self._pending = []        # (temp path, target path) for the open batch
+        self._batch = 0           # id of the batch new arrivals join
+        self._done = -1           # id of the last finished batch
+        self._errors = {}         # batch id -> exception, until every caller in it saw it
+        self._callers = {}        # batch id -> callers in it that have not returned yet
+        self._committing = False
+
+    def commit(self, pairs):
+        # pairs: (temp path, target path) with the temp files written and closed.
+        # Returns once every target holds its new contents durably.
+        pairs = list(pairs)
+        if not pairs:
+            return
+        if not DURABLE_WRITES:
+            for tmp_path, path in pairs:
+                os.replace(tmp_path, path)
+            return
+        with self._cond:
+            self._pending.extend(pairs)
+            batch = self._batch
+            self._callers[batch] = self._callers.get(batch, 0) + 1
+            while self._committing and self._done < batch:
+                self._cond.wait()
+            if self._done >= batch:
+                error = self._collect(batch)
+                if error:
+                    raise error
+                return
+            # Lead: take everything queued so far, including other threads' writes
+            self._committing = True
+            pending, self._pending = self._pending, []
+            self._batch += 1
+        error = None
+        try:
+            self._flush(pending)
+        except Exception as e:
+            error = e
+        with self._cond:
+            self._committing = False
+            self._done = batch
+            if error:
+                self._errors[batch] = error
+            self._collect(batch)
+            self._cond.notify_all()
+        if error:
+            raise error
+
+    def _collect(self, batch: int):
+        # The error of a finished batch for one of its callers; the last caller to
+        # collect drops the batch's bookkeeping. Call with self._cond held.
+        self._callers[batch] -= 1
+        if self._callers[batch]:
+            return self._errors.get(batch)
+        del self._callers[batch]
+        return self._errors.pop(batch, None)
+
+    def _flush(self, pairs):
+        sync_files([tmp_path for tmp_path, _ in pairs], self.directory)
+        for tmp_path, path in pairs:
+            os.replace(tmp_path, path)
+        fsync_dir(self.directory)
+        self.commits += 1
+
+_committers = {}
+_committers_lock = threading.Lock()
+
+def committer(directory: str) -> GroupCommit:
+    # One GroupCommit per directory, so all writers there share commits
+    key = os.path.abspath(directory)
+    with _committers_lock:
+        if key not in _committers:
+            _committers[key] = GroupCommit(key)
+        return _committers[key]
+
+def open_temp(path: str):
+    # A new, uniquely named hidden temp file next to path: (file opened "wb", its path)
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp",
+                                    dir=os.path.dirname(path) or ".")
+    return os.fdopen(fd, "wb"), tmp_path
+
+def write_atomic(path: str, data: bytes):
+    # Replace path with data durably (metadata files: index, catalog, vault)
+    f, tmp_path = open_temp(path)
+    try:
+        with f:
+            f.write(data)
+        committer(os.path.dirname(path) or ".").commit([(tmp_path, path)])
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -1,33 +1,211 @@
+# Password-based note encryption (AES-256-GCM).
+#
+#   current format:  PASSWORD_MAGIC + KDF params(13) + salt(16) + nonce(12) + ciphertext
+#   compressed:      COMPRESSED_MAGIC + codec(1) + KDF params(13) + salt(16) + nonce(12) + ciphertext
+#   legacy format:   salt(16) + nonce(12) + ciphertext, PBKDF2 with kdf.LEGACY_PARAMS
+#
+# The last byte of PASSWORD_MAGIC is the format version. Magic, codec, parameters
+# and salt are authenticated with the ciphertext, so they cannot be swapped for
+# cheaper ones. Plaintexts are compressed before sealing when it pays off (see
+# compress.py); notes stored raw keep the PASSWORD_MAGIC format. All formats stay
+# readable.
+
 import os
+import compress
+import metrics
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-
-def derive_key(password: str, salt: bytes) -> bytes:
-    kdf = PBKDF2HMAC(
-        algorithm=hashes.SHA256(),
-        length=32,             # 256-bit key
-        salt=salt,
-        iterations=100000
-    )
-    return kdf.derive(password.encode())
-
-def encrypt_data(data: bytes, password: str) -> bytes:
-    salt = os.urandom(16)
-    key = derive_key(password, salt)
+from keycache import key_cache
+from kdf import LEGACY_PARAMS, PARAMS_SIZE, current_params, derive, pack_params, unpack_params
+
+PASSWORD_MAGIC = b"SNP\x02"
+COMPRESSED_MAGIC = b"SNP\x03"
+HEADER_SIZE = len(PASSWORD_MAGIC) + PARAMS_SIZE + 16 + 12
+TAG_SIZE = 16
+
+@metrics.instrument("kdf.derive")
+def derive_key(password: str, salt: bytes, params=None) -> bytes:
+    # params: a kdf.KdfParams; defaults to the configured algorithm and cost
+    return derive(password, salt, params or current_params())
+
+def get_key(password: str, salt: bytes, params=None) -> bytes:
+    # Derive the key once per (password, salt, params) and serve repeats from the session cache
+    params = params or current_params()
+    return key_cache.get_or_derive(password, salt, lambda pw, s: derive_key(pw, s, params), params)
+
+def lock():
+    # Wipe all cached keys, e.g. when the app is closed or locked
+    key_cache.clear()
+
+def is_versioned(token: bytes) -> bool:
+    return token[:len(PASSWORD_MAGIC)] in (PASSWORD_MAGIC, COMPRESSED_MAGIC)
+
+def token_codec(token: bytes) -> int:
+    # compress codec id of the plaintext inside token
+    if token[:len(COMPRESSED_MAGIC)] == COMPRESSED_MAGIC and len(token) > len(COMPRESSED_MAGIC):
+        return token[len(COMPRESSED_MAGIC)]
+    return compress.NONE
+
+def _magic(codec: int) -> bytes:
+    return PASSWORD_MAGIC if codec == compress.NONE else COMPRESSED_MAGIC + bytes([codec])
+
+def token_kdf(token: bytes):
+    # (salt, KdfParams) a password-encrypted token was sealed with
+    if is_versioned(token):
+        offset = len(_magic(token_codec(token)))
+        return bytes(token[offset + PARAMS_SIZE:offset + PARAMS_SIZE + 16]), unpack_params(token[offset:])
+    return bytes(token[:16]), LEGACY_PARAMS
+
+def _split(token: bytes):
+    # (key params, salt, nonce, ciphertext, associated data, codec) as views into token
+    view = memoryview(token)
+    salt, params = token_kdf(view)
+    if is_versioned(view):
+        codec = token_codec(view)
+        size = HEADER_SIZE + len(_magic(codec)) - len(PASSWORD_MAGIC)
+        return params, salt, view[size - 12:size], view[size:], view[:size - 12], codec
+    return params, salt, view[16:28], view[28:], None, compress.NONE
+
+@metrics.instrument("crypto.encrypt", metrics.arg_size(0))
+def encrypt_data_parts(data: bytes, password: str, salt: bytes = None, params=None):
+    # (header, ciphertext) for writev-style writes: the header is never glued onto the body
+    if salt is None:
+        salt = os.urandom(16)
+    params = params or current_params()
+    key = get_key(password, salt, params)
     aesgcm = AESGCM(key)
     nonce = os.urandom(12)  # 96-bit nonce for AES-GCM
-    ciphertext = aesgcm.encrypt(nonce, data, None)
-    # Return salt + nonce + ciphertext
-    return salt + nonce + ciphertext
+    codec, data = compress.compress(data)
+    associated = _magic(codec) + pack_params(params) + bytes(salt)
+    return associated + nonce, aesgcm.encrypt(nonce, data, associated)
 
+def encrypt_data(data: bytes, password: str, salt: bytes = None, params=None) -> bytes:
+    # Pass the salt (and params) of an existing note when re-encrypting it so the cached key is reused
+    header, ciphertext = encrypt_data_parts(data, password, salt, params)
+    return header + ciphertext
+
+def get_salt(token: bytes) -> bytes:
+    return token_kdf(token)[0]
+
+@metrics.instrument("crypto.decrypt", metrics.result_size)
 def decrypt_data(token: bytes, password: str) -> bytes:
-    salt = token[:16]
-    nonce = token[16:28]
-    ciphertext = token[28:]
-    key = derive_key(password, salt)
+    # token may be any buffer (bytes, mmap, memoryview); slicing a memoryview copies nothing
+    params, salt, nonce, ciphertext, associated, codec = _split(token)
+    key = get_key(password, salt, params)
     aesgcm = AESGCM(key)
     try:
-        return aesgcm.decrypt(nonce, ciphertext, None)
+        plaintext = aesgcm.decrypt(nonce, ciphertext, associated)
+    except Exception as e:
+        raise ValueError("Incorrect password or corrupted data") from e
+    return compress.decompress(codec, plaintext)
+
+@metrics.instrument("crypto.decrypt", metrics.result_size)
+def decrypt_data_into(token: bytes, password: str, out: bytearray) -> memoryview:
+    # Like decrypt_data, but into a caller-owned buffer that can be reused across
+    # notes; returns a view of the plaintext inside out (of a fresh buffer for
+    # compressed notes, whose out only has to fit the compressed data)
+    params, salt, nonce, ciphertext, associated, codec = _split(token)
+    size = len(ciphertext) - TAG_SIZE
+    if size < 0:
+        raise ValueError("Incorrect password or corrupted data")
+    if len(out) < size:
+        raise ValueError(f"Buffer too small: {size} bytes needed")
+    aesgcm = AESGCM(get_key(password, salt, params))
+    target = memoryview(out)[:size]
+    try:
+        aesgcm.decrypt_into(nonce, ciphertext, associated, target)
     except Exception as e:
         raise ValueError("Incorrect password or corrupted data") from e
+    if codec != compress.NONE:
+        return memoryview(compress.decompress(codec, target))
+    return target
+
+def batch_map(func, items: list, workers: int = None) -> list:
+    # Ordered map, optionally on a thread pool (AES-GCM and the KDFs release the GIL).
+    # Each worker gets one contiguous chunk, so small payloads are not swamped by
+    # per-task overhead.
+    if workers and workers > 1 and len(items) > 1:
+        from concurrent.futures import ThreadPoolExecutor  # only batches need a pool
+        size = -(-len(items) // workers)
+        chunks = [items[i:i + size] for i in range(0, len(items), size)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [result for chunk in pool.map(lambda chunk: [func(item) for item in chunk], chunks) for result in chunk]
+    return [func(item) for item in items]
+
+def encrypt_many(payloads, password: str, salt: bytes = None, params=None, workers: int = None) -> list:
+    # Encrypt every payload under one derived key: one KDF run and one AESGCM context
+    # for the whole batch, each payload with its own nonce. Every token is sealed in
+    # place in its own output buffer and opens on its own with decrypt_data.
+    payloads = list(payloads)
+    if salt is None:
+        salt = os.urandom(16)
+    params = params or current_params()
+    aesgcm = AESGCM(get_key(password, salt, params))
+    tail = pack_params(params) + bytes(salt)
+
+    @metrics.instrument("crypto.encrypt", metrics.arg_size(0))
+    def seal(data):
+        codec, data = compress.compress(data)
+        associated = _magic(codec) + tail
+        nonce = os.urandom(12)
+        size = len(associated) + 12
+        out = bytearray(size + len(data) + TAG_SIZE)
+        out[:size] = associated + nonce
+        aesgcm.encrypt_into(nonce, data, associated, memoryview(out)[size:])
+        return out
+
+    return batch_map(seal, payloads, workers)
+
+def _batch_ciphers(splits: list, password: str, workers: int = None) -> dict:
+    # One AESGCM per distinct (salt, params); the distinct keys are derived in parallel
+    groups = list({(split[1], split[0]) for split in splits if split is not None})
+    ciphers = batch_map(lambda group: AESGCM(get_key(password, group[0], group[1])), groups, workers)
+    return dict(zip(groups, ciphers))
+
+def _try_split(token):
+    try:
+        return _split(token)
+    except ValueError:
+        return None
+
+def decrypt_many(tokens, password: str, workers: int = None) -> list:
+    # Batch decrypt_data: plaintexts in input order, None for tokens that do not open.
+    # Tokens that share a salt (e.g. from encrypt_many) share one key and one AESGCM.
+    splits = [_try_split(token) for token in tokens]
+    ciphers = _batch_ciphers(splits, password, workers)
+
+    @metrics.instrument("crypto.decrypt", metrics.result_size)
+    def open_one(split):
+        if split is None:
+            return None
+        params, salt, nonce, ciphertext, associated, codec = split
+        try:
+            return compress.decompress(codec, ciphers[(salt, params)].decrypt(nonce, ciphertext, associated))
+        except Exception:
+            return None
+
+    return batch_map(open_one, splits, workers)
+
+def decrypt_each(tokens, password: str):
+    # Yield (index, plaintext view) per token that opens, decrypting into one reused
+    # buffer: each view is only valid until the next one is produced (export paths)
+    tokens = list(tokens)
+    splits = [_try_split(token) for token in tokens]
+    ciphers = _batch_ciphers(splits, password)
+    out = bytearray()
+    for i, split in enumerate(splits):
+        if split is None:
+            continue
+        params, salt, nonce, ciphertext, associated, codec = split
+        size = len(ciphertext) - TAG_SIZE
+        if size < 0:
+            continue
+        if len(out) < size:
+            out = bytearray(size)
+        target = memoryview(out)[:size]
+        try:
+            ciphers[(salt, params)].decrypt_into(nonce, ciphertext, associated, target)
+            if codec != compress.NONE:
+                target = memoryview(compress.decompress(codec, target))
+        except Exception:
+            continue
+        yield i, target
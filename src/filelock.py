@@ -0,0 +1,87 @@
+# src/filelock.py
+
+# Exclusive locks shared between processes, for files that several ShadowNotes
+# processes (the CLI, the GUIs) append to or rewrite.
+#
+# The lock is taken on a separate, empty "<file>.lock" next to the file rather
+# than on the file itself: it stays valid when the file is replaced by a
+# rename (compaction, atomic rewrites), and on Windows, where locks are
+# mandatory, it never blocks plain reads of the data. fcntl.flock is used on
+# POSIX and msvcrt.locking on Windows; both block until the lock is free.
+# A FileLock is also reentrant for the thread holding it, so a locked
+# operation can call another one.
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+def _lock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        # LK_LOCK gives up after about 10 seconds; keep waiting like flock does
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+def _unlock(fd: int):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+class FileLock:
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._thread_lock = threading.RLock()
+        self._owner = None
+        self._depth = 0
+        self._fd = None
+
+    def held(self) -> bool:
+        # True in the thread that holds the lock
+        return self._owner == threading.get_ident()
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                try:
+                    _lock(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            self._fd = fd
+            self._owner = threading.get_ident()
+        self._depth += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd, self._owner = self._fd, None, None
+            try:
+                _unlock(fd)
+            finally:
+                os.close(fd)
+        self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
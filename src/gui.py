@@ -1,10 +1,21 @@
 import tkinter as tk
 from tkinter import simpledialog, messagebox
-import os
 import json
 import hashlib
-from encryption import encrypt_data, decrypt_data
-from storage import NOTES_DIR, save_note, load_note
+from encryption import lock
+from storage import save_note, load_note, load_note_view, write_note, delete_note, list_notes, read_note_head
+from vault import Vault, encrypt_note, decrypt_note, decrypt_text, needs_password, migrate_notes
+from index import NoteIndex, parse_note
+from catalog import Catalog
+from stream import STREAM_MAGIC, is_stream, iter_text
+from scan import scan_notes
+from tasks import TaskRunner
+from notelist import NoteList
+from widgets import ProgressWindow, TodoWindow, VirtualList
+from todos import TodoJournal
+from history import delete_history, record_edit
+from watch import ChangeWatcher, DELETED, update_indexes
+from config import WATCH_INTERVAL_MS
 
 MASTER_FILE = "master.dat"
 TODOS_FILE = "todos.enc"
@@ -42,14 +53,49 @@ class ShadowNotesGUI(tk.Tk):
     def __init__(self):
         super().__init__()
         self.master_password = verify_master_password()
+        try:
+            self.vault = Vault.open(self.master_password)
+        except ValueError as e:
+            messagebox.showwarning("Vault", f"Vault unavailable: {e}")
+            self.vault = None
+        self.note_index = None
+        if self.vault:
+            try:
+                self.note_index = NoteIndex.load(self.vault)
+                if self.note_index.damaged:
+                    messagebox.showwarning("Search Index", "The search index was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Search Index", f"Search index unavailable: {e}")
+        self.catalog = None
+        if self.vault:
+            try:
+                self.catalog = Catalog.load(self.vault)
+                if self.catalog.damaged:
+                    messagebox.showwarning("Catalog", "The catalog was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Catalog", f"Catalog unavailable: {e}")
+        self.note_pages = None  # lazy text chunks of the streamed note being shown
+        # Crypto and disk I/O run here so the window keeps responding (see tasks.py)
+        self.tasks = TaskRunner(self)
+        self.reading = None  # task decrypting the note being opened
+        self.note_list = NoteList()  # sorted, filterable rows behind the notes list
+        self.watcher = None  # notes changed by other processes; used on the worker only
         self.title("ShadowNotes GUI")
         self.geometry("800x600")
         self.create_widgets()
         self.refresh_notes_list()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(WATCH_INTERVAL_MS, self.watch_notes)
 
     def create_widgets(self):
-        self.notes_listbox = tk.Listbox(self, width=40)
-        self.notes_listbox.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
+        self.list_frame = tk.Frame(self)
+        self.list_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter)
+        self.filter_entry = tk.Entry(self.list_frame, textvariable=self.filter_var)
+        self.filter_entry.pack(fill=tk.X, pady=(0, 2))
+        self.notes_view = VirtualList(self.list_frame, self.note_list, width=40, on_activate=self.read_note)
+        self.notes_view.pack(fill=tk.BOTH, expand=True)
         self.buttons_frame = tk.Frame(self)
         self.buttons_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
         self.refresh_button = tk.Button(self.buttons_frame, text="Refresh List", command=self.refresh_notes_list)
@@ -62,22 +108,119 @@ class ShadowNotesGUI(tk.Tk):
         self.edit_button.pack(pady=2)
         self.delete_button = tk.Button(self.buttons_frame, text="Delete Note", command=self.delete_note)
         self.delete_button.pack(pady=2)
+        self.search_button = tk.Button(self.buttons_frame, text="Search", command=self.search_notes)
+        self.search_button.pack(pady=2)
         self.todo_button = tk.Button(self.buttons_frame, text="Todo", command=self.open_todo_window)
         self.todo_button.pack(pady=2)
-        self.note_text = tk.Text(self, wrap=tk.WORD)
+        self.migrate_button = tk.Button(self.buttons_frame, text="Migrate to Vault", command=self.migrate_notes)
+        self.migrate_button.pack(pady=2)
+        self.note_text = tk.Text(self, wrap=tk.WORD, yscrollcommand=self.on_note_scroll)
         self.note_text.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
 
+    def on_close(self):
+        # Stop background work and wipe cached keys before the window goes away
+        self.tasks.shutdown()
+        if self.vault:
+            self.vault.lock()
+        lock()
+        self.destroy()
+
+    def run_task(self, work, on_done, title: str = None, cancellable: bool = False):
+        # Run work(task) off the Tk thread, then on_done(result) back on it. With a
+        # title, a progress window is shown until the task finishes.
+        window = None
+        def done(result):
+            if window:
+                window.close()
+            on_done(result)
+        def failed(e):
+            if window:
+                window.close()
+            messagebox.showerror("Error", str(e))
+        def progress(done, total, message):
+            if window:
+                window.update_progress(done, total, message)
+        task = self.tasks.submit(work, done, failed, progress)
+        if title:
+            window = ProgressWindow(self, title, task if cancellable else None)
+        return task
+
     def refresh_notes_list(self):
-        self.notes_listbox.delete(0, tk.END)
-        files = os.listdir(NOTES_DIR)
-        for f in files:
-            self.notes_listbox.insert(tk.END, f)
+        # Full reload from disk; a single added, edited or deleted note goes
+        # through note_changed() instead
+        def work(task):
+            # A fresh watcher per full reload; its snapshot is the list shown
+            if self.watcher:
+                self.watcher.close()
+            self.watcher = ChangeWatcher()
+            note_list = NoteList()
+            note_list.load(self.watcher.snapshot, self.catalog.entries if self.catalog else None)
+            return note_list
+        def loaded(note_list):
+            note_list.set_filter(self.filter_var.get())
+            self.note_list = self.notes_view.model = note_list
+            self.notes_view.refresh()
+        self.run_task(work, loaded)
+
+    def note_changed(self, filename: str, deleted: bool = False):
+        if deleted:
+            self.note_list.remove(filename)
+            self.notes_view.refresh()
+        else:
+            self.note_list.upsert(filename, self.catalog.entries.get(filename) if self.catalog else None)
+            self.notes_view.show(filename)
+
+    def watch_notes(self):
+        # Pick up notes added, edited or deleted by another process (e.g. the CLI).
+        # Skipped while other work is queued; errors are retried on the next tick.
+        if self.watcher and not self.tasks.busy:
+            self.tasks.submit(self.sync_changes, self.apply_changes, lambda e: None)
+        self.after(WATCH_INTERVAL_MS, self.watch_notes)
+
+    def sync_changes(self, task):
+        # Worker side of watch_notes
+        changes = self.watcher.poll()
+        update_indexes(changes, self.vault, self.note_index, self.catalog)
+        return changes
+
+    def apply_changes(self, changes):
+        for change in changes:
+            if change.kind == DELETED:
+                self.note_list.remove(change.filename)
+            else:
+                self.note_list.upsert(change.filename, self.catalog.entries.get(change.filename) if self.catalog else None)
+        if changes:
+            self.notes_view.refresh()
+
+    def on_filter(self, *args):
+        # Filter-as-you-type over names, titles and tags
+        if self.note_list.set_filter(self.filter_var.get()):
+            self.notes_view.top = 0
+            self.notes_view.refresh()
+
+    def selected_note(self):
+        filename = self.notes_view.selection()
+        if filename is None:
+            messagebox.showwarning("Warning", "No note selected")
+        return filename
+
+    def ask_note_password(self, filename: str):
+        # Returns (ok, password); only the note header is read on the Tk thread
+        try:
+            head = read_note_head(filename, len(STREAM_MAGIC) + 1)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return False, None
+        if not needs_password(head):
+            return True, None
+        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
+        return password is not None, password
 
     def add_note(self):
         note_content = simpledialog.askstring("Add Note", "Enter note content:")
         if note_content is None:
             return
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
+        password = simpledialog.askstring("Note Password", "Enter password for the note (leave blank to use the vault key):", show="*")
         if password is None:
             return
         custom_filename = simpledialog.askstring("Custom Filename", "Enter custom filename (optional):")
@@ -85,51 +228,90 @@ class ShadowNotesGUI(tk.Tk):
         tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
         note_obj = {"content": note_content, "tags": tags}
         note_json = json.dumps(note_obj)
-        encrypted = encrypt_data(note_json.encode(), password)
-        filename = save_note(encrypted, custom_filename)
-        messagebox.showinfo("Success", f"Note saved as {filename}")
-        self.refresh_notes_list()
+        def work(task):
+            encrypted = encrypt_note(note_json.encode(), password, self.vault)
+            filename = save_note(encrypted, custom_filename)
+            if self.watcher:
+                self.watcher.acknowledge(filename)
+            if self.note_index:
+                self.note_index.update(filename, note_obj, encrypted)
+            if self.catalog:
+                self.catalog.record(filename, note_json.encode(), note_obj, encrypted)
+            return filename
+        def saved(filename):
+            messagebox.showinfo("Success", f"Note saved as {filename}")
+            self.note_changed(filename)
+        self.run_task(work, saved)
 
     def read_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
-        if password is None:
+        ok, password = self.ask_note_password(filename)
+        if not ok:
             return
-        try:
-            encrypted = load_note(filename)
-            decrypted = decrypt_data(encrypted, password)
+        if self.reading:
+            # A newer selection wins; the older result is dropped when it arrives
+            self.reading.cancel()
+        self.note_pages = None
+        self.note_text.delete(1.0, tk.END)
+        self.note_text.insert(tk.END, f"Decrypting {filename}...")
+        def work(task):
+            head = read_note_head(filename, len(STREAM_MAGIC))
+            if is_stream(head):
+                # Large note: show the first screenful now, the rest as the user scrolls
+                pages = iter_text(filename, password, self.vault)
+                return pages, next(pages, "")
+            decrypted = decrypt_note(load_note_view(filename), password, self.vault)
             try:
                 note_obj = json.loads(decrypted.decode())
                 content = note_obj.get("content", "")
                 tags = note_obj.get("tags", [])
-                display_text = f"Content:\n{content}\n\nTags: {', '.join(tags)}"
+                return None, f"Content:\n{content}\n\nTags: {', '.join(tags)}"
             except json.JSONDecodeError:
-                display_text = decrypted.decode()
+                return None, decrypted.decode()
+        def show(result):
+            if task.cancelled:
+                return
+            self.reading = None
+            self.note_pages, display_text = result
             self.note_text.delete(1.0, tk.END)
             self.note_text.insert(tk.END, display_text)
-        except Exception as e:
+        task = self.reading = self.run_task(work, show)
+
+    def load_more_note_text(self):
+        if self.note_pages is None:
+            return
+        try:
+            self.note_text.insert(tk.END, next(self.note_pages))
+        except StopIteration:
+            self.note_pages = None
+        except ValueError as e:
+            self.note_pages = None
             messagebox.showerror("Error", str(e))
 
+    def on_note_scroll(self, first, last):
+        # yscrollcommand of the note view: fetch the next chunk near the bottom
+        if self.note_pages is not None and float(last) > 0.9:
+            self.after_idle(self.load_more_note_text)
+
     def edit_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
-        if password is None:
+        ok, password = self.ask_note_password(filename)
+        if not ok:
             return
-        try:
+        def load(task):
             encrypted = load_note(filename)
-            decrypted = decrypt_data(encrypted, password)
+            decrypted = decrypt_note(encrypted, password, self.vault)
             try:
                 note_obj = json.loads(decrypted.decode())
             except json.JSONDecodeError:
                 note_obj = {"content": decrypted.decode(), "tags": []}
+            return encrypted, decrypted, note_obj
+        def edit(result):
+            encrypted, decrypted, note_obj = result
             current_content = note_obj.get("content", "")
             current_tags = note_obj.get("tags", [])
             new_content = simpledialog.askstring("Edit Note", "Enter new content (leave blank to keep unchanged):", initialvalue=current_content)
@@ -139,92 +321,109 @@ class ShadowNotesGUI(tk.Tk):
             if new_tags:
                 note_obj["tags"] = [tag.strip() for tag in new_tags.split(",")]
             new_note_json = json.dumps(note_obj)
-            new_encrypted = encrypt_data(new_note_json.encode(), password)
-            filepath = os.path.join(NOTES_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(new_encrypted)
-            messagebox.showinfo("Success", "Note updated")
-            self.refresh_notes_list()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            def save(task):
+                new_encrypted = encrypt_note(new_note_json.encode(), password, self.vault, encrypted)
+                write_note(filename, new_encrypted)
+                if self.watcher:
+                    self.watcher.acknowledge(filename)
+                if self.note_index:
+                    self.note_index.update(filename, note_obj, new_encrypted)
+                if self.catalog:
+                    self.catalog.record(filename, new_note_json.encode(), note_obj, new_encrypted)
+                record_edit(filename, decrypted, new_note_json.encode(), password, self.vault)
+            def saved(_):
+                messagebox.showinfo("Success", "Note updated")
+                self.note_changed(filename)
+            self.run_task(save, saved)
+        self.run_task(load, edit)
 
     def delete_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
         confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {filename}?")
-        if confirm:
-            filepath = os.path.join(NOTES_DIR, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        if not confirm:
+            return
+        def work(task):
+            if not delete_note(filename):
+                return False
+            delete_history(filename)
+            if self.watcher:
+                self.watcher.acknowledge(filename)
+            if self.note_index:
+                self.note_index.remove(filename)
+            if self.catalog:
+                self.catalog.remove(filename)
+            return True
+        def deleted(found):
+            if found:
                 messagebox.showinfo("Deleted", "Note deleted")
-                self.refresh_notes_list()
+                self.note_changed(filename, deleted=True)
             else:
                 messagebox.showerror("Error", "Note not found")
+        self.run_task(work, deleted)
+
+    def search_notes(self):
+        search_term = simpledialog.askstring("Search Notes", "Enter keyword to search:")
+        if not search_term or not search_term.strip():
+            return
+        search_term = search_term.strip().lower()
+        password = simpledialog.askstring("Note Password", "Enter note password for old-format notes (leave blank for vault notes only):", show="*")
+        if password is None:
+            return
+        password = password or None
+        def matches(filename, decrypted):
+            note_obj = parse_note(decrypted)
+            if isinstance(note_obj, dict):
+                text = note_obj.get("content", "") + " " + " ".join(note_obj.get("tags", []))
+            else:
+                text = str(note_obj)
+            return search_term in text.lower()
+        def work(task):
+            files = list_notes()
+            if self.note_index:
+                files = self.note_index.candidates(search_term, files)
+            found, failed = [], []
+            results = scan_notes(files, lambda token: decrypt_text(token, password, self.vault), matches, cancel=task.cancel_event)
+            for done, result in enumerate(results, 1):
+                if result.error:
+                    failed.append(result.filename)
+                elif result.value:
+                    found.append(result.filename)
+                task.progress(done, len(files), f"Searched {done} of {len(files)} note(s), {len(found)} match(es)")
+            return sorted(found), failed
+        def show(result):
+            found, failed = result
+            lines = [f"Matches for '{search_term}'" + (" (search cancelled)" if task.cancelled else "") + ":"]
+            lines += found or ["No matches found."]
+            if failed:
+                lines.append(f"\nSkipped {len(failed)} note(s) that could not be opened.")
+            self.note_pages = None
+            self.note_text.delete(1.0, tk.END)
+            self.note_text.insert(tk.END, "\n".join(lines))
+        task = self.run_task(work, show, "Search Notes", cancellable=True)
+
+    def migrate_notes(self):
+        if self.vault is None:
+            messagebox.showerror("Error", "Vault is locked")
+            return
+        password = simpledialog.askstring("Migrate Notes", "Enter the password of the old-format notes to migrate:", show="*")
+        if password is None:
+            return
+        def migrated(result):
+            migrated, failed = result
+            message = f"Migrated {len(migrated)} note(s) to the vault."
+            if failed:
+                message += "\nCould not open with this password: " + ", ".join(failed)
+            messagebox.showinfo("Migrate Notes", message)
+        self.run_task(lambda task: migrate_notes(self.vault, password), migrated, "Migrate Notes")
 
     def open_todo_window(self):
-        # Load todos from TODOS_FILE
-        if os.path.exists(TODOS_FILE):
-            try:
-                with open(TODOS_FILE, "rb") as f:
-                    encrypted_todos = f.read()
-                todos_json = decrypt_data(encrypted_todos, self.master_password)
-                todos = json.loads(todos_json.decode())
-            except Exception as e:
-                messagebox.showerror("Error", f"Error loading todos: {e}")
-                todos = []
-        else:
-            todos = []
-        todo_win = tk.Toplevel(self)
-        todo_win.title("Todo List")
-        todo_win.geometry("400x300")
-        listbox = tk.Listbox(todo_win)
-        listbox.pack(fill=tk.BOTH, expand=True)
-        for i, t in enumerate(todos):
-            status = "Done" if t["done"] else "Pending"
-            listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        def add_task():
-            task = simpledialog.askstring("New Task", "Enter new todo task:", parent=todo_win)
-            if task:
-                todos.append({"task": task, "done": False})
-                listbox.insert(tk.END, f"{len(todos)-1}: {task} [Pending]")
-        def mark_done():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                todos[idx]["done"] = True
-                listbox.delete(idx)
-                status = "Done"
-                listbox.insert(idx, f"{idx}: {todos[idx]['task']} [{status}]")
-        def delete_task():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                listbox.delete(idx)
-                todos.pop(idx)
-                listbox.delete(0, tk.END)
-                for i, t in enumerate(todos):
-                    status = "Done" if t["done"] else "Pending"
-                    listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        add_btn = tk.Button(todo_win, text="Add Task", command=add_task)
-        add_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        done_btn = tk.Button(todo_win, text="Mark Done", command=mark_done)
-        done_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        delete_btn = tk.Button(todo_win, text="Delete Task", command=delete_task)
-        delete_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        def save_todos():
-            try:
-                todos_json = json.dumps(todos).encode()
-                encrypted_todos = encrypt_data(todos_json, self.master_password)
-                with open(TODOS_FILE, "wb") as f:
-                    f.write(encrypted_todos)
-                messagebox.showinfo("Success", "Todos saved.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error saving todos: {e}")
-        save_btn = tk.Button(todo_win, text="Save Todos", command=save_todos)
-        save_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        # Open the todo journal in the background, then show the window; every
+        # change is appended to the journal as it is made (see todos.py)
+        def opened(journal):
+            TodoWindow(self, journal, self.run_task)
+        self.run_task(lambda task: TodoJournal.open(TODOS_FILE, self.master_password), opened)
 
 if __name__ == "__main__":
     app = ShadowNotesGUI()
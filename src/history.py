@@ -0,0 +1,407 @@
+# src/history.py
+
+# Per-note version history, stored as encrypted deltas.
+#
+# Every saved version of a note is appended to NOTES_DIR/.history/<note>.hist:
+#
+#   header:  HISTORY_MAGIC + mode(1) [+ KDF params(13) + salt(16) in password mode]
+#   record:  sealed length(4) + revision(4) + kind(1) + time(8) + nonce(12) + AES-GCM(body)
+#   body:    SHA-256 of the revision(32) + codec(1) + compressed keyframe text or delta
+#
+# The header and the record's own header are the associated data of each
+# record. A delta turns the previous revision into this one with COPY (range of
+# the previous revision) and INSERT (new bytes) operations, found by trimming
+# the common prefix and suffix and diffing the rest line by line (JSON "\n"
+# escapes count as line ends). A keyframe holds the whole text; one is written
+# once the deltas since the last keyframe outweigh it, so reading any revision
+# decrypts at most about twice the note's size. Deltas are replayed over a list
+# of slices, not copies of the text, so long chains stay cheap.
+#
+# Vault notes are sealed with a vault subkey, notes with their own password
+# with a key from that password. Pruning by count or age drops the oldest
+# revisions: the first kept one becomes a keyframe and the records after it are
+# carried over as they are.
+#
+# Opening, recording and pruning hold an exclusive lock on the history file
+# (filelock.py) and re-read the record positions first, so a CLI and a GUI
+# editing the same note never write the same revision number or use offsets
+# a prune by the other has made stale. A torn last record is cut off under
+# the lock only.
+
+import hashlib
+import os
+import re
+import struct
+import time
+from bisect import bisect_right
+from difflib import SequenceMatcher
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import compress
+import storage
+from config import DURABLE_WRITES, HISTORY_MAX_REVISIONS, HISTORY_MAX_AGE_DAYS
+from durable import write_atomic
+from encryption import get_key
+from filelock import FileLock
+from kdf import PARAMS_SIZE, current_params, pack_params, unpack_params
+
+HISTORY_DIR = ".history"
+HISTORY_MAGIC = b"SNH\x01"
+MODE_VAULT = 1
+MODE_PASSWORD = 2
+RECORD = struct.Struct("<IIBd")  # sealed length, revision, kind, time
+KEYFRAME = 0
+DELTA = 1
+DIGEST_SIZE = 32
+
+COPY = 0
+INSERT = 1
+COPY_OP = struct.Struct("<BII")  # op, offset, length
+INSERT_OP = struct.Struct("<BI")  # op, length; the bytes follow
+
+BLOCK = 64 * 1024
+UNIT = re.compile(rb".*?(?:\\n|\n)|.+", re.S)
+
+def history_path(filename: str) -> str:
+    return os.path.join(storage.NOTES_DIR, HISTORY_DIR, filename + ".hist")
+
+def _common_prefix(a: bytes, b: bytes) -> int:
+    size = min(len(a), len(b))
+    i = 0
+    while i < size and a[i:i + BLOCK] == b[i:i + BLOCK]:
+        i += BLOCK
+    if i >= size:
+        return size
+    lo, hi = i, min(i + BLOCK, size)  # a[:lo] == b[:lo], mismatch before hi
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _common_suffix(a: bytes, b: bytes, limit: int) -> int:
+    # Length of the common suffix, at most limit
+    i = 0
+    while i < limit:
+        step = min(BLOCK, limit - i)
+        if a[len(a) - i - step:len(a) - i] != b[len(b) - i - step:len(b) - i]:
+            break
+        i += step
+    else:
+        return limit
+    lo, hi = i, i + step
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:len(a) - lo] == b[len(b) - mid:len(b) - lo]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+def _offsets(units) -> list:
+    offsets = [0]
+    for unit in units:
+        offsets.append(offsets[-1] + len(unit))
+    return offsets
+
+def make_delta(base: bytes, text: bytes) -> bytes:
+    # COPY/INSERT operations that turn base into text
+    prefix = _common_prefix(base, text)
+    suffix = _common_suffix(base, text, min(len(base), len(text)) - prefix)
+    ops = []
+    if prefix:
+        ops.append((COPY, 0, prefix))
+    a, b = base[prefix:len(base) - suffix], text[prefix:len(text) - suffix]
+    if a and b:
+        units_a, units_b = UNIT.findall(a), UNIT.findall(b)
+        offsets_a, offsets_b = _offsets(units_a), _offsets(units_b)
+        for tag, i1, i2, j1, j2 in SequenceMatcher(None, units_a, units_b).get_opcodes():
+            if tag == "equal":
+                ops.append((COPY, prefix + offsets_a[i1], offsets_a[i2] - offsets_a[i1]))
+            elif j2 > j1:
+                ops.append((INSERT, b[offsets_b[j1]:offsets_b[j2]]))
+    elif b:
+        ops.append((INSERT, b))
+    if suffix:
+        ops.append((COPY, len(base) - suffix, suffix))
+    out = []
+    for op in ops:
+        if op[0] == COPY:
+            out.append(COPY_OP.pack(*op))
+        else:
+            out.append(INSERT_OP.pack(INSERT, len(op[1])))
+            out.append(op[1])
+    return b"".join(out)
+
+def apply_delta(pieces: list, delta) -> list:
+    # New list of slices for the revision delta describes, built from the slices
+    # of the previous one; nothing is copied until the caller joins them
+    ends = _offsets(pieces)[1:]
+    view = memoryview(delta)
+    out = []
+    pos = 0
+    while pos < len(view):
+        if view[pos] == COPY:
+            _, offset, length = COPY_OP.unpack_from(view, pos)
+            pos += COPY_OP.size
+            i = bisect_right(ends, offset)
+            start = offset - (ends[i - 1] if i else 0)
+            while length > 0:
+                if i >= len(pieces):
+                    raise ValueError("Damaged note history")
+                piece = pieces[i][start:start + length]
+                out.append(piece)
+                length -= len(piece)
+                i, start = i + 1, 0
+        else:
+            _, length = INSERT_OP.unpack_from(view, pos)
+            pos += INSERT_OP.size
+            out.append(view[pos:pos + length])
+            pos += length
+    return out
+
+class NoteHistory:
+    def __init__(self, path: str, header: bytes, key: bytes, lock: FileLock = None):
+        self.path = path
+        self._header = header
+        self._aesgcm = AESGCM(key)
+        self.entries = []  # (revision, kind, time, offset, size) per record, oldest first
+        self._last_digest = None
+        self._lock = lock or FileLock(path)
+        self._end = len(header)  # offset just past the last whole record
+        self._ino = None
+
+    @classmethod
+    def open(cls, filename: str, password: str = None, vault=None) -> "NoteHistory":
+        # The note's history; password for notes with their own password, else the vault
+        path = history_path(filename)
+        lock = FileLock(path)
+        try:
+            lock.acquire()
+        except FileNotFoundError:
+            return cls._new(path, lock, password, vault)  # no history directory yet
+        try:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                    ino = os.fstat(f.fileno()).st_ino
+            except FileNotFoundError:
+                return cls._new(path, lock, password, vault)
+            history = cls._parse(path, lock, data, password, vault)
+            history._ino = ino
+            return history
+        finally:
+            lock.release()
+
+    @classmethod
+    def _new(cls, path: str, lock: FileLock, password: str = None, vault=None) -> "NoteHistory":
+        if password:
+            salt, params = os.urandom(16), current_params()
+            header = HISTORY_MAGIC + bytes([MODE_PASSWORD]) + pack_params(params) + salt
+            return cls(path, header, get_key(password, salt, params), lock)
+        if vault is None:
+            raise ValueError("Vault is locked; a note password is required")
+        return cls(path, HISTORY_MAGIC + bytes([MODE_VAULT]), vault.derive_key(b"history"), lock)
+
+    @classmethod
+    def _parse(cls, path: str, lock: FileLock, data: bytes, password: str = None, vault=None) -> "NoteHistory":
+        if data[:len(HISTORY_MAGIC)] != HISTORY_MAGIC or len(data) <= len(HISTORY_MAGIC):
+            raise ValueError("Damaged note history")
+        mode = data[len(HISTORY_MAGIC)]
+        start = len(HISTORY_MAGIC) + 1
+        if mode == MODE_PASSWORD:
+            if not password:
+                raise ValueError("A note password is required for this history")
+            params = unpack_params(data[start:])
+            salt = data[start + PARAMS_SIZE:start + PARAMS_SIZE + 16]
+            start += PARAMS_SIZE + 16
+            key = get_key(password, salt, params)
+        elif mode == MODE_VAULT:
+            if vault is None:
+                raise ValueError("Vault is locked")
+            key = vault.derive_key(b"history")
+        else:
+            raise ValueError("Damaged note history")
+        history = cls(path, data[:start], key, lock)
+        history._index(data, start)
+        return history
+
+    def _index(self, data: bytes, offset: int):
+        # Record positions from their headers alone; a torn last record is cut off,
+        # with the lock held (without it, it may be another process's append)
+        self.entries = []
+        while offset + RECORD.size <= len(data):
+            size, revision, kind, stamp = RECORD.unpack_from(data, offset)
+            if offset + RECORD.size + size > len(data):
+                break
+            self.entries.append((revision, kind, stamp, offset, RECORD.size + size))
+            offset += RECORD.size + size
+        if offset != len(data) and self._lock.held():
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+        self._end = offset
+        self._last_digest = self._open_record(data, *self.entries[-1][3:])[0] if self.entries else None
+
+    def _refresh(self):
+        # Catch up with revisions recorded, or a prune done, by another process;
+        # call with the lock held
+        try:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                if st.st_ino == self._ino and st.st_size == self._end:
+                    return
+                data = f.read()
+        except FileNotFoundError:
+            self.entries, self._last_digest, self._end, self._ino = [], None, len(self._header), None
+            return
+        if data[:len(self._header)] != self._header:
+            # Another process started this history with its own salt
+            raise ValueError("Note history was replaced by another process")
+        self._index(data, len(self._header))
+        self._ino = st.st_ino
+
+    def _open_record(self, data, offset: int, size: int):
+        # (digest, payload) of the record at data[offset:offset + size]
+        view = memoryview(data)
+        record_header = view[offset:offset + RECORD.size]
+        sealed = view[offset + RECORD.size:offset + size]
+        try:
+            body = self._aesgcm.decrypt(sealed[:12], sealed[12:], self._header + bytes(record_header))
+        except Exception as e:
+            raise ValueError("Incorrect password or damaged note history") from e
+        return body[:DIGEST_SIZE], compress.decompress(body[DIGEST_SIZE], memoryview(body)[DIGEST_SIZE + 1:])
+
+    def _seal(self, revision: int, kind: int, stamp: float, digest: bytes, payload: bytes) -> bytes:
+        codec, packed = compress.compress(payload)
+        body = digest + bytes([codec]) + packed
+        record_header = RECORD.pack(12 + len(body) + 16, revision, kind, stamp)
+        nonce = os.urandom(12)
+        return record_header + nonce + self._aesgcm.encrypt(nonce, body, self._header + record_header)
+
+    def revisions(self) -> list:
+        # (revision, time) of every stored revision, oldest first
+        return [(revision, stamp) for revision, _, stamp, _, _ in self.entries]
+
+    def _position(self, revision: int) -> int:
+        for i, entry in enumerate(self.entries):
+            if entry[0] == revision:
+                return i
+        raise KeyError(revision)
+
+    def get(self, revision: int) -> bytes:
+        # Text of one revision: its keyframe plus the deltas after it
+        i = self._position(revision)
+        k = i
+        while self.entries[k][1] != KEYFRAME:
+            k -= 1
+        start, end = self.entries[k][3], self.entries[i][3] + self.entries[i][4]
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(end - start)
+        pieces = []
+        for j in range(k, i + 1):
+            digest, payload = self._open_record(data, self.entries[j][3] - start, self.entries[j][4])
+            pieces = [memoryview(payload)] if j == k else apply_delta(pieces, payload)
+        text = b"".join(pieces)
+        if hashlib.sha256(text).digest() != digest:
+            raise ValueError("Damaged note history")
+        return text
+
+    def record(self, text: bytes, previous: bytes = None):
+        # Add text as the newest revision; returns its number, or None if it equals
+        # the newest one. previous: the text it replaces, if the caller has it, so
+        # the delta needs no reconstruction.
+        digest = hashlib.sha256(text).digest()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            self._refresh()
+            if digest == self._last_digest:
+                return None
+            return self._record(text, digest, previous)
+
+    def _record(self, text: bytes, digest: bytes, previous: bytes = None):
+        stamp = time.time()
+        if not self.entries:
+            # A new history starts with a keyframe of the oldest text known
+            first = text if previous is None else previous
+            write_atomic(self.path, self._header + self._seal(1, KEYFRAME, stamp, hashlib.sha256(first).digest(), first))
+            self._refresh()
+            if self._last_digest == digest:
+                return 1
+        if previous is None or hashlib.sha256(previous).digest() != self._last_digest:
+            previous = self.get(self.entries[-1][0])
+        revision = self.entries[-1][0] + 1
+        delta = make_delta(previous, text)
+        chain = 0
+        for entry in reversed(self.entries):
+            if entry[1] == KEYFRAME:
+                keyframe_size = entry[4]
+                break
+            chain += entry[4]
+        kind = KEYFRAME if chain + len(delta) > keyframe_size else DELTA
+        record = self._seal(revision, kind, stamp, digest, text if kind == KEYFRAME else delta)
+        with open(self.path, "r+b") as f:
+            if os.fstat(f.fileno()).st_size > self._end:
+                f.truncate(self._end)  # torn record left by a crash
+            f.seek(self._end)
+            f.write(record)
+            f.flush()
+            if DURABLE_WRITES:
+                os.fsync(f.fileno())
+        self.entries.append((revision, kind, stamp, self._end, len(record)))
+        self._end += len(record)
+        self._last_digest = digest
+        self._prune_if_due()
+        return revision
+
+    def _prune_if_due(self):
+        # Prune once an eighth over the limit, so a full history is not rewritten on every save
+        over = HISTORY_MAX_REVISIONS and len(self.entries) > HISTORY_MAX_REVISIONS + HISTORY_MAX_REVISIONS // 8
+        expired = HISTORY_MAX_AGE_DAYS and self.entries[0][2] < time.time() - HISTORY_MAX_AGE_DAYS * 86400
+        if over or expired:
+            self.prune(HISTORY_MAX_REVISIONS, HISTORY_MAX_AGE_DAYS)
+
+    def prune(self, keep: int = None, max_age_days: float = None) -> int:
+        # Drop the oldest revisions beyond keep and those older than max_age_days (the
+        # newest revision always stays); returns how many were dropped
+        with self._lock:
+            self._refresh()
+            return self._prune(keep, max_age_days)
+
+    def _prune(self, keep: int = None, max_age_days: float = None) -> int:
+        cut = 0
+        if keep:
+            cut = max(cut, len(self.entries) - keep)
+        if max_age_days is not None:
+            cutoff = time.time() - max_age_days * 86400
+            cut = max(cut, sum(1 for entry in self.entries if entry[2] < cutoff))
+        cut = min(cut, len(self.entries) - 1)
+        if cut <= 0:
+            return 0
+        revision, kind, stamp, offset, size = self.entries[cut]
+        with open(self.path, "rb") as f:
+            data = f.read()
+        if kind == KEYFRAME:
+            first = data[offset:offset + size]
+        else:
+            text = self.get(revision)
+            first = self._seal(revision, KEYFRAME, stamp, hashlib.sha256(text).digest(), text)
+        write_atomic(self.path, self._header + first + data[offset + size:])
+        self._refresh()
+        return cut
+
+def record_edit(filename: str, previous: bytes, text: bytes, password: str = None, vault=None) -> bool:
+    # Keep the old and new text of an edited note; False if the history could not be
+    # written (the edit itself is already saved)
+    try:
+        NoteHistory.open(filename, password, vault).record(text, previous)
+        return True
+    except (OSError, ValueError):
+        return False
+
+def delete_history(filename: str):
+    try:
+        os.remove(history_path(filename))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,139 @@
+# src/index.py
+
+# Encrypted inverted index for the search command.
+#
+# Maps lower-cased word tokens from note content and tags to the filenames that
+# contain them. The index is stored in NOTES_DIR/.index, a metadata log
+# encrypted with the vault key (see metalog.py), and kept up to date by the
+# add/edit/delete/attach paths. Search only has to decrypt notes the index
+# points at (plus any notes it could not index). Attachments get an empty entry,
+# so search never opens them. Notes sealed with their own password are
+# never indexed: their words would be readable with the master password alone.
+
+import json
+import os
+import re
+import storage
+from metalog import MetadataLog
+from scan import scan_notes
+from vault import decrypt_text, needs_password
+
+INDEX_FILE = ".index"
+TOKEN_RE = re.compile(r"\w+")
+
+def index_path() -> str:
+    return os.path.join(storage.NOTES_DIR, INDEX_FILE)
+
+def tokenize(text: str) -> set:
+    return set(TOKEN_RE.findall(text.lower()))
+
+def note_tokens(note_obj) -> set:
+    if isinstance(note_obj, dict):
+        text = note_obj.get("content", "") + " " + " ".join(note_obj.get("tags", []))
+    else:
+        text = str(note_obj)
+    return tokenize(text)
+
+def parse_note(decrypted: bytes):
+    try:
+        text = decrypted.decode()
+    except UnicodeDecodeError:
+        # Binary attachment (see stream.py): nothing to index
+        return {"content": "", "tags": []}
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return {"content": text, "tags": []}
+
+class NoteIndex(MetadataLog):
+    LEGACY_KEY = "docs"
+
+    def __init__(self, vault):
+        super().__init__(vault, index_path(), b"search index")
+
+    def _clear(self):
+        self.postings = {}  # token -> filenames
+        self.docs = {}      # filename -> sorted tokens
+
+    def _put(self, filename: str, tokens):
+        self._delete(filename)
+        self.docs[filename] = tokens
+        for token in tokens:
+            self.postings.setdefault(token, set()).add(filename)
+
+    def _delete(self, filename: str):
+        for token in self.docs.pop(filename, ()):
+            files = self.postings.get(token)
+            if files is not None:
+                files.discard(filename)
+                if not files:
+                    del self.postings[token]
+
+    def _entries(self) -> dict:
+        return self.docs
+
+    def update(self, filename: str, note_obj, encrypted: bytes):
+        self.update_many([(filename, note_obj, encrypted)])
+
+    def update_many(self, items):
+        # items: (filename, note_obj, stored note) triples; one append for the whole
+        # batch (bulk import). A note with its own password loses any entry it had.
+        puts, deletes = {}, []
+        for filename, note_obj, encrypted in items:
+            if needs_password(encrypted):
+                deletes.append(filename)
+            else:
+                puts[filename] = sorted(note_tokens(note_obj))
+        self.commit(puts, deletes)
+
+    def add_attachments(self, filenames):
+        # Vault-key attachments (see stream.py): no words, but an entry, so search
+        # knows they hold nothing to find
+        self.commit({filename: [] for filename in filenames})
+
+    def remove(self, filename: str):
+        self.commit(deletes=[filename])
+
+    def remove_many(self, filenames):
+        # One append for the whole batch
+        self.commit(deletes=filenames)
+
+    def rebuild(self, workers: int = None):
+        # Re-index every vault note from scratch; returns the notes that could not be opened
+        docs = {}
+        failed = []
+        decrypt = lambda token: None if needs_password(token) else decrypt_text(token, None, self.vault)
+        tokens = lambda filename, decrypted: None if decrypted is None else sorted(note_tokens(parse_note(decrypted)))
+        for result in scan_notes(storage.list_notes(), decrypt, tokens, workers):
+            if result.error:
+                failed.append(result.filename)
+            elif result.value is not None:
+                docs[result.filename] = result.value
+        self.replace_all(docs)
+        return sorted(failed)
+
+    def lookup(self, term: str):
+        # Filenames whose tokens could contain term as a substring, or None if the
+        # term has no word characters and the index cannot narrow the search
+        words = TOKEN_RE.findall(term.lower())
+        if not words:
+            return None
+        result = None
+        for word in words:
+            files = set()
+            for token, token_files in self.postings.items():
+                if word in token:
+                    files |= token_files
+            result = files if result is None else result & files
+            if not result:
+                break
+        return result
+
+    def candidates(self, term: str, filenames) -> list:
+        # Notes to decrypt for a search: index hits plus any note the index has not
+        # seen (including every note with its own password)
+        self.refresh()
+        hits = self.lookup(term)
+        if hits is None:
+            return list(filenames)
+        return [f for f in filenames if f in hits or f not in self.docs]
@@ -0,0 +1,119 @@
+# src/kdf.py
+
+# Password-based key derivation for ShadowNotes.
+#
+# Every password-protected blob now records how its key was derived, as a fixed
+# 13-byte parameter block: algorithm id(1) + cost(4) + block size(4) + parallelism(4)
+#
+#   PBKDF2-SHA256:  cost = iterations
+#   scrypt:         cost = N, block size = r, parallelism = p
+#
+# New notes and vaults use the parameters from config (see calibrate() to pick
+# them for a host); blobs from before the header existed use LEGACY_PARAMS, so
+# changing the configuration never breaks existing notes.
+
+import struct
+import time
+from collections import namedtuple
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from config import KDF_ALGORITHM, KDF_ITERATIONS, SCRYPT_N, SCRYPT_R, SCRYPT_P, KDF_TARGET_SECONDS
+
+KdfParams = namedtuple("KdfParams", ["algorithm", "cost", "block_size", "parallelism"])
+
+ALGORITHM_IDS = {"pbkdf2": 1, "scrypt": 2}
+ALGORITHM_NAMES = {v: k for k, v in ALGORITHM_IDS.items()}
+PARAMS = struct.Struct("<BIII")
+PARAMS_SIZE = PARAMS.size
+
+# What every header-less blob was derived with (the old hard-coded PBKDF2 setting)
+LEGACY_PARAMS = KdfParams("pbkdf2", 100000, 0, 0)
+
+# Bounds that keep a tampered or mistyped header from being a denial of service
+MIN_ITERATIONS = 10000
+MAX_ITERATIONS = 100000000
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 22
+
+def pbkdf2_params(iterations: int) -> KdfParams:
+    return KdfParams("pbkdf2", iterations, 0, 0)
+
+def scrypt_params(n: int, r: int = 8, p: int = 1) -> KdfParams:
+    return KdfParams("scrypt", n, r, p)
+
+def current_params() -> KdfParams:
+    # Parameters for newly written blobs, from config
+    if KDF_ALGORITHM == "pbkdf2":
+        return pbkdf2_params(KDF_ITERATIONS)
+    if KDF_ALGORITHM == "scrypt":
+        return scrypt_params(SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    raise ValueError(f"Unknown KDF algorithm '{KDF_ALGORITHM}' (use pbkdf2 or scrypt)")
+
+def validate(params: KdfParams) -> KdfParams:
+    if params.algorithm == "pbkdf2":
+        ok = MIN_ITERATIONS <= params.cost <= MAX_ITERATIONS
+    elif params.algorithm == "scrypt":
+        ok = (MIN_SCRYPT_N <= params.cost <= MAX_SCRYPT_N and params.cost & (params.cost - 1) == 0
+              and 1 <= params.block_size <= 32 and 1 <= params.parallelism <= 16)
+    else:
+        ok = False
+    if not ok:
+        raise ValueError(f"Unsupported KDF parameters: {params}")
+    return params
+
+def pack_params(params: KdfParams) -> bytes:
+    validate(params)
+    return PARAMS.pack(ALGORITHM_IDS[params.algorithm], params.cost, params.block_size, params.parallelism)
+
+def unpack_params(blob: bytes) -> KdfParams:
+    if len(blob) < PARAMS_SIZE:
+        raise ValueError("Truncated KDF parameters")
+    algorithm_id, cost, block_size, parallelism = PARAMS.unpack(bytes(blob[:PARAMS_SIZE]))
+    if algorithm_id not in ALGORITHM_NAMES:
+        raise ValueError(f"Unknown KDF algorithm id {algorithm_id}")
+    return validate(KdfParams(ALGORITHM_NAMES[algorithm_id], cost, block_size, parallelism))
+
+def derive(password: str, salt: bytes, params: KdfParams) -> bytes:
+    # 256-bit key from password and salt
+    if params.algorithm == "scrypt":
+        kdf = Scrypt(salt=bytes(salt), length=32, n=params.cost, r=params.block_size, p=params.parallelism)
+    else:
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=bytes(salt), iterations=params.cost)
+    return kdf.derive(password.encode())
+
+def time_params(params: KdfParams) -> float:
+    start = time.perf_counter()
+    derive("calibration", b"\0" * 16, params)
+    return time.perf_counter() - start
+
+def calibrate(target_seconds: float = KDF_TARGET_SECONDS, algorithm: str = "pbkdf2") -> KdfParams:
+    # Benchmark this host and return the costliest parameters that still unlock in
+    # about target_seconds; never weaker than the minimums above
+    if algorithm == "pbkdf2":
+        # Grow the probe until it is long enough to time reliably, then extrapolate
+        probe = MIN_ITERATIONS
+        elapsed = time_params(pbkdf2_params(probe))
+        while elapsed < target_seconds / 4 and probe < MAX_ITERATIONS // 2:
+            probe *= 2
+            elapsed = time_params(pbkdf2_params(probe))
+        iterations = int(probe * target_seconds / max(elapsed, 1e-6))
+        iterations = min(max(iterations // 1000 * 1000, MIN_ITERATIONS), MAX_ITERATIONS)
+        return pbkdf2_params(iterations)
+    if algorithm == "scrypt":
+        # scrypt time grows linearly with N, which must be a power of two
+        elapsed = time_params(scrypt_params(MIN_SCRYPT_N))
+        n = MIN_SCRYPT_N
+        while n * 2 <= MAX_SCRYPT_N and elapsed * (n * 2) / MIN_SCRYPT_N <= target_seconds:
+            n *= 2
+        return scrypt_params(n)
+    raise ValueError(f"Unknown KDF algorithm '{algorithm}' (use pbkdf2 or scrypt)")
+
+if __name__ == "__main__":
+    # Print config.py settings for this machine: python src/kdf.py [target seconds]
+    import sys
+    target = float(sys.argv[1]) if len(sys.argv) > 1 else KDF_TARGET_SECONDS
+    for name in ("pbkdf2", "scrypt"):
+        params = calibrate(target, name)
+        print(f"{name}: {params} -> {time_params(params):.2f}s per unlock")
+    print("Set KDF_ALGORITHM and KDF_ITERATIONS or SCRYPT_N/SCRYPT_R/SCRYPT_P in config.py accordingly.")
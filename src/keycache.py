@@ -0,0 +1,92 @@
+# src/keycache.py
+
+# In-process cache of derived encryption keys for ShadowNotes
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from config import KEY_CACHE_SIZE, KEY_CACHE_TTL
+
+class KeyCache:
+    """
+    Bounded LRU cache of derived keys, keyed by (password fingerprint, salt).
+
+    Passwords are never stored: the fingerprint is an HMAC of the password
+    under a random per-process secret. Cached keys are kept in bytearrays so
+    they can be zeroed when they expire, are evicted or the cache is wiped.
+    """
+
+    def __init__(self, max_size: int = KEY_CACHE_SIZE, ttl: float = KEY_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._secret = os.urandom(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fingerprint(self, password: str, salt: bytes, params=None) -> bytes:
+        mac = hmac.new(self._secret, password.encode(), hashlib.sha256)
+        return mac.digest() + bytes(salt) + repr(params).encode()
+
+    def get(self, password: str, salt: bytes, params=None):
+        fp = self._fingerprint(password, salt, params)
+        with self._lock:
+            entry = self._entries.get(fp)
+            if entry is None:
+                self.misses += 1
+                return None
+            key, expires = entry
+            if time.monotonic() >= expires:
+                self._drop(fp)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fp)
+            self.hits += 1
+            return bytes(key)
+
+    def put(self, password: str, salt: bytes, key: bytes, params=None):
+        if self.max_size <= 0:
+            return
+        fp = self._fingerprint(password, salt, params)
+        with self._lock:
+            if fp in self._entries:
+                self._drop(fp)
+            self._entries[fp] = (bytearray(key), time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+
+    def get_or_derive(self, password: str, salt: bytes, derive, params=None) -> bytes:
+        key = self.get(password, salt, params)
+        if key is None:
+            key = derive(password, salt)
+            self.put(password, salt, key, params)
+        return key
+
+    def purge_expired(self):
+        now = time.monotonic()
+        with self._lock:
+            for fp in [fp for fp, (_, expires) in self._entries.items() if now >= expires]:
+                self._drop(fp)
+
+    def clear(self):
+        # Wipe-on-lock: zero every cached key and forget the fingerprint secret
+        with self._lock:
+            for fp in list(self._entries):
+                self._drop(fp)
+            self._secret = os.urandom(32)
+
+    def _drop(self, fp):
+        key, _ = self._entries.pop(fp)
+        for i in range(len(key)):
+            key[i] = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+# Shared cache used by the encryption module
+key_cache = KeyCache()
@@ -0,0 +1,35 @@
+# src/launch.py
+
+# Entry point of the ShadowNotes executable (see build.py):
+#
+#   ShadowNotes                   launcher window to pick the CLI or GUI (merged.py)
+#   ShadowNotes --cli             the console CLI (main.py)
+#   ShadowNotes list modified     run one CLI command and exit
+#
+# The console paths never import tkinter or the GUI modules, so they start as
+# fast as main.py itself; they use the same master password and todos (in
+# USER_DATA_DIR) as the windows.
+
+import os
+import sys
+from config import USER_DATA_DIR
+
+def run_cli(args):
+    import main
+    os.makedirs(USER_DATA_DIR, exist_ok=True)
+    main.MASTER_FILE = os.path.join(USER_DATA_DIR, "master.dat")
+    main.TODOS_FILE = os.path.join(USER_DATA_DIR, "todos.enc")
+    main.main(args)
+
+def run_launcher():
+    import merged
+    merged.Launcher().mainloop()
+
+def run(argv):
+    if not argv:
+        run_launcher()
+    else:
+        run_cli([] if argv == ["--cli"] else argv)
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
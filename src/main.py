@@ -1,12 +1,28 @@
 import os
+import sys
 import json
 import hashlib
-from encryption import encrypt_data, decrypt_data
-from storage import save_note, load_note, NOTES_DIR
+from datetime import datetime
+import metrics
+from encryption import lock
+from storage import save_note, load_note, load_note_view, write_note, delete_note, list_notes, list_notes_page, read_note_head
+from vault import Vault, encrypt_note, decrypt_note, decrypt_text, needs_password, migrate_notes
+from index import NoteIndex
+from scan import scan_notes
+from catalog import Catalog, PlaintextDigest, format_entry
+from cmdtrace import TraceRecorder
+from bulk import import_notes, export_notes
+from chunks import ChunkStore
+from history import NoteHistory, delete_history, record_edit
+from stream import STREAM_MAGIC, is_stream, save_note_stream, load_note_stream
+from todos import TodoJournal, format_todo, week_ahead
 
 MASTER_FILE = "master.dat"
 TODOS_FILE = "todos.enc"
 
+# Time spent waiting at a prompt is the user's, not the command's (see metrics.py)
+input = metrics.untimed(input)
+
 def load_master_password_hash():
     if os.path.exists(MASTER_FILE):
         with open(MASTER_FILE, "r") as f:
@@ -35,69 +51,143 @@ def verify_master_password():
         print("Incorrect master password!")
         exit(1)
 
-def todo_menu(master_password):
-    # Load todos from TODOS_FILE (encrypted JSON array)
-    if os.path.exists(TODOS_FILE):
-        try:
-            encrypted = open(TODOS_FILE, "rb").read()
-            todos_json = decrypt_data(encrypted, master_password)
-            todos = json.loads(todos_json.decode())
-        except Exception as e:
-            print("Error loading todos:", e)
-            todos = []
-    else:
-        todos = []
+def print_todos(todos):
+    if not todos:
+        print("No todos found.")
+    for t in todos:
+        print(format_todo(t))
+
+def todo_menu(master_password, recorder):
+    # Todos live in an append-only journal (see todos.py): every change is saved as it is made
+    try:
+        journal = TodoJournal.open(TODOS_FILE, master_password)
+    except ValueError as e:
+        print("Error loading todos:", e)
+        return
     while True:
-        sub = input("Todo Menu (add, list, done, delete, back): ").strip().lower()
+        sub = input("Todo Menu (add, list, pending, week, done, priority, due, delete, back): ").strip().lower()
         if sub == "back":
             break
-        elif sub == "add":
+        timer = metrics.CommandTimer("todo." + sub)
+        if sub == "add":
             task = input("Enter new todo task: ")
-            todos.append({"task": task, "done": False})
-            print("Todo added.")
+            priority = input("Priority (high, normal, low) [normal]: ").strip() or "normal"
+            due = input("Due date (YYYY-MM-DD, optional): ").strip() or None
+            try:
+                todo = journal.add(task, priority, due)
+                recorder.record("todo.add", size=len(task), priority=priority, due=due is not None, todo=todo["id"])
+                print("Todo added:", format_todo(todo))
+            except ValueError as e:
+                print("Error:", e)
         elif sub == "list":
-            if not todos:
-                print("No todos found.")
-            else:
-                for i, t in enumerate(todos):
-                    status = "Done" if t["done"] else "Pending"
-                    print(f"{i}: {t['task']} [{status}]")
+            recorder.record("todo.list")
+            print_todos(journal.query())
+        elif sub == "pending":
+            recorder.record("todo.pending")
+            print_todos(journal.query("pending"))
+        elif sub == "week":
+            # Pending todos due within the next 7 days, overdue ones included
+            recorder.record("todo.week")
+            print_todos(journal.query("pending", week_ahead()))
         elif sub == "done":
-            index = input("Enter index of todo to mark as done: ")
+            todo_id = input("Enter id of todo to mark as done: ")
             try:
-                idx = int(index)
-                todos[idx]["done"] = True
+                recorder.record("todo.done", todo=int(todo_id))
+                journal.set_done(int(todo_id))
                 print("Todo marked as done.")
             except Exception as e:
                 print("Error:", e)
+        elif sub == "priority":
+            todo_id = input("Enter id of todo: ")
+            priority = input("New priority (high, normal, low): ").strip()
+            try:
+                recorder.record("todo.priority", todo=int(todo_id), priority=priority)
+                journal.update(int(todo_id), priority=priority)
+                print("Priority updated.")
+            except Exception as e:
+                print("Error:", e)
+        elif sub == "due":
+            todo_id = input("Enter id of todo: ")
+            due = input("New due date (YYYY-MM-DD, blank to clear): ").strip() or None
+            try:
+                recorder.record("todo.due", todo=int(todo_id), due=due is not None)
+                journal.update(int(todo_id), due=due)
+                print("Due date updated.")
+            except Exception as e:
+                print("Error:", e)
         elif sub == "delete":
-            index = input("Enter index of todo to delete: ")
+            todo_id = input("Enter id of todo to delete: ")
             try:
-                idx = int(index)
-                todos.pop(idx)
+                recorder.record("todo.delete", todo=int(todo_id))
+                journal.delete(int(todo_id))
                 print("Todo deleted.")
             except Exception as e:
                 print("Error:", e)
         else:
             print("Unknown command.")
-    # Save todos
-    todos_json = json.dumps(todos).encode()
-    encrypted_todos = encrypt_data(todos_json, master_password)
-    with open(TODOS_FILE, "wb") as f:
-        f.write(encrypted_todos)
-    print("Todos saved.")
+        timer.stop()
 
-def main():
+def main(argv=None):
+    # argv: one command to run instead of prompting for commands, e.g. ["list", "modified"]
     master_password = verify_master_password()
-    print("App unlocked.")
-    print("Available commands: add, read, edit, delete, list, search, todo, exit")
+    try:
+        vault = Vault.open(master_password)
+    except ValueError as e:
+        print("Vault unavailable:", e)
+        vault = None
+    note_index = None
+    index_loaded = False
+
+    def load_index():
+        # The search index is read on first use: list and read never need it
+        nonlocal note_index, index_loaded
+        if vault and not index_loaded:
+            index_loaded = True
+            try:
+                note_index = NoteIndex.load(vault)
+                if note_index.damaged:
+                    print("The search index was damaged and has been reset; run reindex to rebuild it.")
+            except ValueError as e:
+                print("Search index unavailable:", e)
+        return note_index
+
+    catalog = None
+    if vault:
+        try:
+            catalog = Catalog.load(vault)
+            if catalog.damaged:
+                print("The catalog was damaged and has been reset; run reindex to rebuild it.")
+        except ValueError as e:
+            print("Catalog unavailable:", e)
+    recorder = TraceRecorder()
+    queued = [" ".join(argv)] if argv else None
+    if queued is None:
+        print("App unlocked.")
+        print("Available commands: add, read, edit, delete, list, search, reindex, migrate, import, export, attach, extract, history, gc, todo, stats, exit")
+        print("Prefix a command with 'profile' or 'memprofile' to run it under cProfile or tracemalloc.")
+    timer = None
     while True:
-        command = input("Command: ").strip().lower()
+        if timer:
+            # A command ends where the next prompt starts (branches leave with continue)
+            report = timer.stop()
+            if report:
+                print(report, end="")
+        if queued is None:
+            line = input("Command: ").strip()
+        else:
+            line = queued.pop() if queued else "exit"
+        line, capture = metrics.parse_capture(line)
+        command = line.lower()
+        timer = metrics.CommandTimer(command.split(" ", 1)[0], capture)
         if command == "exit":
+            if vault:
+                vault.lock()
+            lock()
+            recorder.close()
             break
         elif command == "add":
             note_content = input("Enter note content: ")
-            password = input("Enter note password: ")
+            password = input("Enter note password (leave blank to use the vault key): ")
             custom_filename = input("Enter a custom filename (or leave blank for default): ").strip()
             if custom_filename == "":
                 custom_filename = None
@@ -105,15 +195,25 @@ def main():
             tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
             note_obj = {"content": note_content, "tags": tags}
             note_json = json.dumps(note_obj)
-            encrypted = encrypt_data(note_json.encode(), password)
+            try:
+                encrypted = encrypt_note(note_json.encode(), password, vault)
+            except ValueError as e:
+                print("Error:", e)
+                continue
             filename = save_note(encrypted, custom_filename)
+            if load_index():
+                note_index.update(filename, note_obj, encrypted)
+            if catalog:
+                catalog.record(filename, note_json.encode(), note_obj, encrypted)
+            recorder.record("add", note=recorder.note(filename), size=len(note_content), tags=len(tags), vault=not password)
             print("Note saved as", filename)
         elif command == "read":
             filename = input("Enter filename to read: ")
-            password = input("Enter note password: ")
+            recorder.record("read", note=recorder.note(filename))
             try:
-                encrypted = load_note(filename)
-                decrypted = decrypt_data(encrypted, password)
+                encrypted = load_note_view(filename)
+                password = input("Enter note password: ") if needs_password(encrypted) else None
+                decrypted = decrypt_note(encrypted, password, vault)
                 try:
                     note_obj = json.loads(decrypted.decode())
                     print("Content:", note_obj.get("content", ""))
@@ -124,10 +224,10 @@ def main():
                 print("Error:", e)
         elif command == "edit":
             filename = input("Enter filename to edit: ")
-            password = input("Enter note password: ")
             try:
                 encrypted = load_note(filename)
-                decrypted = decrypt_data(encrypted, password)
+                password = input("Enter note password: ") if needs_password(encrypted) else None
+                decrypted = decrypt_note(encrypted, password, vault)
                 try:
                     note_obj = json.loads(decrypted.decode())
                 except json.JSONDecodeError:
@@ -136,29 +236,57 @@ def main():
                 print("Current tags:", ", ".join(note_obj.get("tags", [])))
                 new_content = input("Enter new content (leave blank to keep unchanged): ")
                 new_tags_input = input("Enter new tags (comma-separated, leave blank to keep unchanged): ").strip()
+                recorder.record("edit", note=recorder.note(filename), size=len(new_content) if new_content else None,
+                                tags=len(new_tags_input.split(",")) if new_tags_input else None)
                 if new_content:
                     note_obj["content"] = new_content
                 if new_tags_input:
                     note_obj["tags"] = [tag.strip() for tag in new_tags_input.split(",")]
                 new_note_json = json.dumps(note_obj)
-                new_encrypted = encrypt_data(new_note_json.encode(), password)
-                filepath = os.path.join(NOTES_DIR, filename)
-                with open(filepath, "wb") as f:
-                    f.write(new_encrypted)
+                new_encrypted = encrypt_note(new_note_json.encode(), password, vault, encrypted)
+                write_note(filename, new_encrypted)
+                if load_index():
+                    note_index.update(filename, note_obj, new_encrypted)
+                if catalog:
+                    catalog.record(filename, new_note_json.encode(), note_obj, new_encrypted)
                 print("Note updated.")
+                if not record_edit(filename, decrypted, new_note_json.encode(), password, vault):
+                    print("Warning: the previous version could not be kept in the note history.")
             except Exception as e:
                 print("Error:", e)
         elif command == "delete":
             filename = input("Enter filename to delete: ")
-            filepath = os.path.join(NOTES_DIR, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            recorder.record("delete", note=recorder.note(filename))
+            if delete_note(filename):
+                delete_history(filename)
+                if load_index():
+                    note_index.remove(filename)
+                if catalog:
+                    catalog.remove(filename)
                 print("Note deleted.")
             else:
                 print("Note not found.")
-        elif command == "list":
-            files = os.listdir(NOTES_DIR)
-            if files:
+        elif command == "list" or command.startswith("list "):
+            # "list modified" / "list size" / ... sorts by catalog metadata
+            recorder.record("list", sort=command[4:].strip() or "name")
+            files = list_notes()
+            if files and catalog:
+                sort = command[4:].strip() or "name"
+                try:
+                    rows = catalog.listing(files, sort, reverse=sort in ("created", "modified", "size"))
+                except ValueError as e:
+                    print("Error:", e)
+                    continue
+                print("Notes:")
+                for f, entry in rows:
+                    print(format_entry(f, entry))
+            elif files:
+                sort = command[4:].strip() or "name"
+                try:
+                    files = list_notes_page(sort, reverse=sort in ("modified", "size"))
+                except ValueError as e:
+                    print("Error:", e)
+                    continue
                 print("Notes:")
                 for f in files:
                     print(f)
@@ -166,12 +294,18 @@ def main():
                 print("No notes found.")
         elif command == "search":
             search_term = input("Enter keyword to search: ").strip().lower()
-            password = input("Enter note password (assuming same for all notes): ")
-            found = False
-            for f in os.listdir(NOTES_DIR):
+            password = input("Enter note password for old-format notes (leave blank for vault notes only): ") or None
+            found = 0
+            files = list_notes()
+            if load_index():
+                files = note_index.candidates(search_term, files)
+            failed = []
+            for result in scan_notes(files, lambda token: decrypt_text(token, password, vault)):
+                if result.error:
+                    failed.append(result.filename)
+                    continue
                 try:
-                    encrypted = load_note(f)
-                    decrypted = decrypt_data(encrypted, password)
+                    decrypted = result.data
                     try:
                         note_obj = json.loads(decrypted.decode())
                         content = note_obj.get("content", "").lower()
@@ -180,17 +314,162 @@ def main():
                         content = decrypted.decode().lower()
                         tags = ""
                     if search_term in content or search_term in tags:
-                        print("Match found in:", f)
-                        found = True
+                        print("Match found in:", result.filename)
+                        found += 1
                 except Exception:
-                    continue
+                    failed.append(result.filename)
+            recorder.record("search", matches=found, vault=password is None)
             if not found:
                 print("No matches found.")
+            if failed:
+                print(f"Skipped {len(failed)} note(s) that could not be opened.")
+        elif command == "reindex":
+            if load_index() is None or catalog is None:
+                print("Error: Search index unavailable")
+                continue
+            # Only vault notes are indexed; notes with their own password are searched by opening them
+            recorder.record("reindex")
+            failed = note_index.rebuild()
+            catalog.rebuild()
+            print("Search index and catalog rebuilt.")
+            if failed:
+                print("Not indexed (could not open):", ", ".join(failed))
+        elif command == "migrate":
+            if vault is None:
+                print("Error: Vault is locked")
+                continue
+            password = input("Enter the password of the old-format notes to migrate: ")
+            recorder.record("migrate")
+            migrated, failed = migrate_notes(vault, password)
+            print(f"Migrated {len(migrated)} note(s) to the vault.")
+            if failed:
+                print("Could not open with this password:", ", ".join(failed))
+        elif command == "import":
+            directory = input("Enter directory of .txt files to import: ").strip()
+            password = input("Enter note password (leave blank to use the vault key): ")
+            try:
+                imported, skipped = import_notes(directory, password, vault)
+            except (OSError, ValueError) as e:
+                print("Error:", e)
+                continue
+            if load_index():
+                note_index.update_many((filename, note_obj, encrypted) for filename, _, note_obj, encrypted in imported)
+            if catalog:
+                catalog.record_many(imported)
+            recorder.record("import", count=len(imported), vault=not password)
+            print(f"Imported {len(imported)} note(s).")
+            if skipped:
+                print("Skipped (a note with that name exists):", ", ".join(skipped))
+        elif command == "export":
+            directory = input("Enter directory to export notes to: ").strip()
+            password = input("Enter note password for old-format notes (leave blank for vault notes only): ") or None
+            try:
+                exported, failed = export_notes(directory, password, vault)
+            except OSError as e:
+                print("Error:", e)
+                continue
+            recorder.record("export", count=len(exported))
+            print(f"Exported {len(exported)} note(s) to {directory} as plain text.")
+            if failed:
+                print("Could not open:", ", ".join(failed))
+        elif command == "attach":
+            # Encrypt a file from disk in segments, without loading it into memory
+            path = input("Enter path of the file to attach: ").strip()
+            password = input("Enter note password (leave blank to use the vault key): ")
+            custom_filename = input("Enter a custom filename (or leave blank for default): ").strip() or None
+            try:
+                with open(path, "rb") as src:
+                    digest = PlaintextDigest(src)
+                    filename = save_note_stream(digest, custom_filename, password, vault)
+                recorder.record("attach", note=recorder.note(filename), size=digest.size, vault=not password)
+                print(f"File attached as {filename}")
+            except (OSError, ValueError) as e:
+                print("Error:", e)
+                continue
+            # An empty index entry keeps search from opening the attachment; the catalog lists it
+            if load_index():
+                if password:
+                    note_index.remove(filename)
+                else:
+                    note_index.add_attachments([filename])
+            if catalog:
+                if password:
+                    catalog.remove(filename)
+                else:
+                    catalog.record_attachments([(filename, digest)])
+        elif command == "extract":
+            filename = input("Enter filename to extract: ")
+            recorder.record("extract", note=recorder.note(filename))
+            path = input("Enter output path: ").strip()
+            try:
+                head = read_note_head(filename, len(STREAM_MAGIC) + 1)
+            except OSError as e:
+                print("Error:", e)
+                continue
+            if not is_stream(head):
+                print("Error: Not an attached file; use read instead")
+                continue
+            password = input("Enter note password: ") if needs_password(head) else None
+            try:
+                with open(path, "wb") as dst:
+                    size = load_note_stream(filename, dst, password, vault)
+                print(f"Extracted {size} bytes to {path}")
+            except ValueError as e:
+                # Never leave a partially decrypted file behind
+                os.remove(path)
+                print("Error:", e)
+            except OSError as e:
+                print("Error:", e)
+        elif command == "history":
+            filename = input("Enter filename: ")
+            recorder.record("history", note=recorder.note(filename))
+            try:
+                encrypted = load_note_view(filename)
+                password = input("Enter note password: ") if needs_password(encrypted) else None
+                history = NoteHistory.open(filename, password, vault)
+                revisions = history.revisions()
+                if not revisions:
+                    print("No earlier versions of this note.")
+                    continue
+                for revision, stamp in revisions:
+                    print(f"{revision}  {datetime.fromtimestamp(stamp):%Y-%m-%d %H:%M:%S}")
+                choice = input("Enter revision to show (leave blank to skip): ").strip()
+                if not choice:
+                    continue
+                text = history.get(int(choice)).decode()
+                try:
+                    note_obj = json.loads(text)
+                    print("Content:", note_obj.get("content", ""))
+                    print("Tags:", ", ".join(note_obj.get("tags", [])))
+                except json.JSONDecodeError:
+                    print("Content:", text)
+            except KeyError:
+                print("No such revision.")
+            except Exception as e:
+                print("Error:", e)
+        elif command == "gc":
+            if vault is None:
+                print("Error: Vault is locked")
+                continue
+            recorder.record("gc")
+            try:
+                removed = ChunkStore(vault).collect_garbage()
+            except (OSError, ValueError) as e:
+                print("Error:", e)
+                continue
+            print(f"Removed {removed} unused chunk(s).")
         elif command == "todo":
-            todo_menu(master_password)
+            todo_menu(master_password, recorder)
+        elif command == "stats" or command.startswith("stats "):
+            # stats [on|off|reset|json <path>]
+            try:
+                print(metrics.stats_command(line[len("stats"):]), end="")
+            except OSError as e:
+                print("Error:", e)
         else:
             print("Unknown command.")
-    input("Press Enter to exit...")
+    if queued is None:
+        input("Press Enter to exit...")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
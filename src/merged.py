@@ -1,13 +1,24 @@
 import tkinter as tk
-from tkinter import simpledialog, messagebox, ttk
+from tkinter import simpledialog, messagebox, filedialog, ttk
 import os, json, hashlib
-from encryption import encrypt_data, decrypt_data
-from storage import save_note, load_note, NOTES_DIR
+from encryption import lock
+from storage import save_note, load_note, load_note_view, write_note, delete_note, list_notes, list_notes_page, read_note_head
+from vault import Vault, encrypt_note, decrypt_note, decrypt_text, needs_password, migrate_notes
+from index import NoteIndex, parse_note
+from catalog import Catalog, PlaintextDigest, format_entry
+from scan import scan_notes
+from bulk import import_notes, export_notes
+from stream import STREAM_MAGIC, is_stream, iter_text, save_note_stream, load_note_stream
+from tasks import TaskRunner
+from notelist import NoteList
+from widgets import ProgressWindow, TodoWindow, VirtualList
+from todos import TodoJournal
+from history import delete_history, record_edit
+from watch import ChangeWatcher, DELETED, update_indexes
+from config import USER_DATA_DIR, WATCH_INTERVAL_MS
+import metrics
 
-# Define user data directory for storing master password and todos
-USER_DATA_DIR = os.path.join(os.path.expanduser("~"), ".ShadowNotes")
-if not os.path.exists(USER_DATA_DIR):
-    os.makedirs(USER_DATA_DIR)
+# Master password and todos live in the user data directory, created with the master password
 MASTER_FILE = os.path.join(USER_DATA_DIR, "master.dat")
 TODOS_FILE = os.path.join(USER_DATA_DIR, "todos.enc")
 
@@ -24,6 +35,7 @@ def set_master_password():
         messagebox.showerror("Error", "Passwords do not match!")
         return None
     hash_pwd = hashlib.sha256(pwd.encode()).hexdigest()
+    os.makedirs(USER_DATA_DIR, exist_ok=True)
     with open(MASTER_FILE, "w") as f:
         f.write(hash_pwd)
     return pwd
@@ -43,10 +55,38 @@ def verify_master_password():
         exit(1)
 
 # --- CLI Interface embedded in Tkinter ---
+
+# Time spent in a dialog is the user's, not the command's (see metrics.py)
+ask_string = metrics.untimed(simpledialog.askstring)
+ask_directory = metrics.untimed(filedialog.askdirectory)
+ask_open_filename = metrics.untimed(filedialog.askopenfilename)
+ask_save_filename = metrics.untimed(filedialog.asksaveasfilename)
+
 class CLIFrame(tk.Frame):
     def __init__(self, master, master_password):
         super().__init__(master)
         self.master_password = master_password
+        try:
+            self.vault = Vault.open(master_password)
+        except ValueError as e:
+            messagebox.showwarning("Vault", "Vault unavailable: " + str(e))
+            self.vault = None
+        self.note_index = None
+        if self.vault:
+            try:
+                self.note_index = NoteIndex.load(self.vault)
+                if self.note_index.damaged:
+                    messagebox.showwarning("Search Index", "The search index was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Search Index", "Search index unavailable: " + str(e))
+        self.catalog = None
+        if self.vault:
+            try:
+                self.catalog = Catalog.load(self.vault)
+                if self.catalog.damaged:
+                    messagebox.showwarning("Catalog", "The catalog was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Catalog", "Catalog unavailable: " + str(e))
         self.pack(fill=tk.BOTH, expand=True)
         self.create_widgets()
         self.print_output("CLI Mode Activated. Type 'help' for commands.\n")
@@ -66,41 +106,79 @@ class CLIFrame(tk.Frame):
         command = self.input_entry.get().strip()
         self.print_output("> " + command + "\n")
         self.input_entry.delete(0, tk.END)
-        self.process_command(command)
+        # "profile <command>" / "memprofile <command>" run one command under cProfile / tracemalloc
+        command, capture = metrics.parse_capture(command)
+        timer = metrics.CommandTimer(command.split(" ", 1)[0].lower(), capture)
+        try:
+            self.process_command(command)
+        finally:
+            report = timer.stop()
+        if report and command != "exit":
+            self.print_output(report)
     
     def process_command(self, command):
         if command == "help":
-            self.print_output("Commands: add, read, edit, delete, list, search, todo, exit\n")
+            self.print_output("Commands: add, read, edit, delete, list, search, reindex, migrate, import, export, attach, extract, todo, stats, exit\n")
         elif command == "exit":
+            if self.vault:
+                self.vault.lock()
+            lock()
             self.master.destroy()
-        elif command == "list":
-            files = os.listdir(NOTES_DIR)
-            if files:
+        elif command.startswith("list"):
+            # "list modified" / "list size" / ... sorts by catalog metadata
+            files = list_notes()
+            if files and self.catalog:
+                sort = command[4:].strip() or "name"
+                try:
+                    rows = self.catalog.listing(files, sort, reverse=sort in ("created", "modified", "size"))
+                except ValueError as e:
+                    self.print_output("Error: " + str(e) + "\n")
+                    return
+                self.print_output("Notes:\n")
+                for f, entry in rows:
+                    self.print_output(format_entry(f, entry) + "\n")
+            elif files:
+                sort = command[4:].strip() or "name"
+                try:
+                    files = list_notes_page(sort, reverse=sort in ("modified", "size"))
+                except ValueError as e:
+                    self.print_output("Error: " + str(e) + "\n")
+                    return
                 self.print_output("Notes:\n")
                 for f in files:
                     self.print_output(f + "\n")
             else:
                 self.print_output("No notes found.\n")
         elif command.startswith("add"):
-            note_content = simpledialog.askstring("Add Note", "Enter note content:")
+            note_content = ask_string("Add Note", "Enter note content:")
             if note_content is None: return
-            note_password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
+            note_password = ask_string("Note Password", "Enter password for the note (leave blank to use the vault key):", show="*")
             if note_password is None: return
-            custom_filename = simpledialog.askstring("Custom Filename", "Enter custom filename (optional):")
-            tags_input = simpledialog.askstring("Tags", "Enter tags (comma-separated, optional):")
+            custom_filename = ask_string("Custom Filename", "Enter custom filename (optional):")
+            tags_input = ask_string("Tags", "Enter tags (comma-separated, optional):")
             tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
             note_obj = {"content": note_content, "tags": tags}
             note_json = json.dumps(note_obj)
-            encrypted = encrypt_data(note_json.encode(), note_password)
+            try:
+                encrypted = encrypt_note(note_json.encode(), note_password, self.vault)
+            except ValueError as e:
+                self.print_output("Error: " + str(e) + "\n")
+                return
             filename = save_note(encrypted, custom_filename)
+            if self.note_index:
+                self.note_index.update(filename, note_obj, encrypted)
+            if self.catalog:
+                self.catalog.record(filename, note_json.encode(), note_obj, encrypted)
             self.print_output("Note saved as " + filename + "\n")
         elif command.startswith("read"):
-            filename = simpledialog.askstring("Read Note", "Enter filename to read:")
+            filename = ask_string("Read Note", "Enter filename to read:")
             if not filename: return
-            note_password = simpledialog.askstring("Note Password", "Enter note password:", show="*")
             try:
-                encrypted = load_note(filename)
-                decrypted = decrypt_data(encrypted, note_password)
+                encrypted = load_note_view(filename)
+                note_password = None
+                if needs_password(encrypted):
+                    note_password = ask_string("Note Password", "Enter note password:", show="*")
+                decrypted = decrypt_note(encrypted, note_password, self.vault)
                 try:
                     note_obj = json.loads(decrypted.decode())
                     content = note_obj.get("content", "")
@@ -111,48 +189,64 @@ class CLIFrame(tk.Frame):
             except Exception as e:
                 self.print_output("Error: " + str(e) + "\n")
         elif command.startswith("edit"):
-            filename = simpledialog.askstring("Edit Note", "Enter filename to edit:")
+            filename = ask_string("Edit Note", "Enter filename to edit:")
             if not filename: return
-            note_password = simpledialog.askstring("Note Password", "Enter note password:", show="*")
             try:
                 encrypted = load_note(filename)
-                decrypted = decrypt_data(encrypted, note_password)
+                note_password = None
+                if needs_password(encrypted):
+                    note_password = ask_string("Note Password", "Enter note password:", show="*")
+                decrypted = decrypt_note(encrypted, note_password, self.vault)
                 try:
                     note_obj = json.loads(decrypted.decode())
                 except json.JSONDecodeError:
                     note_obj = {"content": decrypted.decode(), "tags": []}
                 current_content = note_obj.get("content", "")
                 current_tags = note_obj.get("tags", [])
-                new_content = simpledialog.askstring("Edit Note", "Enter new content (leave blank to keep unchanged):", initialvalue=current_content)
-                new_tags = simpledialog.askstring("Edit Tags", "Enter new tags (comma-separated, leave blank to keep unchanged):", initialvalue=", ".join(current_tags))
+                new_content = ask_string("Edit Note", "Enter new content (leave blank to keep unchanged):", initialvalue=current_content)
+                new_tags = ask_string("Edit Tags", "Enter new tags (comma-separated, leave blank to keep unchanged):", initialvalue=", ".join(current_tags))
                 if new_content:
                     note_obj["content"] = new_content
                 if new_tags:
                     note_obj["tags"] = [tag.strip() for tag in new_tags.split(",")]
                 new_note_json = json.dumps(note_obj)
-                new_encrypted = encrypt_data(new_note_json.encode(), note_password)
-                filepath = os.path.join(NOTES_DIR, filename)
-                with open(filepath, "wb") as f:
-                    f.write(new_encrypted)
+                new_encrypted = encrypt_note(new_note_json.encode(), note_password, self.vault, encrypted)
+                write_note(filename, new_encrypted)
+                if self.note_index:
+                    self.note_index.update(filename, note_obj, new_encrypted)
+                if self.catalog:
+                    self.catalog.record(filename, new_note_json.encode(), note_obj, new_encrypted)
                 self.print_output("Note updated.\n")
+                if not record_edit(filename, decrypted, new_note_json.encode(), note_password, self.vault):
+                    self.print_output("Warning: the previous version could not be kept in the note history.\n")
             except Exception as e:
                 self.print_output("Error: " + str(e) + "\n")
         elif command.startswith("delete"):
-            filename = simpledialog.askstring("Delete Note", "Enter filename to delete:")
-            filepath = os.path.join(NOTES_DIR, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+            filename = ask_string("Delete Note", "Enter filename to delete:")
+            if delete_note(filename):
+                delete_history(filename)
+                if self.note_index:
+                    self.note_index.remove(filename)
+                if self.catalog:
+                    self.catalog.remove(filename)
                 self.print_output("Note deleted.\n")
             else:
                 self.print_output("Note not found.\n")
         elif command.startswith("search"):
-            search_term = simpledialog.askstring("Search", "Enter keyword to search:")
-            note_password = simpledialog.askstring("Note Password", "Enter note password (assuming same for all notes):", show="*")
+            search_term = ask_string("Search", "Enter keyword to search:")
+            if search_term is None: return
+            note_password = ask_string("Note Password", "Enter note password for old-format notes (leave blank for vault notes only):", show="*") or None
             found = False
-            for f in os.listdir(NOTES_DIR):
+            files = list_notes()
+            if self.note_index:
+                files = self.note_index.candidates(search_term, files)
+            failed = []
+            for result in scan_notes(files, lambda token: decrypt_text(token, note_password, self.vault)):
+                if result.error:
+                    failed.append(result.filename)
+                    continue
                 try:
-                    encrypted = load_note(f)
-                    decrypted = decrypt_data(encrypted, note_password)
+                    decrypted = result.data
                     try:
                         note_obj = json.loads(decrypted.decode())
                         content = note_obj.get("content", "").lower()
@@ -161,89 +255,174 @@ class CLIFrame(tk.Frame):
                         content = decrypted.decode().lower()
                         tags = ""
                     if search_term.lower() in content or search_term.lower() in tags:
-                        self.print_output("Match found in: " + f + "\n")
+                        self.print_output("Match found in: " + result.filename + "\n")
                         found = True
                 except Exception:
-                    continue
+                    failed.append(result.filename)
             if not found:
                 self.print_output("No matches found.\n")
+            if failed:
+                self.print_output("Skipped " + str(len(failed)) + " note(s) that could not be opened.\n")
+        elif command.startswith("reindex"):
+            if self.note_index is None or self.catalog is None:
+                self.print_output("Error: Search index unavailable\n")
+                return
+            # Only vault notes are indexed; notes with their own password are searched by opening them
+            failed = self.note_index.rebuild()
+            self.catalog.rebuild()
+            self.print_output("Search index and catalog rebuilt.\n")
+            if failed:
+                self.print_output("Not indexed (could not open): " + ", ".join(failed) + "\n")
+        elif command.startswith("migrate"):
+            if self.vault is None:
+                self.print_output("Error: Vault is locked\n")
+                return
+            note_password = ask_string("Migrate Notes", "Enter the password of the old-format notes to migrate:", show="*")
+            if note_password is None: return
+            migrated, failed = migrate_notes(self.vault, note_password)
+            self.print_output("Migrated " + str(len(migrated)) + " note(s) to the vault.\n")
+            if failed:
+                self.print_output("Could not open with this password: " + ", ".join(failed) + "\n")
+        elif command.startswith("import"):
+            directory = ask_directory(title="Import .txt Files")
+            if not directory: return
+            note_password = ask_string("Note Password", "Enter password for the notes (leave blank to use the vault key):", show="*")
+            if note_password is None: return
+            try:
+                imported, skipped = import_notes(directory, note_password, self.vault)
+            except (OSError, ValueError) as e:
+                self.print_output("Error: " + str(e) + "\n")
+                return
+            if self.note_index:
+                self.note_index.update_many((filename, note_obj, encrypted) for filename, _, note_obj, encrypted in imported)
+            if self.catalog:
+                self.catalog.record_many(imported)
+            self.print_output("Imported " + str(len(imported)) + " note(s).\n")
+            if skipped:
+                self.print_output("Skipped (a note with that name exists): " + ", ".join(skipped) + "\n")
+        elif command.startswith("export"):
+            directory = ask_directory(title="Export Notes To")
+            if not directory: return
+            note_password = ask_string("Note Password", "Enter note password for old-format notes (leave blank for vault notes only):", show="*") or None
+            try:
+                exported, failed = export_notes(directory, note_password, self.vault)
+            except OSError as e:
+                self.print_output("Error: " + str(e) + "\n")
+                return
+            self.print_output("Exported " + str(len(exported)) + " note(s) to " + directory + " as plain text.\n")
+            if failed:
+                self.print_output("Could not open: " + ", ".join(failed) + "\n")
+        elif command.startswith("attach"):
+            # Encrypt a file from disk in segments, without loading it into memory
+            path = ask_open_filename(title="Attach File")
+            if not path: return
+            note_password = ask_string("Note Password", "Enter password for the note (leave blank to use the vault key):", show="*")
+            if note_password is None: return
+            custom_filename = ask_string("Custom Filename", "Enter custom filename (optional):")
+            try:
+                with open(path, "rb") as src:
+                    digest = PlaintextDigest(src)
+                    filename = save_note_stream(digest, custom_filename, note_password, self.vault)
+            except (OSError, ValueError) as e:
+                self.print_output("Error: " + str(e) + "\n")
+                return
+            # An empty index entry keeps search from opening the attachment; the catalog lists it
+            if self.note_index:
+                if note_password:
+                    self.note_index.remove(filename)
+                else:
+                    self.note_index.add_attachments([filename])
+            if self.catalog:
+                if note_password:
+                    self.catalog.remove(filename)
+                else:
+                    self.catalog.record_attachments([(filename, digest)])
+            self.print_output("File attached as " + filename + "\n")
+        elif command.startswith("extract"):
+            filename = ask_string("Extract File", "Enter filename to extract:")
+            if not filename: return
+            try:
+                head = read_note_head(filename, len(STREAM_MAGIC) + 1)
+            except OSError as e:
+                self.print_output("Error: " + str(e) + "\n")
+                return
+            if not is_stream(head):
+                self.print_output("Error: Not an attached file; use read instead\n")
+                return
+            note_password = None
+            if needs_password(head):
+                note_password = ask_string("Note Password", "Enter note password:", show="*")
+            path = ask_save_filename(title="Extract File")
+            if not path: return
+            try:
+                with open(path, "wb") as dst:
+                    size = load_note_stream(filename, dst, note_password, self.vault)
+                self.print_output("Extracted " + str(size) + " bytes to " + path + "\n")
+            except ValueError as e:
+                # Never leave a partially decrypted file behind
+                os.remove(path)
+                self.print_output("Error: " + str(e) + "\n")
+            except OSError as e:
+                self.print_output("Error: " + str(e) + "\n")
         elif command.startswith("todo"):
             self.open_todo_menu()
+        elif command == "stats" or command.startswith("stats "):
+            # stats [on|off|reset|json <path>]
+            try:
+                self.print_output(metrics.stats_command(command[len("stats"):]))
+            except OSError as e:
+                self.print_output("Error: " + str(e) + "\n")
         else:
             self.print_output("Unknown command.\n")
     
     def open_todo_menu(self):
-        todo_win = tk.Toplevel(self)
-        todo_win.title("Todo List")
-        todo_win.geometry("400x300")
-        listbox = tk.Listbox(todo_win)
-        listbox.pack(fill=tk.BOTH, expand=True)
-        # Load todos
-        if os.path.exists(TODOS_FILE):
-            try:
-                with open(TODOS_FILE, "rb") as f:
-                    encrypted_todos = f.read()
-                todos_json = decrypt_data(encrypted_todos, self.master_password)
-                todos = json.loads(todos_json.decode())
-            except Exception as e:
-                messagebox.showerror("Error", "Error loading todos: " + str(e))
-                todos = []
-        else:
-            todos = []
-        for i, t in enumerate(todos):
-            status = "Done" if t["done"] else "Pending"
-            listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        def add_task():
-            task = simpledialog.askstring("New Task", "Enter new todo task:", parent=todo_win)
-            if task:
-                todos.append({"task": task, "done": False})
-                listbox.insert(tk.END, f"{len(todos)-1}: {task} [Pending]")
-        def mark_done():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                todos[idx]["done"] = True
-                listbox.delete(idx)
-                status = "Done"
-                listbox.insert(idx, f"{idx}: {todos[idx]['task']} [{status}]")
-        def delete_task():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                listbox.delete(idx)
-                todos.pop(idx)
-                listbox.delete(0, tk.END)
-                for i, t in enumerate(todos):
-                    status = "Done" if t["done"] else "Pending"
-                    listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        add_btn = tk.Button(todo_win, text="Add Task", command=add_task)
-        add_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        done_btn = tk.Button(todo_win, text="Mark Done", command=mark_done)
-        done_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        delete_btn = tk.Button(todo_win, text="Delete Task", command=delete_task)
-        delete_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        def save_todos():
-            try:
-                todos_json = json.dumps(todos).encode()
-                encrypted_todos = encrypt_data(todos_json, self.master_password)
-                with open(TODOS_FILE, "wb") as f:
-                    f.write(encrypted_todos)
-                messagebox.showinfo("Success", "Todos saved.")
-            except Exception as e:
-                messagebox.showerror("Error", "Error saving todos: " + str(e))
-        save_btn = tk.Button(todo_win, text="Save Todos", command=save_todos)
-        save_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        # Every change is appended to the todo journal as it is made (see todos.py)
+        try:
+            journal = TodoJournal.open(TODOS_FILE, self.master_password)
+        except ValueError as e:
+            messagebox.showerror("Error", "Error loading todos: " + str(e))
+            return
+        TodoWindow(self, journal)
 
 # --- Improved GUI Version with Menu Bar ---
 class ShadowNotesGUI(tk.Tk):
     def __init__(self):
         super().__init__()
         self.master_password = verify_master_password()
+        try:
+            self.vault = Vault.open(self.master_password)
+        except ValueError as e:
+            messagebox.showwarning("Vault", f"Vault unavailable: {e}")
+            self.vault = None
+        self.note_index = None
+        if self.vault:
+            try:
+                self.note_index = NoteIndex.load(self.vault)
+                if self.note_index.damaged:
+                    messagebox.showwarning("Search Index", "The search index was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Search Index", f"Search index unavailable: {e}")
+        self.catalog = None
+        if self.vault:
+            try:
+                self.catalog = Catalog.load(self.vault)
+                if self.catalog.damaged:
+                    messagebox.showwarning("Catalog", "The catalog was damaged and has been reset; run reindex from the CLI to rebuild it.")
+            except ValueError as e:
+                messagebox.showwarning("Catalog", f"Catalog unavailable: {e}")
+        self.note_pages = None  # lazy text chunks of the streamed note being shown
+        # Crypto and disk I/O run here so the window keeps responding (see tasks.py)
+        self.tasks = TaskRunner(self)
+        self.reading = None  # task decrypting the note being opened
+        self.note_list = NoteList()  # sorted, filterable rows behind the notes list
+        self.watcher = None  # notes changed by other processes; used on the worker only
         self.title("ShadowNotes GUI")
         self.geometry("900x600")
         self.create_menu()
         self.create_widgets()
         self.refresh_notes_list()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.after(WATCH_INTERVAL_MS, self.watch_notes)
     
     def create_menu(self):
         menubar = tk.Menu(self)
@@ -251,8 +430,10 @@ class ShadowNotesGUI(tk.Tk):
         file_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="File", menu=file_menu)
         file_menu.add_command(label="Add Note", command=self.add_note)
+        file_menu.add_command(label="Search Notes", command=self.search_notes)
+        file_menu.add_command(label="Migrate Notes to Vault", command=self.migrate_notes)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.quit)
+        file_menu.add_command(label="Exit", command=self.on_close)
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Help", menu=help_menu)
         help_menu.add_command(label="About", command=lambda: messagebox.showinfo("About", "ShadowNotes v1.0"))
@@ -260,8 +441,12 @@ class ShadowNotesGUI(tk.Tk):
     def create_widgets(self):
         left_frame = tk.Frame(self)
         left_frame.pack(side=tk.LEFT, fill=tk.Y, padx=5, pady=5)
-        self.notes_listbox = tk.Listbox(left_frame, width=40)
-        self.notes_listbox.pack(fill=tk.Y, expand=True)
+        self.filter_var = tk.StringVar()
+        self.filter_var.trace_add("write", self.on_filter)
+        filter_entry = tk.Entry(left_frame, textvariable=self.filter_var)
+        filter_entry.pack(fill=tk.X, pady=(0, 2))
+        self.notes_view = VirtualList(left_frame, self.note_list, width=40, on_activate=self.read_note)
+        self.notes_view.pack(fill=tk.BOTH, expand=True)
         btn_frame = tk.Frame(left_frame)
         btn_frame.pack(fill=tk.X)
         refresh_btn = tk.Button(btn_frame, text="Refresh List", command=self.refresh_notes_list)
@@ -270,7 +455,7 @@ class ShadowNotesGUI(tk.Tk):
         delete_btn.pack(side=tk.LEFT, padx=2, pady=2)
         right_frame = tk.Frame(self)
         right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5, pady=5)
-        self.note_text = tk.Text(right_frame, wrap=tk.WORD)
+        self.note_text = tk.Text(right_frame, wrap=tk.WORD, yscrollcommand=self.on_note_scroll)
         self.note_text.pack(fill=tk.BOTH, expand=True)
         bottom_frame = tk.Frame(self)
         bottom_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=5, pady=5)
@@ -280,20 +465,115 @@ class ShadowNotesGUI(tk.Tk):
         read_btn.pack(side=tk.LEFT, padx=5)
         edit_btn = tk.Button(bottom_frame, text="Edit Note", command=self.edit_note)
         edit_btn.pack(side=tk.LEFT, padx=5)
+        search_btn = tk.Button(bottom_frame, text="Search", command=self.search_notes)
+        search_btn.pack(side=tk.LEFT, padx=5)
         todo_btn = tk.Button(bottom_frame, text="Todo", command=self.open_todo_window)
         todo_btn.pack(side=tk.LEFT, padx=5)
     
+    def on_close(self):
+        # Stop background work and wipe cached keys before the window goes away
+        self.tasks.shutdown()
+        if self.vault:
+            self.vault.lock()
+        lock()
+        self.destroy()
+    
+    def run_task(self, work, on_done, title: str = None, cancellable: bool = False):
+        # Run work(task) off the Tk thread, then on_done(result) back on it. With a
+        # title, a progress window is shown until the task finishes.
+        window = None
+        def done(result):
+            if window:
+                window.close()
+            on_done(result)
+        def failed(e):
+            if window:
+                window.close()
+            messagebox.showerror("Error", str(e))
+        def progress(done, total, message):
+            if window:
+                window.update_progress(done, total, message)
+        task = self.tasks.submit(work, done, failed, progress)
+        if title:
+            window = ProgressWindow(self, title, task if cancellable else None)
+        return task
+    
     def refresh_notes_list(self):
-        self.notes_listbox.delete(0, tk.END)
-        files = os.listdir(NOTES_DIR)
-        for f in files:
-            self.notes_listbox.insert(tk.END, f)
+        # Full reload from disk; a single added, edited or deleted note goes
+        # through note_changed() instead
+        def work(task):
+            # A fresh watcher per full reload; its snapshot is the list shown
+            if self.watcher:
+                self.watcher.close()
+            self.watcher = ChangeWatcher()
+            note_list = NoteList()
+            note_list.load(self.watcher.snapshot, self.catalog.entries if self.catalog else None)
+            return note_list
+        def loaded(note_list):
+            note_list.set_filter(self.filter_var.get())
+            self.note_list = self.notes_view.model = note_list
+            self.notes_view.refresh()
+        self.run_task(work, loaded)
+    
+    def note_changed(self, filename: str, deleted: bool = False):
+        if deleted:
+            self.note_list.remove(filename)
+            self.notes_view.refresh()
+        else:
+            self.note_list.upsert(filename, self.catalog.entries.get(filename) if self.catalog else None)
+            self.notes_view.show(filename)
+    
+    def watch_notes(self):
+        # Pick up notes added, edited or deleted by another process (e.g. the CLI).
+        # Skipped while other work is queued; errors are retried on the next tick.
+        if self.watcher and not self.tasks.busy:
+            self.tasks.submit(self.sync_changes, self.apply_changes, lambda e: None)
+        self.after(WATCH_INTERVAL_MS, self.watch_notes)
+    
+    def sync_changes(self, task):
+        # Worker side of watch_notes
+        changes = self.watcher.poll()
+        update_indexes(changes, self.vault, self.note_index, self.catalog)
+        return changes
+    
+    def apply_changes(self, changes):
+        for change in changes:
+            if change.kind == DELETED:
+                self.note_list.remove(change.filename)
+            else:
+                self.note_list.upsert(change.filename, self.catalog.entries.get(change.filename) if self.catalog else None)
+        if changes:
+            self.notes_view.refresh()
+    
+    def on_filter(self, *args):
+        # Filter-as-you-type over names, titles and tags
+        if self.note_list.set_filter(self.filter_var.get()):
+            self.notes_view.top = 0
+            self.notes_view.refresh()
+    
+    def selected_note(self):
+        filename = self.notes_view.selection()
+        if filename is None:
+            messagebox.showwarning("Warning", "No note selected")
+        return filename
+    
+    def ask_note_password(self, filename: str):
+        # Returns (ok, password); only the note header is read on the Tk thread
+        try:
+            head = read_note_head(filename, len(STREAM_MAGIC) + 1)
+        except Exception as e:
+            messagebox.showerror("Error", str(e))
+            return False, None
+        if not needs_password(head):
+            return True, None
+        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
+        return password is not None, password
     
     def add_note(self):
         note_content = simpledialog.askstring("Add Note", "Enter note content:")
         if note_content is None:
             return
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
+        password = simpledialog.askstring("Note Password", "Enter password for the note (leave blank to use the vault key):", show="*")
         if password is None:
             return
         custom_filename = simpledialog.askstring("Custom Filename", "Enter custom filename (optional):")
@@ -301,51 +581,90 @@ class ShadowNotesGUI(tk.Tk):
         tags = [tag.strip() for tag in tags_input.split(",")] if tags_input else []
         note_obj = {"content": note_content, "tags": tags}
         note_json = json.dumps(note_obj)
-        encrypted = encrypt_data(note_json.encode(), password)
-        filename = save_note(encrypted, custom_filename)
-        messagebox.showinfo("Success", f"Note saved as {filename}")
-        self.refresh_notes_list()
+        def work(task):
+            encrypted = encrypt_note(note_json.encode(), password, self.vault)
+            filename = save_note(encrypted, custom_filename)
+            if self.watcher:
+                self.watcher.acknowledge(filename)
+            if self.note_index:
+                self.note_index.update(filename, note_obj, encrypted)
+            if self.catalog:
+                self.catalog.record(filename, note_json.encode(), note_obj, encrypted)
+            return filename
+        def saved(filename):
+            messagebox.showinfo("Success", f"Note saved as {filename}")
+            self.note_changed(filename)
+        self.run_task(work, saved)
     
     def read_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
-        if password is None:
+        ok, password = self.ask_note_password(filename)
+        if not ok:
             return
-        try:
-            encrypted = load_note(filename)
-            decrypted = decrypt_data(encrypted, password)
+        if self.reading:
+            # A newer selection wins; the older result is dropped when it arrives
+            self.reading.cancel()
+        self.note_pages = None
+        self.note_text.delete(1.0, tk.END)
+        self.note_text.insert(tk.END, f"Decrypting {filename}...")
+        def work(task):
+            head = read_note_head(filename, len(STREAM_MAGIC))
+            if is_stream(head):
+                # Large note: show the first screenful now, the rest as the user scrolls
+                pages = iter_text(filename, password, self.vault)
+                return pages, next(pages, "")
+            decrypted = decrypt_note(load_note_view(filename), password, self.vault)
             try:
                 note_obj = json.loads(decrypted.decode())
                 content = note_obj.get("content", "")
                 tags = note_obj.get("tags", [])
-                display_text = f"Content:\n{content}\n\nTags: {', '.join(tags)}"
+                return None, f"Content:\n{content}\n\nTags: {', '.join(tags)}"
             except json.JSONDecodeError:
-                display_text = decrypted.decode()
+                return None, decrypted.decode()
+        def show(result):
+            if task.cancelled:
+                return
+            self.reading = None
+            self.note_pages, display_text = result
             self.note_text.delete(1.0, tk.END)
             self.note_text.insert(tk.END, display_text)
-        except Exception as e:
+        task = self.reading = self.run_task(work, show)
+    
+    def load_more_note_text(self):
+        if self.note_pages is None:
+            return
+        try:
+            self.note_text.insert(tk.END, next(self.note_pages))
+        except StopIteration:
+            self.note_pages = None
+        except ValueError as e:
+            self.note_pages = None
             messagebox.showerror("Error", str(e))
     
+    def on_note_scroll(self, first, last):
+        # yscrollcommand of the note view: fetch the next chunk near the bottom
+        if self.note_pages is not None and float(last) > 0.9:
+            self.after_idle(self.load_more_note_text)
+    
     def edit_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
-        password = simpledialog.askstring("Note Password", "Enter password for the note:", show="*")
-        if password is None:
+        ok, password = self.ask_note_password(filename)
+        if not ok:
             return
-        try:
+        def load(task):
             encrypted = load_note(filename)
-            decrypted = decrypt_data(encrypted, password)
+            decrypted = decrypt_note(encrypted, password, self.vault)
             try:
                 note_obj = json.loads(decrypted.decode())
             except json.JSONDecodeError:
                 note_obj = {"content": decrypted.decode(), "tags": []}
+            return encrypted, decrypted, note_obj
+        def edit(result):
+            encrypted, decrypted, note_obj = result
             current_content = note_obj.get("content", "")
             current_tags = note_obj.get("tags", [])
             new_content = simpledialog.askstring("Edit Note", "Enter new content (leave blank to keep unchanged):", initialvalue=current_content)
@@ -355,92 +674,109 @@ class ShadowNotesGUI(tk.Tk):
             if new_tags:
                 note_obj["tags"] = [tag.strip() for tag in new_tags.split(",")]
             new_note_json = json.dumps(note_obj)
-            new_encrypted = encrypt_data(new_note_json.encode(), password)
-            filepath = os.path.join(NOTES_DIR, filename)
-            with open(filepath, "wb") as f:
-                f.write(new_encrypted)
-            messagebox.showinfo("Success", "Note updated")
-            self.refresh_notes_list()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            def save(task):
+                new_encrypted = encrypt_note(new_note_json.encode(), password, self.vault, encrypted)
+                write_note(filename, new_encrypted)
+                if self.watcher:
+                    self.watcher.acknowledge(filename)
+                if self.note_index:
+                    self.note_index.update(filename, note_obj, new_encrypted)
+                if self.catalog:
+                    self.catalog.record(filename, new_note_json.encode(), note_obj, new_encrypted)
+                record_edit(filename, decrypted, new_note_json.encode(), password, self.vault)
+            def saved(_):
+                messagebox.showinfo("Success", "Note updated")
+                self.note_changed(filename)
+            self.run_task(save, saved)
+        self.run_task(load, edit)
     
     def delete_note(self):
-        selected = self.notes_listbox.curselection()
-        if not selected:
-            messagebox.showwarning("Warning", "No note selected")
+        filename = self.selected_note()
+        if filename is None:
             return
-        filename = self.notes_listbox.get(selected[0])
         confirm = messagebox.askyesno("Confirm Delete", f"Are you sure you want to delete {filename}?")
-        if confirm:
-            filepath = os.path.join(NOTES_DIR, filename)
-            if os.path.exists(filepath):
-                os.remove(filepath)
+        if not confirm:
+            return
+        def work(task):
+            if not delete_note(filename):
+                return False
+            delete_history(filename)
+            if self.watcher:
+                self.watcher.acknowledge(filename)
+            if self.note_index:
+                self.note_index.remove(filename)
+            if self.catalog:
+                self.catalog.remove(filename)
+            return True
+        def deleted(found):
+            if found:
                 messagebox.showinfo("Deleted", "Note deleted")
-                self.refresh_notes_list()
+                self.note_changed(filename, deleted=True)
             else:
                 messagebox.showerror("Error", "Note not found")
+        self.run_task(work, deleted)
+    
+    def search_notes(self):
+        search_term = simpledialog.askstring("Search Notes", "Enter keyword to search:")
+        if not search_term or not search_term.strip():
+            return
+        search_term = search_term.strip().lower()
+        password = simpledialog.askstring("Note Password", "Enter note password for old-format notes (leave blank for vault notes only):", show="*")
+        if password is None:
+            return
+        password = password or None
+        def matches(filename, decrypted):
+            note_obj = parse_note(decrypted)
+            if isinstance(note_obj, dict):
+                text = note_obj.get("content", "") + " " + " ".join(note_obj.get("tags", []))
+            else:
+                text = str(note_obj)
+            return search_term in text.lower()
+        def work(task):
+            files = list_notes()
+            if self.note_index:
+                files = self.note_index.candidates(search_term, files)
+            found, failed = [], []
+            results = scan_notes(files, lambda token: decrypt_text(token, password, self.vault), matches, cancel=task.cancel_event)
+            for done, result in enumerate(results, 1):
+                if result.error:
+                    failed.append(result.filename)
+                elif result.value:
+                    found.append(result.filename)
+                task.progress(done, len(files), f"Searched {done} of {len(files)} note(s), {len(found)} match(es)")
+            return sorted(found), failed
+        def show(result):
+            found, failed = result
+            lines = [f"Matches for '{search_term}'" + (" (search cancelled)" if task.cancelled else "") + ":"]
+            lines += found or ["No matches found."]
+            if failed:
+                lines.append(f"\nSkipped {len(failed)} note(s) that could not be opened.")
+            self.note_pages = None
+            self.note_text.delete(1.0, tk.END)
+            self.note_text.insert(tk.END, "\n".join(lines))
+        task = self.run_task(work, show, "Search Notes", cancellable=True)
+    
+    def migrate_notes(self):
+        if self.vault is None:
+            messagebox.showerror("Error", "Vault is locked")
+            return
+        password = simpledialog.askstring("Migrate Notes", "Enter the password of the old-format notes to migrate:", show="*")
+        if password is None:
+            return
+        def migrated(result):
+            migrated, failed = result
+            message = f"Migrated {len(migrated)} note(s) to the vault."
+            if failed:
+                message += "\nCould not open with this password: " + ", ".join(failed)
+            messagebox.showinfo("Migrate Notes", message)
+        self.run_task(lambda task: migrate_notes(self.vault, password), migrated, "Migrate Notes")
     
     def open_todo_window(self):
-        todo_win = tk.Toplevel(self)
-        todo_win.title("Todo List")
-        todo_win.geometry("400x300")
-        listbox = tk.Listbox(todo_win)
-        listbox.pack(fill=tk.BOTH, expand=True)
-        # Load todos
-        if os.path.exists(TODOS_FILE):
-            try:
-                with open(TODOS_FILE, "rb") as f:
-                    encrypted_todos = f.read()
-                todos_json = decrypt_data(encrypted_todos, self.master_password)
-                todos = json.loads(todos_json.decode())
-            except Exception as e:
-                messagebox.showerror("Error", "Error loading todos: " + str(e))
-                todos = []
-        else:
-            todos = []
-        for i, t in enumerate(todos):
-            status = "Done" if t["done"] else "Pending"
-            listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        def add_task():
-            task = simpledialog.askstring("New Task", "Enter new todo task:", parent=todo_win)
-            if task:
-                todos.append({"task": task, "done": False})
-                listbox.insert(tk.END, f"{len(todos)-1}: {task} [Pending]")
-        def mark_done():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                todos[idx]["done"] = True
-                listbox.delete(idx)
-                status = "Done"
-                listbox.insert(idx, f"{idx}: {todos[idx]['task']} [{status}]")
-        def delete_task():
-            selection = listbox.curselection()
-            if selection:
-                idx = selection[0]
-                listbox.delete(idx)
-                todos.pop(idx)
-                listbox.delete(0, tk.END)
-                for i, t in enumerate(todos):
-                    status = "Done" if t["done"] else "Pending"
-                    listbox.insert(tk.END, f"{i}: {t['task']} [{status}]")
-        add_btn = tk.Button(todo_win, text="Add Task", command=add_task)
-        add_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        done_btn = tk.Button(todo_win, text="Mark Done", command=mark_done)
-        done_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        delete_btn = tk.Button(todo_win, text="Delete Task", command=delete_task)
-        delete_btn.pack(side=tk.LEFT, padx=5, pady=5)
-        def save_todos():
-            try:
-                todos_json = json.dumps(todos).encode()
-                encrypted_todos = encrypt_data(todos_json, self.master_password)
-                with open(TODOS_FILE, "wb") as f:
-                    f.write(encrypted_todos)
-                messagebox.showinfo("Success", "Todos saved.")
-            except Exception as e:
-                messagebox.showerror("Error", "Error saving todos: " + str(e))
-        save_btn = tk.Button(todo_win, text="Save Todos", command=save_todos)
-        save_btn.pack(side=tk.LEFT, padx=5, pady=5)
+        # Open the todo journal in the background, then show the window; every
+        # change is appended to the journal as it is made (see todos.py)
+        def opened(journal):
+            TodoWindow(self, journal, self.run_task)
+        self.run_task(lambda task: TodoJournal.open(TODOS_FILE, self.master_password), opened)
 
 # --- Launcher Window to choose between CLI and GUI ---
 class Launcher(tk.Tk):
@@ -464,6 +800,7 @@ class Launcher(tk.Tk):
         cli_window = tk.Tk()
         cli_window.title("ShadowNotes CLI")
         CLIFrame(cli_window, master_password)
+        cli_window.protocol("WM_DELETE_WINDOW", lambda: (lock(), cli_window.destroy()))
         cli_window.mainloop()
     
     def launch_gui(self):
@@ -0,0 +1,226 @@
+# src/metalog.py
+
+# Append-only, vault-encrypted log of per-note metadata, behind the search
+# index (index.py) and the catalog (catalog.py).
+#
+#   file:    LOG_MAGIC, then records of
+#   record:  length(4) + nonce(12) + AES-GCM(JSON operation), LOG_MAGIC as associated data
+#
+# The key is a subkey of the vault key, one per log. The first record is a
+# snapshot of every entry (filename -> value); each change after it ("put"
+# entries, "delete" names) is one small record appended under an exclusive
+# file lock (filelock.py), so saving a note costs O(its own entry) rather than
+# re-encrypting the whole file. Before appending, and on refresh(), a log
+# catches up on records other processes appended or their compaction, so a CLI
+# and a GUI running at once never drop each other's entries. Once the records
+# outnumber the entries (and METADATA_COMPACT_MIN_RECORDS), the log is
+# rewritten as one snapshot with durable.write_atomic. A crash can only leave a
+# torn last record, one cut short by EOF; readers stop before it and the next
+# append cuts it off. A whole record that fails authentication is judged under
+# the lock (without it, it may be another process's append in progress): it
+# means the log is damaged, so the log is reset to an empty snapshot and marked
+# damaged. The entries are only a cache of the notes, so an empty log is
+# still correct, just slower (search opens every note) until rebuild.
+# A file in the old format (one vault token holding every entry) is read as
+# is and rewritten as a log on the first change.
+#
+# Subclasses keep the entries in whatever shape they query and implement
+# _clear, _put, _delete and _entries.
+
+import json
+import os
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from config import DURABLE_WRITES, METADATA_COMPACT_MIN_RECORDS
+from durable import write_atomic
+from filelock import FileLock
+
+LOG_MAGIC = b"SNL\x01"
+LENGTH = struct.Struct("<I")
+
+class _DamagedRecord(Exception):
+    def __init__(self, offset: int):
+        super().__init__(offset)
+        self.offset = offset
+
+class MetadataLog:
+    LEGACY_KEY = None  # key of the entries in the old single-token format
+
+    def __init__(self, vault, path: str, purpose: bytes):
+        self.vault = vault
+        self.path = path
+        self.records = 0    # operations appended since the snapshot
+        self._aesgcm = AESGCM(vault.derive_key(purpose))
+        self._lock = FileLock(path)
+        self._legacy = False
+        self._end = 0       # offset just past the last record applied
+        self._ino = None
+        self.damaged = False  # reset after damage was found; cleared by a rebuild
+        self._clear()
+
+    @classmethod
+    def load(cls, vault):
+        # Raises ValueError for another vault's log or a damaged one
+        log = cls(vault)
+        log.refresh()
+        return log
+
+    def refresh(self):
+        # Catch up with records appended (or a compaction done) by another process
+        if not self._catch_up():
+            with self._lock:
+                self._catch_up()
+
+    def _catch_up(self) -> bool:
+        # False if it stopped at a whole record that fails authentication and the
+        # lock is not held; with the lock held, such a record resets the log
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            if self._ino is not None:
+                self._clear()
+                self._ino, self._end, self.records = None, 0, 0
+            return True
+        try:
+            if st.st_ino != self._ino or st.st_size < self._end:
+                self._load()
+            elif st.st_size > self._end and not self._legacy:
+                with open(self.path, "rb") as f:
+                    f.seek(self._end)
+                    self._end = self._read_records(f)
+        except _DamagedRecord as e:
+            self._end = e.offset  # everything before it is applied
+            if not self._lock.held():
+                return False
+            self._clear()
+            self.damaged = True
+            self._rewrite()
+        return True
+
+    def commit(self, puts: dict = None, deletes=()):
+        # Append one change: entries to put (filename -> value) and names to delete.
+        # Names without an entry are ignored; an empty change writes nothing.
+        with self._lock:
+            self.refresh()
+            puts = dict(puts or {})
+            deletes = sorted({name for name in deletes if name not in puts and self._has(name)})
+            if not puts and not deletes:
+                return
+            op = {"op": "change", "put": puts, "delete": deletes}
+            if self._ino is None or self._legacy:
+                self._apply(op)
+                self._rewrite()
+                return
+            record = self._seal(op)
+            with open(self.path, "r+b") as f:
+                if os.fstat(f.fileno()).st_size > self._end:
+                    f.truncate(self._end)  # torn record left by a crash
+                f.seek(self._end)
+                f.write(record)
+                f.flush()
+                if DURABLE_WRITES:
+                    os.fsync(f.fileno())
+            self._end += len(record)
+            self._apply(op)
+            if self.records > max(METADATA_COMPACT_MIN_RECORDS, len(self._entries())):
+                self._rewrite()
+
+    def replace_all(self, entries: dict):
+        # Start over with exactly these entries (rebuild), as one snapshot
+        with self._lock:
+            self._clear()
+            for name, value in entries.items():
+                self._put(name, value)
+            self._rewrite()
+            self.damaged = False
+
+    def _has(self, name: str) -> bool:
+        return name in self._entries()
+
+    def _apply(self, op: dict):
+        kind = op.get("op")
+        if kind == "snapshot":
+            self._clear()
+            for name, value in op["entries"].items():
+                self._put(name, value)
+            self.records = 0
+            return
+        if kind != "change":
+            raise ValueError(f"Unknown metadata log operation '{kind}'")
+        for name in op["delete"]:
+            self._delete(name)
+        for name, value in op["put"].items():
+            self._put(name, value)
+        self.records += 1
+
+    def _seal(self, op: dict) -> bytes:
+        nonce = os.urandom(12)
+        sealed = nonce + self._aesgcm.encrypt(nonce, json.dumps(op).encode(), LOG_MAGIC)
+        return LENGTH.pack(len(sealed)) + sealed
+
+    def _read_records(self, f) -> int:
+        # Apply whole records from f's position; returns the offset after the last one.
+        # A record cut short by EOF is a torn write or another process's append in
+        # progress, so reading stops before it; any other bad record raises _DamagedRecord.
+        offset = f.tell()
+        while True:
+            prefix = f.read(LENGTH.size)
+            if len(prefix) < LENGTH.size:
+                return offset
+            size = LENGTH.unpack(prefix)[0]
+            body = f.read(size)
+            if len(body) != size:
+                return offset
+            try:
+                if size <= 12:
+                    raise InvalidTag
+                op = json.loads(self._aesgcm.decrypt(body[:12], body[12:], LOG_MAGIC).decode())
+            except InvalidTag:
+                if offset == len(LOG_MAGIC):
+                    raise ValueError(f"Incorrect vault key or damaged {os.path.basename(self.path)}") from None
+                raise _DamagedRecord(offset) from None
+            self._apply(op)
+            offset = f.tell()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            head = f.read(len(LOG_MAGIC))
+            if head == LOG_MAGIC:
+                self._legacy = False
+                self._clear()
+                self.records = 0
+                end = self._read_records(f)
+                if end == len(LOG_MAGIC) and os.fstat(f.fileno()).st_size > end:
+                    raise ValueError(f"Damaged {os.path.basename(self.path)}")
+            else:
+                data = json.loads(self.vault.decrypt(head + f.read()).decode())
+                self._legacy = True
+                self._apply({"op": "snapshot", "entries": data.get(self.LEGACY_KEY) or {}})
+                end = f.tell()
+            self._ino = os.fstat(f.fileno()).st_ino
+        self._end = end
+
+    def _rewrite(self):
+        # One snapshot record in a fresh file; call with the lock held
+        data = LOG_MAGIC + self._seal({"op": "snapshot", "entries": self._entries()})
+        write_atomic(self.path, data)
+        self.records = 0
+        self._legacy = False
+        self._end = len(data)
+        self._ino = os.stat(self.path).st_ino
+
+    # Subclass hooks
+
+    def _clear(self):
+        raise NotImplementedError
+
+    def _put(self, name: str, value):
+        raise NotImplementedError
+
+    def _delete(self, name: str):
+        raise NotImplementedError
+
+    def _entries(self) -> dict:
+        # filename -> JSON-serializable value
+        raise NotImplementedError
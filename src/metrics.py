@@ -0,0 +1,234 @@
+# src/metrics.py
+
+# Lightweight instrumentation: calls, items, bytes and latency histograms for the
+# crypto and storage layers, and per-command latency for the CLIs.
+#
+# Functions are wrapped with @instrument(name); while metrics are off (METRICS
+# in config.py, or "stats off") the wrapper is one flag check and a call, and
+# nothing is recorded. Latencies go into power-of-two buckets from 1 us up, so
+# recording never allocates; percentiles are bucket upper bounds (within 2x).
+# A command's timer stops while the CLI waits for the user (see untimed), so its
+# latency is the app's time, not the typing. One command at a time can also be
+# run under cProfile or tracemalloc (capture="cpu" / "memory").
+#
+#   kdf.derive        key derivations (cache misses); the key cache hit rate is shown alongside
+#   crypto.*          password-format encrypt/decrypt, bytes = plaintext
+#   vault.*           vault-format encrypt/decrypt, bytes = plaintext
+#   storage.*         note reads, writes, deletes and listings, bytes = stored size
+#   command.*         CLI commands
+
+import functools
+import io
+import json
+import threading
+import time
+from config import METRICS
+from keycache import key_cache
+
+BUCKETS = 32
+PROFILE_LINES = 25
+
+_enabled = METRICS
+_lock = threading.Lock()
+_stats = {}
+_local = threading.local()
+_cache_base = (0, 0)
+
+class Stat:
+    __slots__ = ("calls", "items", "bytes", "total", "max", "buckets")
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.bytes = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds: float, items: int, size: int):
+        self.calls += 1
+        self.items += items
+        self.bytes += size
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        # bucket i holds latencies under 2**i microseconds
+        self.buckets[min(BUCKETS - 1, int(seconds * 1e6).bit_length())] += 1
+
+    def percentile(self, q: float) -> float:
+        rank = q / 100 * self.calls
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(self.max, 2 ** i / 1e6)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "items": self.items, "bytes": self.bytes, "total": self.total,
+                "mean": self.total / self.calls if self.calls else 0.0, "max": self.max,
+                "p50": self.percentile(50), "p95": self.percentile(95), "p99": self.percentile(99),
+                "buckets_us": {str(2 ** i): n for i, n in enumerate(self.buckets) if n}}
+
+def enabled() -> bool:
+    return _enabled
+
+def enable(on: bool = True):
+    global _enabled
+    _enabled = on
+
+def record(name: str, seconds: float, items: int = 1, size: int = 0):
+    with _lock:
+        stat = _stats.get(name)
+        if stat is None:
+            stat = _stats[name] = Stat()
+        stat.add(seconds, items, size)
+
+def instrument(name: str, size=None):
+    # size(args, result) -> (items, bytes) of a call; without it a call is one item of 0 bytes
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            items, nbytes = size(args, result) if size else (1, 0)
+            record(name, time.perf_counter() - start, items, nbytes)
+            return result
+        return wrapper
+    return decorate
+
+def arg_size(position: int):
+    # size= for calls whose bytes are one argument (a buffer, or a tuple of buffers)
+    def size(args, result):
+        data = args[position]
+        return 1, sum(map(len, data)) if isinstance(data, (tuple, list)) else len(data)
+    return size
+
+def result_size(args, result):
+    return 1, len(result) if result is not None else 0
+
+def untimed(func):
+    # Wrap a prompt (input, a dialog) so time spent in it is not charged to the current command
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.waited = getattr(_local, "waited", 0.0) + time.perf_counter() - start
+    return wrapper
+
+class CommandTimer:
+    # Times one command as command.<name>; with capture="cpu" or "memory" also
+    # profiles it, and stop() returns the report
+    def __init__(self, name: str, capture: str = None):
+        if capture not in (None, "cpu", "memory"):
+            raise ValueError(f"Unknown capture '{capture}' (use cpu or memory)")
+        self.name = name
+        self.capture = capture
+        self._profiler = None
+        self._started_tracemalloc = False
+        self._waited = getattr(_local, "waited", 0.0)
+        # The profilers are imported only when asked for; they cost more to import than the CLI
+        if capture == "cpu":
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif capture == "memory":
+            import tracemalloc
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._snapshot = tracemalloc.take_snapshot()
+        self._start = time.perf_counter()
+
+    def stop(self) -> str:
+        elapsed = time.perf_counter() - self._start - (getattr(_local, "waited", 0.0) - self._waited)
+        if _enabled and self.name:
+            record("command." + self.name, max(0.0, elapsed))
+        if self.capture == "cpu":
+            self._profiler.disable()
+            import pstats
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+            return out.getvalue()
+        if self.capture == "memory":
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if self._started_tracemalloc:
+                tracemalloc.stop()
+            lines = [f"Peak traced memory: {peak / 1024:.1f} KiB", "Top allocations still held:"]
+            for diff in snapshot.compare_to(self._snapshot, "lineno")[:PROFILE_LINES]:
+                lines.append(f"  {diff}")
+            return "\n".join(lines) + "\n"
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+def reset():
+    global _cache_base
+    with _lock:
+        _stats.clear()
+        _cache_base = (key_cache.hits, key_cache.misses)
+
+def snapshot() -> dict:
+    with _lock:
+        stats = {name: stat.to_dict() for name, stat in sorted(_stats.items())}
+    hits, misses = key_cache.hits - _cache_base[0], key_cache.misses - _cache_base[1]
+    return {"enabled": _enabled, "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "stats": stats,
+            "key_cache": {"hits": hits, "misses": misses,
+                          "hit_rate": hits / (hits + misses) if hits + misses else None}}
+
+def export_json(path: str):
+    with open(path, "w") as f:
+        json.dump(snapshot(), f, indent=2)
+
+def report() -> str:
+    data = snapshot()
+    lines = [f"{'name':<22} {'calls':>8} {'items':>8} {'bytes':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total s':>9}"]
+    for name, stat in data["stats"].items():
+        lines.append(f"{name:<22} {stat['calls']:>8} {stat['items']:>8} {stat['bytes']:>12} {stat['p50'] * 1000:>9.3f} "
+                     f"{stat['p95'] * 1000:>9.3f} {stat['p99'] * 1000:>9.3f} {stat['total']:>9.3f}")
+    cache = data["key_cache"]
+    rate = "n/a" if cache["hit_rate"] is None else f"{cache['hit_rate']:.0%}"
+    lines.append(f"Key cache: {cache['hits']} hits, {cache['misses']} misses ({rate} hit rate)")
+    if not data["enabled"]:
+        lines.append("Instrumentation is off; 'stats on' (or METRICS in config.py) turns it on.")
+    return "\n".join(lines) + "\n"
+
+def stats_command(args: str) -> str:
+    # The CLIs' "stats [on|off|reset|json <path>]"; returns the text to show
+    action, _, rest = args.strip().partition(" ")
+    action = action.lower()
+    if action in ("", "show"):
+        return report()
+    if action in ("on", "off"):
+        enable(action == "on")
+        return f"Instrumentation {action}.\n"
+    if action == "reset":
+        reset()
+        return "Statistics reset.\n"
+    if action == "json":
+        if not rest.strip():
+            return "Usage: stats json <path>\n"
+        export_json(rest.strip())
+        return f"Statistics written to {rest.strip()}\n"
+    return "Usage: stats [on|off|reset|json <path>]\n"
+
+def parse_capture(command: str):
+    # "profile <command>" / "memprofile <command>" -> (command, capture)
+    word, _, rest = command.partition(" ")
+    word = word.lower()
+    if word == "profile" and rest:
+        return rest.strip(), "cpu"
+    if word == "memprofile" and rest:
+        return rest.strip(), "memory"
+    return command, None
@@ -0,0 +1,93 @@
+# src/notelist.py
+
+# Sorted in-memory index of the notes shown in the GUI list.
+#
+# Rows are kept in one list sorted by (uncatalogued, newest first, name), so a
+# single note is inserted or removed with a binary search instead of rebuilding
+# the whole list. A filter narrows the rows to those whose name, title or tags
+# contain every word typed; typing more characters only re-checks the rows
+# that already matched. The Tk widget that draws the visible rows is
+# widgets.VirtualList.
+
+from bisect import bisect_left, insort
+from datetime import datetime
+
+def row_key(filename: str, entry) -> tuple:
+    # Sorts catalogued notes newest first, then uncatalogued notes by name; the
+    # last field is the lower-case text the filter matches against
+    if entry is None:
+        return (1, 0.0, filename, filename.lower())
+    text = " ".join([filename, entry["title"]] + list(entry["tags"])).lower()
+    return (0, -datetime.fromisoformat(entry["modified"]).timestamp(), filename, text)
+
+def row_label(filename: str, entry) -> str:
+    return f"{filename}  |  {entry['title']}" if entry else filename
+
+class NoteList:
+    def __init__(self):
+        self.rows = []     # sorted keys of every note
+        self.notes = {}    # filename -> (key, label)
+        self.query = []    # lower-case words of the current filter
+        self.view = []     # sorted keys of the notes matching the filter
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def filename(self, position: int) -> str:
+        return self.view[position][2]
+
+    def label(self, position: int) -> str:
+        return self.notes[self.filename(position)][1]
+
+    def position(self, filename: str):
+        # Index of filename in the filtered view, or None if hidden or unknown
+        note = self.notes.get(filename)
+        if note is None:
+            return None
+        i = bisect_left(self.view, note[0])
+        return i if i < len(self.view) and self.view[i] == note[0] else None
+
+    def load(self, filenames, entries=None):
+        # Replace everything; entries maps filename -> catalog entry (or is None)
+        entries = entries or {}
+        self.notes = {}
+        for f in filenames:
+            entry = entries.get(f)
+            self.notes[f] = (row_key(f, entry), row_label(f, entry))
+        self.rows = sorted(note[0] for note in self.notes.values())
+        self.view = self._matching(self.rows, self.query)
+
+    def upsert(self, filename: str, entry=None):
+        # Add a note or move it to where its new catalog entry sorts
+        self.remove(filename)
+        note = (row_key(filename, entry), row_label(filename, entry))
+        self.notes[filename] = note
+        insort(self.rows, note[0])
+        if all(word in note[0][3] for word in self.query):
+            insort(self.view, note[0])
+
+    def remove(self, filename: str):
+        note = self.notes.pop(filename, None)
+        if note is None:
+            return
+        for rows in (self.rows, self.view):
+            i = bisect_left(rows, note[0])
+            if i < len(rows) and rows[i] == note[0]:
+                del rows[i]
+
+    def set_filter(self, query: str) -> bool:
+        # Returns False when the filter did not change
+        words = query.lower().split()
+        if words == self.query:
+            return False
+        # Each old word contained in a new one: the new matches are a subset
+        narrower = all(any(old in new for new in words) for old in self.query)
+        self.view = self._matching(self.view if narrower else self.rows, words)
+        self.query = words
+        return True
+
+    def _matching(self, rows, words) -> list:
+        rows = list(rows)
+        for word in words:
+            rows = [key for key in rows if word in key[3]]
+        return rows
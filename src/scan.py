@@ -0,0 +1,54 @@
+# src/scan.py
+
+# Pooled scan engine for vault-wide operations (search, reindex, migrate).
+#
+# Loading and decrypting notes runs on a thread pool: PBKDF2 and AES-GCM in
+# `cryptography` release the GIL, so the work spreads over all cores. Results
+# are yielded as soon as each note finishes, failures are reported per note
+# instead of being skipped silently, and a scan can be cancelled at any time.
+
+import os
+import threading
+from collections import namedtuple
+import storage
+from config import SCAN_WORKERS
+
+# data is the decrypted note, value is whatever `process` returned for it
+ScanResult = namedtuple("ScanResult", ["filename", "data", "value", "error"])
+
+def default_workers() -> int:
+    return SCAN_WORKERS or os.cpu_count() or 1
+
+def _scan_one(filename, decrypt, process):
+    try:
+        data = decrypt(storage.load_note_view(filename))
+        value = process(filename, data) if process else None
+        return ScanResult(filename, data, value, None)
+    except Exception as e:
+        return ScanResult(filename, None, None, e)
+
+def scan_notes(filenames, decrypt, process=None, workers: int = None, cancel: threading.Event = None):
+    # decrypt(token) -> plaintext, e.g. lambda token: decrypt_note(token, password, vault).
+    # Yields one ScanResult per note in completion order. At most 2 * workers
+    # notes are in flight, so memory stays bounded on very large vaults.
+    from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait  # only scans need a pool
+    workers = workers or default_workers()
+    pending_names = iter(filenames)
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while True:
+                while len(in_flight) < workers * 2 and not (cancel and cancel.is_set()):
+                    filename = next(pending_names, None)
+                    if filename is None:
+                        break
+                    in_flight.add(pool.submit(_scan_one, filename, decrypt, process))
+                if not in_flight or (cancel and cancel.is_set()):
+                    return
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Reached on completion, cancellation, or when the caller stops iterating
+            for future in in_flight:
+                future.cancel()
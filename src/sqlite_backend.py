@@ -0,0 +1,135 @@
+# src/sqlite_backend.py
+
+# SQLite storage backend for ShadowNotes.
+#
+# Notes are kept in NOTES_DIR/.notes.db as encrypted blobs next to metadata
+# that is safe to store in the clear (filename, stored size, mtime). The
+# database runs in WAL mode so readers never block the writer, batched writes
+# share one transaction, and listing, sorting and paging are done by SQLite
+# instead of os.listdir plus a stat per file. Connections come from a pool of
+# at most SQLITE_POOL_SIZE, so scan workers read in parallel and a thread pool
+# going away never leaves its connections open.
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from config import DURABLE_WRITES, SQLITE_FILE, SQLITE_POOL_SIZE
+
+SORT_COLUMNS = {"name": "name", "modified": "mtime", "size": "size"}
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, directory: str, filename: str = SQLITE_FILE):
+        self.path = os.path.join(directory, filename)
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                "name TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS notes_mtime ON notes (mtime)")
+
+    def _open(self) -> sqlite3.Connection:
+        # Pooled connections move between threads, one thread at a time
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # FULL syncs the WAL on every commit, so a saved note survives power loss
+        conn.execute("PRAGMA synchronous=FULL" if DURABLE_WRITES else "PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        # Borrow a pooled connection; a new one is opened only while fewer than
+        # SQLITE_POOL_SIZE exist, otherwise this waits for one to be returned
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._pool_lock:
+                opening = self._opened < SQLITE_POOL_SIZE
+                if opening:
+                    self._opened += 1
+            if opening:
+                try:
+                    conn = self._open()
+                except BaseException:
+                    with self._pool_lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def write(self, filename: str, data: bytes):
+        self.write_many([(filename, data)])
+
+    def write_many(self, items):
+        # All rows go in one transaction: one commit (and one WAL sync) per batch
+        rows = [(name, data, len(data), time.time()) for name, data in items]
+        with self._write_lock, self._connection() as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO notes (name, data, size, mtime) VALUES (?, ?, ?, ?)", rows)
+
+    def read(self, filename: str) -> bytes:
+        with self._connection() as conn:
+            row = conn.execute("SELECT data FROM notes WHERE name = ?", (filename,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No such note: '{filename}'")
+        return row[0]
+
+    def read_head(self, filename: str, size: int) -> bytes:
+        with self._connection() as conn:
+            row = conn.execute("SELECT substr(data, 1, ?) FROM notes WHERE name = ?", (size, filename)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No such note: '{filename}'")
+        return row[0]
+
+    def delete(self, filename: str) -> bool:
+        with self._write_lock, self._connection() as conn, conn:
+            return conn.execute("DELETE FROM notes WHERE name = ?", (filename,)).rowcount > 0
+
+    def exists(self, filename: str) -> bool:
+        with self._connection() as conn:
+            return conn.execute("SELECT 1 FROM notes WHERE name = ?", (filename,)).fetchone() is not None
+
+    def stat(self, filename: str):
+        with self._connection() as conn:
+            row = conn.execute("SELECT size, mtime FROM notes WHERE name = ?", (filename,)).fetchone()
+        if row is None:
+            raise FileNotFoundError(f"No such note: '{filename}'")
+        return row[0], row[1]
+
+    def list(self) -> list:
+        with self._connection() as conn:
+            return [row[0] for row in conn.execute("SELECT name FROM notes ORDER BY name")]
+
+    def snapshot(self) -> dict:
+        # filename -> (stored size, mtime), the same values stat() returns
+        with self._connection() as conn:
+            return {row[0]: (row[1], row[2]) for row in conn.execute("SELECT name, size, mtime FROM notes")}
+
+    def list_page(self, sort: str = "name", offset: int = 0, limit: int = None, reverse: bool = False) -> list:
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Unknown sort key '{sort}' (use one of: {', '.join(SORT_COLUMNS)})")
+        order = "DESC" if reverse else "ASC"
+        query = f"SELECT name FROM notes ORDER BY {SORT_COLUMNS[sort]} {order}, name {order} LIMIT ? OFFSET ?"
+        with self._connection() as conn:
+            return [row[0] for row in conn.execute(query, (-1 if limit is None else limit, offset))]
+
+    def close(self):
+        # Closes the idle connections; call once no other thread is using the backend
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._pool_lock:
+            self._opened = 0
@@ -1,27 +1,355 @@
+import io
+import mmap
 import os
 from datetime import datetime
+import durable
+import metrics
+from config import STORAGE_BACKEND, MMAP_THRESHOLD
 
-# Define the directory for storing notes
+# Define the directory for storing notes; it is created when a backend first opens it
 NOTES_DIR = os.path.join(os.path.dirname(__file__), "../notes")
-print("Notes directory:", NOTES_DIR)
 
-if not os.path.exists(NOTES_DIR):
-    os.makedirs(NOTES_DIR)
+class FileBackend:
+    # One file per note in NOTES_DIR (the original layout)
+    name = "files"
 
-def save_note(encrypted_data: bytes, custom_filename: str = None) -> str:
+    def _path(self, filename: str) -> str:
+        return os.path.join(NOTES_DIR, filename)
+
+    def write(self, filename: str, data: bytes):
+        # Replace rather than truncate in place: readers holding an mmap of the old
+        # file keep a valid mapping
+        with _AtomicFileWriter(self._path(filename)) as f:
+            f.write(data)
+
+    def write_parts(self, filename: str, parts):
+        # Header and body go out in one gather write, never joined in memory
+        with _AtomicFileWriter(self._path(filename)) as f:
+            f.writev(parts)
+
+    def write_many(self, items):
+        # Write every temp file first, then make the whole batch durable with one
+        # group commit instead of a sync per note
+        pending = {}
+        try:
+            for filename, data in items:
+                with _AtomicFileWriter(self._path(filename), deferred=True) as f:
+                    f.write(data)
+                if f.path in pending:
+                    os.remove(pending[f.path])  # the same note twice in one batch: the last wins
+                pending[f.path] = f.tmp_path
+            durable.committer(NOTES_DIR).commit((tmp_path, path) for path, tmp_path in pending.items())
+        except BaseException:
+            for tmp_path in pending.values():
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+    def open_writer(self, filename: str):
+        # Stream straight to disk; the note only appears once the writer closes cleanly
+        return _AtomicFileWriter(self._path(filename))
+
+    def open_reader(self, filename: str):
+        return open(self._path(filename), "rb")
+
+    def read(self, filename: str) -> bytes:
+        with open(self._path(filename), "rb") as f:
+            return f.read()
+
+    def read_head(self, filename: str, size: int) -> bytes:
+        with open(self._path(filename), "rb") as f:
+            return f.read(size)
+
+    def read_view(self, filename: str) -> memoryview:
+        # Large notes are mapped rather than copied; small ones are read into one buffer
+        with open(self._path(filename), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size >= MMAP_THRESHOLD:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            buf = bytearray(size)
+            view = memoryview(buf)
+            filled = 0
+            while filled < size:
+                n = f.readinto(view[filled:])
+                if not n:
+                    break
+                filled += n
+            return view[:filled]
+
+    def delete(self, filename: str) -> bool:
+        try:
+            os.remove(self._path(filename))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def exists(self, filename: str) -> bool:
+        return os.path.isfile(self._path(filename))
+
+    def stat(self, filename: str):
+        # (stored size, modification time)
+        st = os.stat(self._path(filename))
+        return st.st_size, st.st_mtime
+
+    def list(self) -> list:
+        # Dot-files in NOTES_DIR hold vault metadata, not notes
+        return sorted(f for f in os.listdir(NOTES_DIR) if not f.startswith("."))
+
+    def signature(self, filename: str):
+        # Changes whenever the note is rewritten; atomic writes also give it a new inode
+        return _signature(os.stat(self._path(filename)))
+
+    def snapshot(self) -> dict:
+        # filename -> signature for every note, from one directory scan
+        result = {}
+        with os.scandir(NOTES_DIR) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    result[entry.name] = _signature(entry.stat())
+                except FileNotFoundError:
+                    pass  # deleted while scanning
+        return result
+
+    def change_token(self):
+        # Every create, rename and delete in NOTES_DIR bumps its mtime
+        return os.stat(NOTES_DIR).st_mtime_ns
+
+    def close(self):
+        pass
+
+def _signature(st) -> tuple:
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+class _AtomicFileWriter:
+    # Write to a temp file, then commit it over path durably (see durable.py).
+    # deferred=True leaves the commit to the caller, to share it with other notes.
+    def __init__(self, path: str, deferred: bool = False):
+        self.path = path
+        self.deferred = deferred
+        self._file, self.tmp_path = durable.open_temp(path)
+
+    def write(self, data) -> int:
+        return self._file.write(data)
+
+    def writev(self, parts) -> int:
+        # os.writev where the OS has it (POSIX), one write per part elsewhere
+        if not hasattr(os, "writev"):
+            return sum(self._file.write(part) for part in parts)
+        self._file.flush()
+        views = [memoryview(part) for part in parts if len(part)]
+        total = sum(len(view) for view in views)
+        while views:
+            # writev may write only part of the data; resume where it stopped
+            written = os.writev(self._file.fileno(), views)
+            while views and written >= len(views[0]):
+                written -= len(views.pop(0))
+            if views:
+                views[0] = views[0][written:]
+        return total
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self.tmp_path)
+        elif not self.deferred:
+            try:
+                durable.committer(os.path.dirname(self.path)).commit([(self.tmp_path, self.path)])
+            except BaseException:
+                if os.path.exists(self.tmp_path):
+                    os.remove(self.tmp_path)
+                raise
+
+class _BufferedNoteWriter(io.BytesIO):
+    # Fallback for backends that cannot stream: collect the note, store it on clean exit
+    def __init__(self, backend, filename: str):
+        super().__init__()
+        self._backend = backend
+        self._filename = filename
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._backend.write(self._filename, self.getvalue())
+        return super().__exit__(exc_type, exc, tb)
+
+_backends = {}
+
+def make_backend(name: str):
+    if name == "files":
+        return FileBackend()
+    if name == "container":
+        from container import ContainerBackend
+        return ContainerBackend(NOTES_DIR)
+    if name == "sqlite":
+        from sqlite_backend import SQLiteBackend
+        return SQLiteBackend(NOTES_DIR)
+    raise ValueError(f"Unknown storage backend '{name}'")
+
+def get_backend(name: str = None):
+    # One backend instance per (backend, notes directory); STORAGE_BACKEND picks the default
+    name = name or STORAGE_BACKEND
+    key = (name, os.path.abspath(NOTES_DIR))
+    if key not in _backends:
+        os.makedirs(NOTES_DIR, exist_ok=True)
+        _backends[key] = make_backend(name)
+    return _backends[key]
+
+def close_backends():
+    for backend in _backends.values():
+        backend.close()
+    _backends.clear()
+
+def note_filename(custom_filename: str = None) -> str:
     if custom_filename:
         # If the filename does not end with .enc, add the extension
         if not custom_filename.endswith(".enc"):
             custom_filename += ".enc"
-        filename = custom_filename
-    else:
-        filename = datetime.now().strftime("%Y%m%d%H%M%S") + ".enc"
-    filepath = os.path.join(NOTES_DIR, filename)
-    with open(filepath, "wb") as f:
-        f.write(encrypted_data)
+        return custom_filename
+    return datetime.now().strftime("%Y%m%d%H%M%S") + ".enc"
+
+@metrics.instrument("storage.write", metrics.arg_size(0))
+def save_note(encrypted_data: bytes, custom_filename: str = None) -> str:
+    filename = note_filename(custom_filename)
+    get_backend().write(filename, encrypted_data)
+    return filename
+
+def save_notes(items, batch_size: int = 500) -> list:
+    # Batched save_note for bulk imports/migrations: items are (encrypted_data, filename)
+    # pairs; each batch is handed to the backend in one call (one transaction on SQLite)
+    backend = get_backend()
+    saved, batch = [], []
+    for encrypted_data, custom_filename in items:
+        batch.append((note_filename(custom_filename), encrypted_data))
+        if len(batch) >= batch_size:
+            _write_batch(backend, batch)
+            saved.extend(name for name, _ in batch)
+            batch = []
+    if batch:
+        _write_batch(backend, batch)
+        saved.extend(name for name, _ in batch)
+    return saved
+
+@metrics.instrument("storage.write", lambda args, result: (len(args[1]), sum(len(data) for _, data in args[1])))
+def _write_batch(backend, batch):
+    backend.write_many(batch)
+
+@metrics.instrument("storage.write", metrics.arg_size(1))
+def write_note(filename: str, encrypted_data: bytes):
+    # Overwrite an existing note under exactly this name (edit paths)
+    get_backend().write(filename, encrypted_data)
+
+def save_note_parts(parts, custom_filename: str = None) -> str:
+    # save_note for (header, ciphertext) pairs from encrypt_note_parts
+    filename = note_filename(custom_filename)
+    write_note_parts(filename, parts)
     return filename
 
+@metrics.instrument("storage.write", metrics.arg_size(1))
+def write_note_parts(filename: str, parts):
+    backend = get_backend()
+    if hasattr(backend, "write_parts"):
+        backend.write_parts(filename, parts)
+    else:
+        backend.write(filename, b"".join(parts))
+
+@metrics.instrument("storage.read", metrics.result_size)
 def load_note(filename: str) -> bytes:
-    filepath = os.path.join(NOTES_DIR, filename)
-    with open(filepath, "rb") as f:
-        return f.read()
+    return get_backend().read(filename)
+
+@metrics.instrument("storage.read", metrics.result_size)
+def load_note_view(filename: str) -> memoryview:
+    # Read-only view of a note for decrypt paths: mmap-backed on the file backend for
+    # large notes, so nothing is copied until decryption. Use load_note for notes that
+    # are about to be rewritten.
+    backend = get_backend()
+    if hasattr(backend, "read_view"):
+        return backend.read_view(filename)
+    return memoryview(backend.read(filename))
+
+def open_note_writer(filename: str):
+    # Writable binary stream for a note, used as a context manager
+    backend = get_backend()
+    if hasattr(backend, "open_writer"):
+        return backend.open_writer(filename)
+    return _BufferedNoteWriter(backend, filename)
+
+def read_note_head(filename: str, size: int) -> bytes:
+    # The first size bytes of a note (its format header) without reading the rest
+    backend = get_backend()
+    if hasattr(backend, "read_head"):
+        return backend.read_head(filename, size)
+    return backend.read(filename)[:size]
+
+def open_note_reader(filename: str):
+    # Readable binary stream for a note, used as a context manager. Only the file
+    # backend streams; the others read the whole note into memory first.
+    backend = get_backend()
+    if hasattr(backend, "open_reader"):
+        return backend.open_reader(filename)
+    return io.BytesIO(backend.read(filename))
+
+@metrics.instrument("storage.delete")
+def delete_note(filename: str) -> bool:
+    return get_backend().delete(filename)
+
+def note_exists(filename: str) -> bool:
+    return get_backend().exists(filename)
+
+def stat_note(filename: str):
+    return get_backend().stat(filename)
+
+@metrics.instrument("storage.list", lambda args, result: (len(result), 0))
+def list_notes() -> list:
+    return get_backend().list()
+
+def snapshot_notes() -> dict:
+    # filename -> signature that changes whenever the note is rewritten (see watch.py)
+    backend = get_backend()
+    if hasattr(backend, "snapshot"):
+        return backend.snapshot()
+    return {f: tuple(backend.stat(f)) for f in backend.list()}
+
+def note_signature(filename: str):
+    # Signature of one note as in snapshot_notes(), or None if it does not exist
+    backend = get_backend()
+    try:
+        if hasattr(backend, "signature"):
+            return backend.signature(filename)
+        return tuple(backend.stat(filename))
+    except FileNotFoundError:
+        return None
+
+def notes_change_token():
+    # Cheap value that changes when notes are added, replaced or deleted, or None
+    # if the backend has none and every check needs a full snapshot
+    backend = get_backend()
+    return backend.change_token() if hasattr(backend, "change_token") else None
+
+def list_notes_page(sort: str = "name", offset: int = 0, limit: int = None, reverse: bool = False) -> list:
+    # Sorted page of note names by "name", "modified" or "size"; SQLite does this in
+    # the database, the other backends fall back to sorting stat() results
+    backend = get_backend()
+    if hasattr(backend, "list_page"):
+        return backend.list_page(sort, offset, limit, reverse)
+    if sort == "name":
+        names = sorted(backend.list(), reverse=reverse)
+    elif sort in ("modified", "size"):
+        field = 1 if sort == "modified" else 0
+        stats = {name: backend.stat(name) for name in backend.list()}
+        names = sorted(stats, key=lambda name: (stats[name][field], name), reverse=reverse)
+    else:
+        raise ValueError(f"Unknown sort key '{sort}' (use one of: name, modified, size)")
+    return names[offset:] if limit is None else names[offset:offset + limit]
+
+def copy_notes(source: str, target: str) -> int:
+    # Copy every note between backends, e.g. copy_notes("files", "container") before
+    # switching STORAGE_BACKEND; returns the number of notes copied
+    src, dst = get_backend(source), get_backend(target)
+    names = src.list()
+    for start in range(0, len(names), 500):
+        dst.write_many([(filename, src.read(filename)) for filename in names[start:start + 500]])
+    return len(names)
@@ -0,0 +1,242 @@
+# src/stream.py
+
+# Streaming, segmented AES-GCM encryption for large notes and attachments.
+#
+# The plaintext is cut into fixed-size segments that are encrypted one at a
+# time, so memory use stays constant whatever the note size:
+#
+#   header:  STREAM_MAGIC + mode(1) + segment size(4) + key material + nonce prefix(7)
+#   body:    AES-GCM(segment) + 16-byte tag, for every segment
+#
+# Key material is KDF params(13) + salt(16) for password mode (a bare PBKDF2
+# salt in streams from before kdf.py), or a data key wrapped by the vault
+# key(60) for vault mode. Each segment's nonce is the random prefix,
+# a 32-bit big-endian segment counter and a last-segment flag byte, and the
+# header is authenticated with every segment: reordered, dropped, truncated or
+# appended segments all fail to decrypt.
+#
+# Segments have a fixed encrypted size, so plaintext offset N lives in segment
+# N // segment_size and read_range() can decrypt just the segments it needs.
+
+import codecs
+import os
+import struct
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import storage
+from config import STREAM_SEGMENT_SIZE, STREAM_PREVIEW_SIZE
+from encryption import get_key
+from kdf import LEGACY_PARAMS, PARAMS_SIZE, current_params, pack_params, unpack_params
+
+STREAM_MAGIC = b"SNS\x01"
+MODE_LEGACY_PASSWORD = 0
+MODE_VAULT = 1
+MODE_PASSWORD = 2
+PREFIX_SIZE = 7
+TAG_SIZE = 16
+SALT_SIZE = 16
+WRAPPED_KEY_BLOB_SIZE = 12 + 32 + 16
+FIXED_HEADER = struct.Struct("<4sBI")
+MATERIAL_SIZES = {MODE_LEGACY_PASSWORD: SALT_SIZE, MODE_VAULT: WRAPPED_KEY_BLOB_SIZE, MODE_PASSWORD: PARAMS_SIZE + SALT_SIZE}
+MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+
+def is_stream(token: bytes) -> bool:
+    return token[:len(STREAM_MAGIC)] == STREAM_MAGIC
+
+def stream_uses_vault(token: bytes) -> bool:
+    return is_stream(token) and token[len(STREAM_MAGIC)] == MODE_VAULT
+
+def segment_nonce(prefix: bytes, counter: int, last: bool) -> bytes:
+    return prefix + struct.pack(">IB", counter, 1 if last else 0)
+
+def read_full(src, size: int) -> bytes:
+    # file.read may return short reads on pipes/sockets; keep reading until size or EOF
+    chunks = []
+    while size > 0:
+        chunk = src.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def readinto_full(src, buf) -> int:
+    # readinto until buf is full or EOF; returns the number of bytes read
+    view = memoryview(buf)
+    filled = 0
+    while filled < len(view):
+        n = src.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    return filled
+
+def make_header(password: str = None, vault=None, segment_size: int = STREAM_SEGMENT_SIZE):
+    # Returns (key, header bytes) for a new stream
+    if password:
+        salt = os.urandom(SALT_SIZE)
+        params = current_params()
+        key = get_key(password, salt, params)
+        material = FIXED_HEADER.pack(STREAM_MAGIC, MODE_PASSWORD, segment_size) + pack_params(params) + salt
+    elif vault is not None:
+        key = AESGCM.generate_key(bit_length=256)
+        material = FIXED_HEADER.pack(STREAM_MAGIC, MODE_VAULT, segment_size) + vault.wrap_key(key)
+    else:
+        raise ValueError("Vault is locked; a note password is required")
+    return key, material + os.urandom(PREFIX_SIZE)
+
+def parse_header(src):
+    # Returns (mode, segment size, key material, header bytes) without deriving any key
+    fixed = read_full(src, FIXED_HEADER.size)
+    if len(fixed) < FIXED_HEADER.size:
+        raise ValueError("Not a ShadowNotes stream")
+    magic, mode, segment_size = FIXED_HEADER.unpack(fixed)
+    # Segment buffers are sized from the header, so reject absurd sizes up front
+    if magic != STREAM_MAGIC or mode not in MATERIAL_SIZES or not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError("Not a ShadowNotes stream")
+    material = read_full(src, MATERIAL_SIZES[mode])
+    prefix = read_full(src, PREFIX_SIZE)
+    return mode, segment_size, material, fixed + material + prefix
+
+def read_header(src, password: str = None, vault=None):
+    # Returns (key, header bytes, segment size) for an existing stream
+    mode, segment_size, material, header = parse_header(src)
+    if mode in (MODE_PASSWORD, MODE_LEGACY_PASSWORD):
+        if password is None:
+            raise ValueError("A note password is required for this note")
+        if mode == MODE_PASSWORD:
+            key = get_key(password, material[PARAMS_SIZE:], unpack_params(material))
+        else:
+            key = get_key(password, material, LEGACY_PARAMS)
+    else:
+        if vault is None:
+            raise ValueError("Vault is locked")
+        key = vault.unwrap_key(material)
+    return key, header, segment_size
+
+def decrypt_segment(aesgcm: AESGCM, header: bytes, counter: int, last: bool, chunk: bytes, out=None):
+    # Decrypts into a fresh bytes object, or into the reusable buffer out (returns a view of it)
+    nonce = segment_nonce(header[-PREFIX_SIZE:], counter, last)
+    try:
+        if out is None:
+            return aesgcm.decrypt(nonce, chunk, header)
+        if len(chunk) < TAG_SIZE:
+            raise ValueError("Segment too short")
+        target = memoryview(out)[:len(chunk) - TAG_SIZE]
+        aesgcm.decrypt_into(nonce, chunk, header, target)
+        return target
+    except Exception as e:
+        raise ValueError("Incorrect password or corrupted/truncated stream") from e
+
+def stream_layout(src, header: bytes, segment_size: int):
+    # (segment count, plaintext size) from the stored size; src must be seekable
+    body = src.seek(0, os.SEEK_END) - len(header)
+    count = max(1, -(-body // (segment_size + TAG_SIZE)))
+    return count, max(0, body - count * TAG_SIZE)
+
+def encrypt_stream(src, dst, password: str = None, vault=None, segment_size: int = STREAM_SEGMENT_SIZE) -> int:
+    # Encrypt binary file object src into dst; returns the number of plaintext bytes
+    key, header = make_header(password, vault, segment_size)
+    prefix = header[-PREFIX_SIZE:]
+    aesgcm = AESGCM(key)
+    # Two input buffers (one segment is read ahead so the final segment can be flagged
+    # as last) and one output buffer, reused for every segment
+    chunks = (bytearray(segment_size), bytearray(segment_size))
+    out = memoryview(bytearray(segment_size + TAG_SIZE))
+    dst.write(header)
+    total = 0
+    counter = 0
+    size = readinto_full(src, chunks[0])
+    while True:
+        next_size = readinto_full(src, chunks[(counter + 1) % 2]) if size == segment_size else 0
+        last = next_size == 0
+        chunk = memoryview(chunks[counter % 2])[:size]
+        written = aesgcm.encrypt_into(segment_nonce(prefix, counter, last), chunk, header, out[:size + TAG_SIZE])
+        dst.write(out[:written])
+        total += size
+        if last:
+            return total
+        size = next_size
+        counter += 1
+
+def decrypt_segments(src, password: str = None, vault=None):
+    # Yield decrypted segments of the stream in src, one at a time. Each segment is a
+    # view into a buffer that the next segment reuses: write it out before advancing.
+    key, header, segment_size = read_header(src, password, vault)
+    aesgcm = AESGCM(key)
+    encrypted_size = segment_size + TAG_SIZE
+    chunks = (bytearray(encrypted_size), bytearray(encrypted_size))
+    out = bytearray(segment_size)
+    counter = 0
+    size = readinto_full(src, chunks[0])
+    while True:
+        next_size = readinto_full(src, chunks[(counter + 1) % 2]) if size == encrypted_size else 0
+        last = next_size == 0
+        yield decrypt_segment(aesgcm, header, counter, last, memoryview(chunks[counter % 2])[:size], out)
+        if last:
+            return
+        size = next_size
+        counter += 1
+
+def decrypt_range(src, offset: int, length: int, password: str = None, vault=None) -> bytes:
+    # Plaintext bytes [offset, offset + length) of a seekable stream, decrypting only
+    # the segments that overlap the range; short at the end of the stream
+    if offset < 0 or length < 0:
+        raise ValueError("offset and length must not be negative")
+    key, header, segment_size = read_header(src, password, vault)
+    count, size = stream_layout(src, header, segment_size)
+    end = min(offset + length, size)
+    if offset >= end:
+        return b""
+    aesgcm = AESGCM(key)
+    encrypted_size = segment_size + TAG_SIZE
+    first, last = offset // segment_size, (end - 1) // segment_size
+    src.seek(len(header) + first * encrypted_size)
+    data = b"".join(
+        decrypt_segment(aesgcm, header, counter, counter == count - 1, read_full(src, encrypted_size))
+        for counter in range(first, last + 1)
+    )
+    start = offset - first * segment_size
+    return data[start:start + end - offset]
+
+def decrypt_stream(src, dst, password: str = None, vault=None) -> int:
+    # Decrypt binary file object src into dst; returns the number of plaintext bytes
+    total = 0
+    for segment in decrypt_segments(src, password, vault):
+        dst.write(segment)
+        total += len(segment)
+    return total
+
+def save_note_stream(src, custom_filename: str = None, password: str = None, vault=None) -> str:
+    # Streaming counterpart of save_note: encrypt src straight into the note store
+    filename = storage.note_filename(custom_filename)
+    with storage.open_note_writer(filename) as dst:
+        encrypt_stream(src, dst, password, vault)
+    return filename
+
+def load_note_stream(filename: str, dst, password: str = None, vault=None) -> int:
+    # Streaming counterpart of load_note: decrypt a streamed note into dst
+    with storage.open_note_reader(filename) as src:
+        return decrypt_stream(src, dst, password, vault)
+
+def read_range(filename: str, offset: int, length: int, password: str = None, vault=None) -> bytes:
+    # Random access into a streamed note without decrypting the whole of it
+    with storage.open_note_reader(filename) as src:
+        return decrypt_range(src, offset, length, password, vault)
+
+def note_stream_size(filename: str) -> int:
+    # Plaintext size of a streamed note, from its header and stored size alone
+    with storage.open_note_reader(filename) as src:
+        _, segment_size, _, header = parse_header(src)
+        return stream_layout(src, header, segment_size)[1]
+
+def iter_text(filename: str, password: str = None, vault=None, chunk_size: int = STREAM_PREVIEW_SIZE):
+    # Lazily decode a streamed note as UTF-8, one chunk per next(); used for previews
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    size = note_stream_size(filename)
+    offset = 0
+    while offset < size:
+        data = read_range(filename, offset, chunk_size, password, vault)
+        if not data:
+            break
+        offset += len(data)
+        yield decoder.decode(data, final=offset >= size)
@@ -0,0 +1,105 @@
+# src/tasks.py
+
+# Background task runner for the Tk front-ends.
+#
+# Key derivation, decryption and disk I/O run on a worker thread so the Tk
+# main loop never blocks. Workers only ever put results, errors and progress
+# on a queue; a short after() poll on the Tk thread drains it and runs the
+# callbacks there, so widget code stays on the main thread. Tasks run one at a
+# time in submission order, which keeps writes to notes, the index and the
+# catalog ordered.
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import TASK_POLL_MS
+
+class Task:
+    def __init__(self, on_done=None, on_error=None, on_progress=None):
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+        self._events = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        # Cooperative: long-running work checks task.cancelled / task.cancel_event
+        self.cancel_event.set()
+
+    def progress(self, done: int, total: int = None, message: str = None):
+        # Called from the worker; delivered to on_progress on the Tk thread
+        self._events.put((self, "progress", (done, total, message)))
+
+class TaskRunner:
+    def __init__(self, root, workers: int = 1, poll_ms: int = TASK_POLL_MS):
+        # root: anything with Tk's after(ms, callback), normally the main window
+        self.root = root
+        self.poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._events = queue.Queue()
+        self._tasks = set()
+        self._polling = False
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._tasks)
+
+    def submit(self, work, on_done=None, on_error=None, on_progress=None) -> Task:
+        # work(task) runs on the worker thread; on_done(result), on_error(exception)
+        # and on_progress(done, total, message) run on the Tk thread
+        task = Task(on_done, on_error, on_progress)
+        task._events = self._events
+        self._tasks.add(task)
+        self._pool.submit(self._run, task, work)
+        self._schedule()
+        return task
+
+    def _run(self, task: Task, work):
+        try:
+            self._events.put((task, "done", work(task)))
+        except Exception as e:
+            self._events.put((task, "error", e))
+
+    def _schedule(self):
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self.poll)
+
+    def poll(self):
+        # Drain the queue on the Tk thread. Only the latest progress per task is
+        # shown, so a fast worker cannot flood the event loop.
+        self._polling = False
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+        latest = {}
+        for task, kind, value in events:
+            if kind == "progress":
+                latest[task] = value
+        for task, value in latest.items():
+            if task.on_progress and task in self._tasks:
+                task.on_progress(*value)
+        for task, kind, value in events:
+            if kind == "progress":
+                continue
+            self._tasks.discard(task)
+            if kind == "done" and task.on_done:
+                task.on_done(value)
+            elif kind == "error" and task.on_error:
+                task.on_error(value)
+        if self._tasks:
+            self._schedule()
+
+    def shutdown(self):
+        # Cancel everything still queued or running; does not wait for the worker
+        for task in list(self._tasks):
+            task.cancel()
+        self._tasks.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
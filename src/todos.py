@@ -0,0 +1,380 @@
+# src/todos.py
+
+# Append-only encrypted todo journal.
+#
+#   header:  TODO_MAGIC + KDF params(13) + salt(16)
+#   record:  length(4) + nonce(12) + AES-GCM(JSON operation), header as associated data
+#
+# The first record is always a snapshot of the whole list; every add, update or
+# delete after it is one small record appended and fsync-ed on its own, so a
+# change costs O(1) and is on disk as soon as the call returns (DURABLE_WRITES =
+# False skips the fsync, like every other writer). When the
+# operations outnumber the live todos (and TODO_COMPACT_MIN_RECORDS), the file
+# is rewritten as a single fresh snapshot with durable.write_atomic.
+#
+# Every change, compaction and open holds an exclusive file lock (filelock.py)
+# and first picks up records other processes appended, then writes at the end
+# it read to, so two processes never interleave or overwrite records. A crash
+# can only leave a torn last record; it is cut off under the lock, on the next
+# open or append, never while another process may still be writing it. A todos
+# file in the old format (one password-encrypted JSON array) is converted on open.
+#
+# Each todo has a stable id, a status, a priority and an optional due date
+# (YYYY-MM-DD). Secondary indexes by status and by due date answer queries such
+# as "pending, due this week" without scanning every todo, and TodoView keeps a
+# sorted list widget in step one row at a time.
+
+import json
+import os
+import struct
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from config import DURABLE_WRITES, TODO_COMPACT_MIN_RECORDS
+from durable import write_atomic
+from encryption import decrypt_data, get_key
+from filelock import FileLock
+from kdf import PARAMS_SIZE, current_params, pack_params, unpack_params
+
+TODO_MAGIC = b"SNT\x01"
+HEADER_SIZE = len(TODO_MAGIC) + PARAMS_SIZE + 16
+LENGTH = struct.Struct("<I")
+MAX_RECORD_SIZE = 16 * 1024 * 1024
+
+STATUSES = ("pending", "done")
+PRIORITIES = ("high", "normal", "low")
+NO_DUE = "9999-12-31"  # sorts undated todos last
+
+def is_journal(blob: bytes) -> bool:
+    return blob[:len(TODO_MAGIC)] == TODO_MAGIC
+
+def check_fields(fields: dict) -> dict:
+    # Validate user-supplied fields; raises ValueError
+    if "status" in fields and fields["status"] not in STATUSES:
+        raise ValueError(f"Unknown status '{fields['status']}' (use one of: {', '.join(STATUSES)})")
+    if "priority" in fields and fields["priority"] not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{fields['priority']}' (use one of: {', '.join(PRIORITIES)})")
+    if fields.get("due"):
+        try:
+            fields["due"] = date.fromisoformat(fields["due"]).isoformat()
+        except ValueError:
+            raise ValueError(f"Invalid due date '{fields['due']}' (use YYYY-MM-DD)") from None
+    elif "due" in fields:
+        fields["due"] = None
+    return fields
+
+def _normalize(todo: dict) -> dict:
+    # Todos written before statuses existed only have "done"
+    todo = dict(todo)
+    done = todo.pop("done", None)
+    if "status" not in todo:
+        todo["status"] = "done" if done else "pending"
+    todo.setdefault("priority", "normal")
+    todo.setdefault("due", None)
+    return todo
+
+def todo_key(todo: dict) -> tuple:
+    # Display order: pending first, then by due date, priority and id
+    return (STATUSES.index(todo["status"]), todo["due"] or NO_DUE, PRIORITIES.index(todo["priority"]), todo["id"])
+
+def format_todo(todo: dict) -> str:
+    due = f" due {todo['due']}" if todo["due"] else ""
+    return f"{todo['id']}: {todo['task']} [{todo['status'].capitalize()}] ({todo['priority']}){due}"
+
+def week_ahead() -> str:
+    # Last due date that counts as "due this week" (overdue todos included)
+    return (date.today() + timedelta(days=7)).isoformat()
+
+class TodoIndex:
+    # Secondary indexes over the live todos
+    def __init__(self):
+        self.by_status = {status: set() for status in STATUSES}
+        self.by_due = []  # sorted (due, id) of todos that have a due date
+
+    def add(self, todo: dict):
+        self.by_status[todo["status"]].add(todo["id"])
+        if todo["due"]:
+            insort(self.by_due, (todo["due"], todo["id"]))
+
+    def remove(self, todo: dict):
+        self.by_status[todo["status"]].discard(todo["id"])
+        if todo["due"]:
+            i = bisect_left(self.by_due, (todo["due"], todo["id"]))
+            if i < len(self.by_due) and self.by_due[i] == (todo["due"], todo["id"]):
+                del self.by_due[i]
+
+    def ids(self, status: str = None, due_to: str = None):
+        # Ids matching every given filter; due_to keeps todos due on or before it
+        if due_to is not None:
+            end = bisect_left(self.by_due, (due_to, float("inf")))
+            ids = {todo_id for _, todo_id in self.by_due[:end]}
+            return ids & self.by_status[status] if status else ids
+        if status:
+            return set(self.by_status[status])
+        return None
+
+class TodoView:
+    # Sorted rows of the todos matching a filter, for list widgets. changed()
+    # reports where a row left and where it now goes, so only that row is redrawn.
+    def __init__(self, journal: "TodoJournal", status: str = None, due_to: str = None):
+        self.status = status
+        self.due_to = due_to
+        self.keys = {}
+        self.rows = []
+        for todo in journal.query(status, due_to):
+            self.keys[todo["id"]] = todo_key(todo)
+            self.rows.append(self.keys[todo["id"]])
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def todo_id(self, position: int) -> int:
+        return self.rows[position][3]
+
+    def matches(self, todo: dict) -> bool:
+        if self.status and todo["status"] != self.status:
+            return False
+        return self.due_to is None or (todo["due"] is not None and todo["due"] <= self.due_to)
+
+    def changed(self, todo_id: int, todo: dict = None):
+        # todo: the new state, or None if deleted. Returns (old position, new
+        # position), either None when the row was not / is no longer shown.
+        old = new = None
+        key = self.keys.pop(todo_id, None)
+        if key is not None:
+            old = bisect_left(self.rows, key)
+            del self.rows[old]
+        if todo is not None and self.matches(todo):
+            key = self.keys[todo_id] = todo_key(todo)
+            new = bisect_left(self.rows, key)
+            self.rows.insert(new, key)
+        return old, new
+
+class TodoJournal:
+    def __init__(self, path: str, password: str):
+        self.path = path
+        self.password = password
+        self.todos = {}     # id -> {"id", "task", "status", "priority", "due"}
+        self.index = TodoIndex()
+        self.next_id = 1
+        self.records = 0    # operations appended since the snapshot
+        self._header = None
+        self._aesgcm = None
+        self._end = 0       # offset just past the last record applied
+        self._ino = None
+        self._lock = FileLock(path)
+
+    @classmethod
+    def open(cls, path: str, password: str) -> "TodoJournal":
+        # Raises ValueError for a wrong password or a damaged journal
+        journal = cls(path, password)
+        with journal._lock:
+            if not os.path.exists(path):
+                journal._rewrite([])
+                return journal
+            with open(path, "rb") as f:
+                head = f.read(len(TODO_MAGIC))
+            if not is_journal(head):
+                with open(path, "rb") as f:
+                    legacy = json.loads(decrypt_data(f.read(), password).decode())
+                journal._rewrite([{"task": t["task"], "done": t["done"]} for t in legacy])
+                return journal
+            journal._load()
+        return journal
+
+    def items(self) -> list:
+        return list(self.todos.values())
+
+    def get(self, todo_id: int) -> dict:
+        return self.todos.get(todo_id)
+
+    def query(self, status: str = None, due_to: str = None) -> list:
+        # Todos with the given status and/or due on or before due_to, in display order
+        ids = self.index.ids(status, due_to)
+        todos = self.todos.values() if ids is None else [self.todos[i] for i in ids]
+        return sorted(todos, key=todo_key)
+
+    def add(self, task: str, priority: str = "normal", due: str = None) -> dict:
+        fields = check_fields({"priority": priority, "due": due})
+        with self._lock:
+            self._sync()
+            todo = {"id": self.next_id, "task": task, "status": "pending", **fields}
+            self._append({"op": "add", "todo": todo})
+            return self.todos[todo["id"]]
+
+    def update(self, todo_id: int, **fields) -> dict:
+        # Change any of task, status, priority, due; one appended record
+        unknown = set(fields) - {"task", "status", "priority", "due"}
+        if unknown:
+            raise ValueError(f"Unknown todo fields: {', '.join(sorted(unknown))}")
+        check_fields(fields)
+        with self._lock:
+            self._sync()
+            self._require(todo_id)
+            self._append({"op": "update", "id": todo_id, "fields": fields})
+            return self.todos[todo_id]
+
+    def set_done(self, todo_id: int, done: bool = True) -> dict:
+        return self.update(todo_id, status="done" if done else "pending")
+
+    def delete(self, todo_id: int):
+        with self._lock:
+            self._sync()
+            self._require(todo_id)
+            self._append({"op": "delete", "id": todo_id})
+
+    def compact(self):
+        # Rewrite as one snapshot; keeps the salt unless the KDF settings changed
+        with self._lock:
+            self._sync()
+            self._rewrite(self.items(), keep_key=True)
+
+    def _require(self, todo_id: int):
+        if todo_id not in self.todos:
+            raise KeyError(f"No todo with id {todo_id}")
+
+    def _apply(self, op: dict):
+        kind = op.get("op")
+        if kind == "snapshot":
+            self.todos = {}
+            self.index = TodoIndex()
+            for todo in op["todos"]:
+                todo = self.todos[todo["id"]] = _normalize(todo)
+                self.index.add(todo)
+            self.next_id = op["next_id"]
+            self.records = 0
+            return
+        if kind == "add":
+            todo = self.todos.pop(op["todo"]["id"], None)
+            if todo:
+                self.index.remove(todo)
+            todo = self.todos[op["todo"]["id"]] = _normalize(op["todo"])
+            self.index.add(todo)
+            self.next_id = max(self.next_id, todo["id"] + 1)
+        elif kind == "update":
+            todo = self.todos.get(op["id"])
+            if todo:
+                self.index.remove(todo)
+                fields = dict(op["fields"])
+                if "done" in fields:
+                    fields["status"] = "done" if fields.pop("done") else "pending"
+                todo.update(fields)
+                self.index.add(todo)
+        elif kind == "delete":
+            todo = self.todos.pop(op["id"], None)
+            if todo:
+                self.index.remove(todo)
+        else:
+            raise ValueError(f"Unknown todo journal operation '{kind}'")
+        self.records += 1
+
+    def _seal(self, op: dict) -> bytes:
+        nonce = os.urandom(12)
+        sealed = nonce + self._aesgcm.encrypt(nonce, json.dumps(op).encode(), self._header)
+        return LENGTH.pack(len(sealed)) + sealed
+
+    def _use_header(self, header: bytes):
+        params = unpack_params(header[len(TODO_MAGIC):])
+        salt = header[len(TODO_MAGIC) + PARAMS_SIZE:HEADER_SIZE]
+        self._header = bytes(header)
+        self._aesgcm = AESGCM(get_key(self.password, salt, params))
+
+    def _read_records(self, f, end_ok: bool):
+        # Apply records from f's position; returns the offset after the last whole one
+        offset = f.tell()
+        while True:
+            prefix = f.read(LENGTH.size)
+            if not prefix:
+                return offset
+            size = LENGTH.unpack(prefix)[0] if len(prefix) == LENGTH.size else 0
+            body = f.read(size) if 12 < size <= MAX_RECORD_SIZE else b""
+            if len(body) != size or size <= 12:
+                if end_ok and not f.read(1):
+                    return offset  # torn write at the tail
+                raise ValueError("Damaged todo journal")
+            try:
+                op = json.loads(self._aesgcm.decrypt(body[:12], body[12:], self._header).decode())
+            except InvalidTag:
+                if offset == HEADER_SIZE:
+                    raise ValueError("Incorrect password or damaged todo journal")
+                if end_ok and not f.read(1):
+                    return offset
+                raise ValueError("Damaged todo journal")
+            self._apply(op)
+            offset = f.tell()
+
+    def _load(self):
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+            if len(header) != HEADER_SIZE or not is_journal(header):
+                raise ValueError("Damaged todo journal")
+            self._use_header(header)
+            self.todos, self.next_id, self.records = {}, 1, 0
+            end = self._read_records(f, end_ok=True)
+            self._ino = os.fstat(f.fileno()).st_ino
+            size = os.fstat(f.fileno()).st_size
+        if end == HEADER_SIZE:
+            raise ValueError("Damaged todo journal")
+        if end < size and self._lock.held():
+            # Drop the torn record a crash left behind so new appends follow whole ones;
+            # without the lock it may be another process's append in progress
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        self._end = end
+
+    def _sync(self):
+        # Catch up with records appended (or a compaction done) by another process
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            st = None
+        if st is None or st.st_ino != self._ino:
+            if st is None:
+                self._rewrite(self.items(), keep_key=True)
+            else:
+                self._load()
+            return
+        if st.st_size > self._end:
+            with open(self.path, "rb") as f:
+                f.seek(self._end)
+                self._end = self._read_records(f, end_ok=True)
+
+    def _append(self, op: dict):
+        # Call with the lock held, after _sync: the record goes at the end read so far,
+        # cutting off any torn record after it
+        record = self._seal(op)
+        with open(self.path, "r+b") as f:
+            if os.fstat(f.fileno()).st_size > self._end:
+                f.truncate(self._end)
+            f.seek(self._end)
+            f.write(record)
+            f.flush()
+            if DURABLE_WRITES:
+                os.fsync(f.fileno())
+            self._end = f.tell()
+        self._apply(op)
+        if self.records > max(TODO_COMPACT_MIN_RECORDS, len(self.todos)):
+            self.compact()
+
+    def _rewrite(self, todos, keep_key: bool = False):
+        # New file holding one snapshot record; todos without an id get fresh ones
+        params = current_params()
+        if keep_key and self._header and unpack_params(self._header[len(TODO_MAGIC):]) == params:
+            header = self._header
+        else:
+            header = TODO_MAGIC + pack_params(params) + os.urandom(16)
+        self._use_header(header)
+        next_id = self.next_id
+        snapshot = []
+        for todo in todos:
+            if "id" not in todo:
+                todo = dict(todo, id=next_id)
+            next_id = max(next_id, todo["id"] + 1)
+            snapshot.append(_normalize(todo))
+        op = {"op": "snapshot", "todos": snapshot, "next_id": next_id}
+        data = header + self._seal(op)
+        write_atomic(self.path, data)
+        self._apply(op)
+        self._end = len(data)
+        self._ino = os.stat(self.path).st_ino
@@ -0,0 +1,321 @@
+# src/vault.py
+
+# Envelope encryption for ShadowNotes: one KDF run per unlock.
+#
+# The master password derives a key-encryption key (KEK) that unwraps a random
+# vault key stored in NOTES_DIR/.vault. Every note gets its own random data key
+# (DEK), wrapped by the vault key and stored in the note header:
+#
+#   .vault:  VAULT_MAGIC + KDF params(13) + salt(16) + nonce(12) + wrapped vault key(48)
+#   note:    NOTE_MAGIC + wrap nonce(12) + wrapped DEK(48) + nonce(12) + ciphertext
+#   or:      COMPRESSED_NOTE_MAGIC + codec(1) + wrap nonce(12) + wrapped DEK(48) + nonce(12) + ciphertext
+#
+# Plaintexts are compressed before sealing when it pays off (see compress.py).
+# Vault notes of CHUNK_THRESHOLD bytes or more are stored as deduplicated
+# chunks plus a manifest note instead (see chunks.py).
+# Notes in the old "salt + nonce + ciphertext" format are still readable with
+# their own password and can be migrated with migrate_note / migrate_notes.
+# Vault files from before the KDF header (LEGACY_VAULT_MAGIC) still unlock.
+
+import hashlib
+import hmac
+import io
+import os
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+import compress
+import metrics
+import storage
+from chunks import ChunkStore, is_manifest
+from config import CHUNK_THRESHOLD
+from durable import write_atomic
+from encryption import (TAG_SIZE, batch_map, decrypt_data, decrypt_many, encrypt_data_parts, encrypt_many,
+                        get_key, token_kdf)
+from kdf import LEGACY_PARAMS, PARAMS_SIZE, current_params, pack_params, unpack_params
+from scan import default_workers
+from stream import decrypt_stream, is_stream, stream_uses_vault
+
+VAULT_FILE = ".vault"
+LEGACY_VAULT_MAGIC = b"SNV\x01"
+VAULT_MAGIC = b"SNV\x02"
+NOTE_MAGIC = b"SNE\x01"
+COMPRESSED_NOTE_MAGIC = b"SNE\x02"
+WRAPPED_KEY_SIZE = 32 + 16  # 256-bit key + GCM tag
+NOTE_HEADER_SIZE = len(NOTE_MAGIC) + 12 + WRAPPED_KEY_SIZE
+
+def vault_path() -> str:
+    return os.path.join(storage.NOTES_DIR, VAULT_FILE)
+
+def is_envelope(token: bytes) -> bool:
+    return token[:len(NOTE_MAGIC)] in (NOTE_MAGIC, COMPRESSED_NOTE_MAGIC)
+
+def _note_magic(codec: int) -> bytes:
+    return NOTE_MAGIC if codec == compress.NONE else COMPRESSED_NOTE_MAGIC + bytes([codec])
+
+def needs_password(token: bytes) -> bool:
+    # True for notes sealed with their own password rather than the vault key
+    return not (is_envelope(token) or stream_uses_vault(token) or is_manifest(token))
+
+class Vault:
+    def __init__(self, vault_key: bytes):
+        self._key = vault_key
+        self._aesgcm = None
+
+    @classmethod
+    def create(cls, password: str, path: str = None) -> "Vault":
+        path = path or vault_path()
+        vault_key = AESGCM.generate_key(bit_length=256)
+        salt = os.urandom(16)
+        nonce = os.urandom(12)
+        params = current_params()
+        associated = VAULT_MAGIC + pack_params(params) + salt
+        wrapped = AESGCM(get_key(password, salt, params)).encrypt(nonce, vault_key, associated)
+        # Durable before any note is sealed with the key it wraps
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, associated + nonce + wrapped)
+        return cls(vault_key)
+
+    @classmethod
+    def unlock(cls, password: str, path: str = None) -> "Vault":
+        path = path or vault_path()
+        with open(path, "rb") as f:
+            blob = f.read()
+        if blob[:len(VAULT_MAGIC)] == VAULT_MAGIC:
+            params = unpack_params(blob[len(VAULT_MAGIC):])
+            offset = len(VAULT_MAGIC) + PARAMS_SIZE
+            associated = blob[:offset + 16]
+        elif blob[:len(LEGACY_VAULT_MAGIC)] == LEGACY_VAULT_MAGIC:
+            params = LEGACY_PARAMS
+            offset = len(LEGACY_VAULT_MAGIC)
+            associated = LEGACY_VAULT_MAGIC
+        else:
+            raise ValueError("Not a ShadowNotes vault file")
+        salt = blob[offset:offset + 16]
+        nonce = blob[offset + 16:offset + 28]
+        wrapped = blob[offset + 28:]
+        try:
+            vault_key = AESGCM(get_key(password, salt, params)).decrypt(nonce, wrapped, associated)
+        except Exception as e:
+            raise ValueError("Incorrect master password or corrupted vault") from e
+        return cls(vault_key)
+
+    @classmethod
+    def open(cls, password: str, path: str = None) -> "Vault":
+        # Unlock the existing vault, or create one on first use
+        path = path or vault_path()
+        if os.path.exists(path):
+            return cls.unlock(password, path)
+        return cls.create(password, path)
+
+    @property
+    def locked(self) -> bool:
+        return self._key is None
+
+    def lock(self):
+        self._key = None
+        self._aesgcm = None
+
+    def _cipher(self) -> AESGCM:
+        # One AESGCM context for the vault key, reused for every wrap/unwrap
+        if self._key is None:
+            raise ValueError("Vault is locked")
+        if self._aesgcm is None:
+            self._aesgcm = AESGCM(self._key)
+        return self._aesgcm
+
+    def derive_key(self, label: bytes) -> bytes:
+        # A 256-bit subkey of the vault key for one purpose (e.g. chunk ids)
+        return hmac.new(self._cipher_key(), b"ShadowNotes " + label, hashlib.sha256).digest()
+
+    def _cipher_key(self) -> bytes:
+        if self._key is None:
+            raise ValueError("Vault is locked")
+        return self._key
+
+    def wrap_key(self, data_key: bytes) -> bytes:
+        # wrap nonce(12) + wrapped data key(48)
+        wrap_nonce = os.urandom(12)
+        return wrap_nonce + self._cipher().encrypt(wrap_nonce, data_key, NOTE_MAGIC)
+
+    def unwrap_key(self, blob: bytes) -> bytes:
+        try:
+            return self._cipher().decrypt(blob[:12], blob[12:], NOTE_MAGIC)
+        except ValueError:
+            raise
+        except Exception as e:
+            raise ValueError("Incorrect vault key or corrupted data") from e
+
+    @metrics.instrument("vault.encrypt", metrics.arg_size(1))
+    def encrypt_parts(self, data: bytes):
+        # (header + nonce, ciphertext), for writev-style writes without concatenation
+        codec, data = compress.compress(data)
+        dek = AESGCM.generate_key(bit_length=256)
+        header = _note_magic(codec) + self.wrap_key(dek)
+        nonce = os.urandom(12)
+        return header + nonce, AESGCM(dek).encrypt(nonce, data, header)
+
+    def encrypt(self, data: bytes) -> bytes:
+        header, ciphertext = self.encrypt_parts(data)
+        return header + ciphertext
+
+    @metrics.instrument("vault.decrypt", metrics.result_size)
+    def decrypt(self, token: bytes) -> bytes:
+        if not is_envelope(token):
+            raise ValueError("Not a vault-format note")
+        # memoryview slices keep a large (possibly mmap-backed) token from being copied
+        view = memoryview(token)
+        codec = view[len(NOTE_MAGIC)] if view[:len(NOTE_MAGIC)] == COMPRESSED_NOTE_MAGIC else compress.NONE
+        start = len(_note_magic(codec))
+        size = NOTE_HEADER_SIZE + start - len(NOTE_MAGIC)
+        dek = self.unwrap_key(view[start:size])
+        nonce = view[size:size + 12]
+        ciphertext = view[size + 12:]
+        try:
+            plaintext = AESGCM(dek).decrypt(nonce, ciphertext, view[:size])
+        except Exception as e:
+            raise ValueError("Incorrect vault key or corrupted data") from e
+        return compress.decompress(codec, plaintext)
+
+    def encrypt_many(self, payloads, workers: int = None) -> list:
+        # Batch encrypt: every note still gets its own data key, sealed in place in
+        # its own output buffer; the vault key context is shared
+        @metrics.instrument("vault.encrypt", metrics.arg_size(0))
+        def seal(data):
+            codec, data = compress.compress(data)
+            dek = AESGCM.generate_key(bit_length=256)
+            header = _note_magic(codec) + self.wrap_key(dek)
+            nonce = os.urandom(12)
+            size = len(header) + 12
+            out = bytearray(size + len(data) + TAG_SIZE)
+            out[:size] = header + nonce
+            AESGCM(dek).encrypt_into(nonce, data, header, memoryview(out)[size:])
+            return out
+
+        return batch_map(seal, list(payloads), workers)
+
+    def decrypt_many(self, tokens, workers: int = None) -> list:
+        # Batch decrypt: plaintexts in input order, None for tokens that do not open
+        def open_one(token):
+            try:
+                return self.decrypt(token)
+            except ValueError:
+                return None
+
+        return batch_map(open_one, list(tokens), workers)
+
+def encrypt_note_parts(data: bytes, password: str = None, vault: Vault = None, previous: bytes = None):
+    # A note password selects the old per-note format; otherwise the vault wraps the note.
+    # Pass the previous blob when re-encrypting so an old-format note keeps its salt.
+    # Returns (header, ciphertext) for storage.write_note_parts.
+    if password:
+        salt, params = None, current_params()
+        if previous is not None and not (is_envelope(previous) or is_stream(previous)):
+            # Keep the salt (and the cached key) unless the configured KDF has changed
+            previous_salt, previous_params = token_kdf(previous)
+            if previous_params == params:
+                salt = previous_salt
+        return encrypt_data_parts(data, password, salt, params)
+    if vault is None:
+        raise ValueError("Vault is locked; a note password is required")
+    if len(data) >= CHUNK_THRESHOLD:
+        return ChunkStore(vault).seal_parts(data)
+    return vault.encrypt_parts(data)
+
+def encrypt_note(data: bytes, password: str = None, vault: Vault = None, previous: bytes = None) -> bytes:
+    header, ciphertext = encrypt_note_parts(data, password, vault, previous)
+    return header + ciphertext
+
+def encrypt_notes(payloads, password: str = None, vault: Vault = None, workers: int = None) -> list:
+    # Batch encrypt_note: one KDF run for the whole batch with a password, the shared
+    # vault context otherwise
+    if password:
+        return encrypt_many(payloads, password, workers=workers)
+    if vault is None:
+        raise ValueError("Vault is locked; a note password is required")
+    payloads = list(payloads)
+    large = [i for i, data in enumerate(payloads) if len(data) >= CHUNK_THRESHOLD]
+    if not large:
+        return vault.encrypt_many(payloads, workers)
+    store = ChunkStore(vault)
+    chunked = {i: store.seal(payloads[i]) for i in large}
+    sealed = iter(vault.encrypt_many([data for i, data in enumerate(payloads) if i not in chunked], workers))
+    return [chunked[i] if i in chunked else next(sealed) for i in range(len(payloads))]
+
+def decrypt_notes(tokens, password: str = None, vault: Vault = None, workers: int = None) -> list:
+    # Batch decrypt_note over mixed formats: plaintexts in input order, None for notes
+    # that do not open with the given password / vault
+    tokens = list(tokens)
+    results = [None] * len(tokens)
+    envelopes = [i for i, token in enumerate(tokens) if is_envelope(token)]
+    others = [i for i, token in enumerate(tokens) if is_stream(token) or is_manifest(token)]
+    protected = [i for i, token in enumerate(tokens) if not (is_envelope(token) or is_stream(token) or is_manifest(token))]
+    if vault is not None and envelopes:
+        for i, plaintext in zip(envelopes, vault.decrypt_many([tokens[i] for i in envelopes], workers)):
+            results[i] = plaintext
+    if password is not None and protected:
+        for i, plaintext in zip(protected, decrypt_many([tokens[i] for i in protected], password, workers)):
+            results[i] = plaintext
+    for i in others:
+        try:
+            results[i] = decrypt_note(tokens[i], password, vault)
+        except ValueError:
+            pass
+    return results
+
+def decrypt_note(token: bytes, password: str = None, vault: Vault = None) -> bytes:
+    if is_stream(token):
+        # Streamed notes can be read whole too; use stream.load_note_stream for large ones
+        out = io.BytesIO()
+        decrypt_stream(io.BytesIO(token), out, password, vault)
+        return out.getvalue()
+    if is_manifest(token):
+        if vault is None:
+            raise ValueError("Vault is locked")
+        return ChunkStore(vault).open(token)
+    if is_envelope(token):
+        if vault is None:
+            raise ValueError("Vault is locked")
+        return vault.decrypt(token)
+    if password is None:
+        raise ValueError("A note password is required for this note")
+    return decrypt_data(token, password)
+
+def decrypt_text(token: bytes, password: str = None, vault: Vault = None) -> bytes:
+    # decrypt_note for scans over note text (search, reindex): a streamed attachment
+    # has no text to search and comes back empty, without being decrypted
+    if is_stream(token):
+        return b""
+    return decrypt_note(token, password, vault)
+
+def migrate_note(vault: Vault, filename: str, password: str) -> bool:
+    # Re-encrypt one old-format note under the vault; returns False if already migrated
+    token = storage.load_note_view(filename)
+    if is_envelope(token) or is_stream(token) or is_manifest(token):
+        return False
+    plaintext = decrypt_data(token, password)
+    token.release()
+    storage.write_note_parts(filename, vault.encrypt_parts(plaintext))
+    return True
+
+def migrate_notes(vault: Vault, password: str, workers: int = None, batch_size: int = 500):
+    # Migrate every old-format note the password opens; returns (migrated, failed) filenames.
+    # Notes go through in batches: one decrypt_many (one key per distinct salt, derived in
+    # parallel), one Vault.encrypt_many and one storage.save_notes call per batch.
+    workers = workers or default_workers()
+    names = storage.list_notes()
+    migrated, failed = [], []
+    for start in range(0, len(names), batch_size):
+        batch = []
+        for filename in names[start:start + batch_size]:
+            try:
+                token = storage.load_note(filename)
+            except OSError:
+                failed.append(filename)
+                continue
+            if not (is_envelope(token) or is_stream(token) or is_manifest(token)):
+                batch.append((filename, token))
+        plaintexts = decrypt_many([token for _, token in batch], password, workers)
+        opened = [(filename, plaintext) for (filename, _), plaintext in zip(batch, plaintexts) if plaintext is not None]
+        failed.extend(filename for (filename, _), plaintext in zip(batch, plaintexts) if plaintext is None)
+        sealed = vault.encrypt_many([plaintext for _, plaintext in opened], workers)
+        migrated.extend(storage.save_notes(zip(sealed, [filename for filename, _ in opened])))
+    return sorted(migrated), sorted(failed)
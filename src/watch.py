@@ -0,0 +1,210 @@
+# src/watch.py
+
+# Change detection for the notes store.
+#
+# A ChangeWatcher keeps a snapshot of filename -> signature (mtime, size, inode
+# for the file backend) and reports what was added, modified or deleted since
+# the last poll(), e.g. by the CLI while a GUI is open. On Linux with the file
+# backend, inotify says which names to re-stat, so a poll costs nothing while
+# the vault is idle. Everywhere else a poll first compares a cheap change token
+# (the directory's or container's mtime) and only rescans when it moved.
+#
+# Like git's index, a token is not trusted while it is within RACY_SECONDS of
+# the snapshot that recorded it: a second change in the same timestamp tick
+# would leave it unchanged.
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+import storage
+from config import WATCH_INOTIFY
+from catalog import attachment_digest
+from index import parse_note
+from chunks import is_manifest
+from stream import STREAM_MAGIC, is_stream, stream_uses_vault
+from vault import decrypt_notes, is_envelope, needs_password
+
+ADDED = "added"
+MODIFIED = "modified"
+DELETED = "deleted"
+
+Change = namedtuple("Change", ["kind", "filename"])
+
+RACY_SECONDS = 2
+BATCH_SIZE = 500
+
+def diff_snapshots(old: dict, new: dict) -> list:
+    changes = [Change(DELETED, f) for f in old.keys() - new.keys()]
+    for f, signature in new.items():
+        previous = old.get(f)
+        if previous is None:
+            changes.append(Change(ADDED, f))
+        elif previous != signature:
+            changes.append(Change(MODIFIED, f))
+    return sorted(changes, key=lambda change: change.filename)
+
+class _Inotify:
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_CLOSE_WRITE = 0x8
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = 0o2000000
+    EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+    @classmethod
+    def open(cls, path: str):
+        # None where inotify is unavailable (not Linux, no libc, watch limit reached)
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            return cls(path)
+        except (OSError, AttributeError):
+            return None
+
+    def __init__(self, path: str):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), self.WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch failed")
+
+    def read(self):
+        # (names touched since the last read, True if events were lost)
+        names, lost = set(), False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names, lost
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self.EVENT.unpack_from(data, offset)
+                offset += self.EVENT.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+                offset += length
+                if mask & (self.IN_Q_OVERFLOW | self.IN_DELETE_SELF | self.IN_MOVE_SELF):
+                    lost = True
+                elif name:
+                    names.add(name)
+
+    def close(self):
+        os.close(self.fd)
+
+class ChangeWatcher:
+    def __init__(self, use_inotify: bool = WATCH_INOTIFY):
+        # Watch before the first scan so nothing slips in between
+        self._inotify = None
+        if use_inotify and isinstance(storage.get_backend(), storage.FileBackend):
+            self._inotify = _Inotify.open(storage.NOTES_DIR)
+        self._rescan()
+
+    def _rescan(self) -> list:
+        old = getattr(self, "snapshot", {})
+        token = storage.notes_change_token()
+        self._token_settled = token is not None and time.time_ns() - token > RACY_SECONDS * 10 ** 9
+        self._token = token
+        self.snapshot = storage.snapshot_notes()
+        return diff_snapshots(old, self.snapshot)
+
+    def poll(self) -> list:
+        # Changes since the last poll, as Change(kind, filename) sorted by filename
+        if self._inotify:
+            names, lost = self._inotify.read()
+            if not lost:
+                return self._restat(name for name in names if not name.startswith("."))
+        elif self._token_settled and storage.notes_change_token() == self._token:
+            return []
+        return self._rescan()
+
+    def _restat(self, names) -> list:
+        changes = []
+        for name in sorted(names):
+            signature = storage.note_signature(name)
+            previous = self.snapshot.get(name)
+            if signature == previous:
+                continue
+            if signature is None:
+                del self.snapshot[name]
+                changes.append(Change(DELETED, name))
+            else:
+                self.snapshot[name] = signature
+                changes.append(Change(ADDED if previous is None else MODIFIED, name))
+        return changes
+
+    def acknowledge(self, filename: str):
+        # Record a change this process made itself so poll() does not report it
+        signature = storage.note_signature(filename)
+        if signature is None:
+            self.snapshot.pop(filename, None)
+        else:
+            self.snapshot[filename] = signature
+
+    def close(self):
+        if self._inotify:
+            self._inotify.close()
+            self._inotify = None
+
+def update_indexes(changes, vault, note_index=None, catalog=None):
+    # Bring the search index and catalog in step with changes made elsewhere.
+    # Vault notes are re-read in batches; notes with their own password are never
+    # indexed or catalogued, so any entry such a note still has is dropped.
+    # Attachments are told apart by their header and never loaded whole.
+    deleted = [c.filename for c in changes if c.kind == DELETED]
+    changed = [c.filename for c in changes if c.kind != DELETED]
+    attachments = []
+    if vault is None or not (note_index or catalog):
+        changed = []  # nothing to re-read (deletions need no vault key)
+    for start in range(0, len(changed), BATCH_SIZE):
+        batch = []
+        for filename in changed[start:start + BATCH_SIZE]:
+            try:
+                head = storage.read_note_head(filename, len(STREAM_MAGIC) + 1)
+                if is_stream(head):
+                    (attachments if stream_uses_vault(head) else deleted).append(filename)
+                    continue
+                token = storage.load_note(filename)
+            except FileNotFoundError:
+                continue  # deleted again since the poll
+            if is_envelope(token) or is_manifest(token):
+                batch.append((filename, token))
+            elif needs_password(token):
+                deleted.append(filename)
+        plaintexts = decrypt_notes([token for _, token in batch], None, vault)
+        rows = [(filename, plaintext, parse_note(plaintext), token)
+                for (filename, token), plaintext in zip(batch, plaintexts) if plaintext is not None]
+        if not rows:
+            continue
+        if note_index:
+            note_index.update_many([(filename, note_obj, token) for filename, _, note_obj, token in rows])
+        if catalog:
+            catalog.record_many(rows)
+    if attachments:
+        if note_index:
+            note_index.add_attachments(attachments)
+        if catalog:
+            rows = []
+            for filename in attachments:
+                try:
+                    rows.append((filename, attachment_digest(filename, vault)))
+                except (FileNotFoundError, ValueError):
+                    pass  # deleted or rewritten since the poll; the next poll sees it
+            catalog.record_attachments(rows)
+    if note_index:
+        note_index.remove_many(deleted)
+    if catalog:
+        catalog.remove_many(deleted)
@@ -0,0 +1,240 @@
+# src/widgets.py
+
+# Small Tk widgets shared by the GUI front-ends (gui.py and merged.py).
+
+import tkinter as tk
+from tkinter import font, messagebox, simpledialog, ttk
+from todos import TodoView, format_todo, week_ahead
+
+class ProgressWindow(tk.Toplevel):
+    # Modeless progress dialog for a background task (see tasks.py). Indeterminate
+    # until the task reports a total; Cancel asks the task to stop.
+    def __init__(self, parent, title: str, task=None, message: str = "Working..."):
+        super().__init__(parent)
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(parent)
+        self.task = task
+        self.label = tk.Label(self, text=message, width=40, anchor="w")
+        self.label.pack(padx=10, pady=(10, 5))
+        self.bar = ttk.Progressbar(self, length=300, mode="indeterminate")
+        self.bar.pack(padx=10, pady=5)
+        self.bar.start(15)
+        self.cancel_button = tk.Button(self, text="Cancel", command=self.cancel,
+                                       state=tk.NORMAL if task else tk.DISABLED)
+        self.cancel_button.pack(pady=(5, 10))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def update_progress(self, done: int, total: int = None, message: str = None):
+        if total:
+            if self.bar["mode"] != "determinate":
+                self.bar.stop()
+                self.bar.configure(mode="determinate", maximum=total)
+            self.bar["value"] = done
+        if message:
+            self.label.configure(text=message)
+        elif total:
+            self.label.configure(text=f"{done} of {total}")
+
+    def cancel(self):
+        if self.task:
+            self.task.cancel()
+            self.label.configure(text="Cancelling...")
+            self.cancel_button.configure(state=tk.DISABLED)
+
+    def close(self):
+        self.bar.stop()
+        self.destroy()
+
+class VirtualList(tk.Frame):
+    # Scrollable list over a notelist.NoteList that only ever holds the rows on
+    # screen, so drawing and scrolling cost the same for 100 or 100k notes.
+    # Call refresh() after changing the model.
+    def __init__(self, parent, model, width: int = 40, on_activate=None):
+        super().__init__(parent)
+        self.model = model
+        self.on_activate = on_activate
+        self.top = 0           # model position of the first visible row
+        self.visible = 1       # rows that fit in the listbox
+        self.selected = None   # selected filename, kept while scrolled out of view
+        self.listbox = tk.Listbox(self, width=width, exportselection=False, activestyle="none")
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<Configure>", self.on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self.on_select)
+        self.listbox.bind("<MouseWheel>", lambda e: self.scroll(-1 if e.delta > 0 else 1, 3))
+        self.listbox.bind("<Button-4>", lambda e: self.scroll(-1, 3))
+        self.listbox.bind("<Button-5>", lambda e: self.scroll(1, 3))
+        self.listbox.bind("<Up>", lambda e: self.move(-1))
+        self.listbox.bind("<Down>", lambda e: self.move(1))
+        self.listbox.bind("<Prior>", lambda e: self.move(-self.visible))
+        self.listbox.bind("<Next>", lambda e: self.move(self.visible))
+        if on_activate:
+            self.listbox.bind("<Double-Button-1>", lambda e: on_activate())
+            self.listbox.bind("<Return>", lambda e: on_activate())
+
+    def refresh(self):
+        total = len(self.model)
+        self.top = max(0, min(self.top, total - self.visible))
+        self.listbox.delete(0, tk.END)
+        end = min(total, self.top + self.visible)
+        self.listbox.insert(tk.END, *[self.model.label(i) for i in range(self.top, end)])
+        position = self.model.position(self.selected) if self.selected else None
+        if position is not None and self.top <= position < end:
+            self.listbox.selection_set(position - self.top)
+            self.listbox.activate(position - self.top)
+        self.scrollbar.set(*(self.top / total, end / total) if total else (0.0, 1.0))
+
+    def on_resize(self, event):
+        listbox = self.listbox
+        line = font.Font(font=listbox.cget("font")).metrics("linespace") + 2 * int(listbox.cget("selectborderwidth"))
+        border = 2 * (int(listbox.cget("borderwidth")) + int(listbox.cget("highlightthickness")))
+        visible = max(1, (event.height - border) // max(line, 1))
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def on_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.model.filename(self.top + selection[0])
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.top = int(float(args[1]) * len(self.model))
+            self.refresh()
+        elif args[0] == "scroll":
+            self.scroll(int(args[1]), self.visible if args[2] == "pages" else 1)
+
+    def scroll(self, direction: int, rows: int):
+        self.top += direction * rows
+        self.refresh()
+        return "break"
+
+    def move(self, step: int):
+        # Keyboard navigation that scrolls the window along with the selection
+        total = len(self.model)
+        if not total:
+            return "break"
+        position = self.model.position(self.selected) if self.selected else None
+        position = 0 if position is None else max(0, min(position + step, total - 1))
+        self.selected = self.model.filename(position)
+        if position < self.top:
+            self.top = position
+        elif position >= self.top + self.visible:
+            self.top = position - self.visible + 1
+        self.refresh()
+        return "break"
+
+    def selection(self):
+        # Selected filename, or None if nothing is selected or it is filtered out
+        if self.selected is not None and self.model.position(self.selected) is not None:
+            return self.selected
+        return None
+
+    def show(self, filename: str):
+        # Select filename and scroll it into view
+        position = self.model.position(filename)
+        if position is None:
+            return
+        self.selected = filename
+        if not self.top <= position < self.top + self.visible:
+            self.top = max(0, position - self.visible // 2)
+        self.refresh()
+
+class TodoWindow(tk.Toplevel):
+    # Todo list over a todos.TodoJournal. Changes go through run(work, on_done),
+    # e.g. a GUI's background task runner, and only the changed row is redrawn.
+    FILTERS = {
+        "All": lambda: (None, None),
+        "Pending": lambda: ("pending", None),
+        "Due this week": lambda: ("pending", week_ahead()),
+    }
+
+    def __init__(self, parent, journal, run=None):
+        super().__init__(parent)
+        self.title("Todo List")
+        self.geometry("500x300")
+        self.journal = journal
+        self.run = run or self.run_now
+        self.filter_var = tk.StringVar(value="All")
+        tk.OptionMenu(self, self.filter_var, *self.FILTERS, command=lambda _: self.render()).pack(anchor="w", padx=5, pady=5)
+        self.listbox = tk.Listbox(self)
+        self.listbox.pack(fill=tk.BOTH, expand=True)
+        for text, command in (("Add Task", self.add_task), ("Mark Done", self.mark_done), ("Priority", self.set_priority),
+                              ("Due Date", self.set_due), ("Delete Task", self.delete_task)):
+            tk.Button(self, text=text, command=command).pack(side=tk.LEFT, padx=5, pady=5)
+        self.render()
+
+    def run_now(self, work, on_done):
+        try:
+            result = work(None)
+        except (ValueError, KeyError) as e:
+            messagebox.showerror("Error", str(e), parent=self)
+            return
+        on_done(result)
+
+    def render(self):
+        status, due_to = self.FILTERS[self.filter_var.get()]()
+        self.view = TodoView(self.journal, status, due_to)
+        self.listbox.delete(0, tk.END)
+        rows = [format_todo(self.journal.get(self.view.todo_id(i))) for i in range(len(self.view))]
+        self.listbox.insert(tk.END, *rows)
+
+    def show_change(self, todo_id: int, todo=None):
+        # Move one row: O(log n) to find it, and the listbox only redraws that row
+        old, new = self.view.changed(todo_id, todo)
+        if old is not None:
+            self.listbox.delete(old)
+        if new is not None:
+            self.listbox.insert(new, format_todo(todo))
+            self.listbox.selection_set(new)
+
+    def selected_id(self):
+        selection = self.listbox.curselection()
+        return self.view.todo_id(selection[0]) if selection else None
+
+    def add_task(self):
+        task = simpledialog.askstring("New Task", "Enter new todo task:", parent=self)
+        if not task:
+            return
+        priority = simpledialog.askstring("Priority", "Priority (high, normal, low):", initialvalue="normal", parent=self)
+        if priority is None:
+            return
+        due = simpledialog.askstring("Due Date", "Due date (YYYY-MM-DD, optional):", parent=self)
+        if due is None:
+            return
+        work = lambda _: self.journal.add(task, priority.strip() or "normal", due.strip() or None)
+        self.run(work, lambda todo: self.show_change(todo["id"], todo))
+
+    def mark_done(self):
+        todo_id = self.selected_id()
+        if todo_id is not None:
+            self.run(lambda _: self.journal.set_done(todo_id), lambda todo: self.show_change(todo_id, todo))
+
+    def set_priority(self):
+        todo_id = self.selected_id()
+        if todo_id is None:
+            return
+        priority = simpledialog.askstring("Priority", "Priority (high, normal, low):",
+                                          initialvalue=self.journal.get(todo_id)["priority"], parent=self)
+        if priority:
+            work = lambda _: self.journal.update(todo_id, priority=priority.strip())
+            self.run(work, lambda todo: self.show_change(todo_id, todo))
+
+    def set_due(self):
+        todo_id = self.selected_id()
+        if todo_id is None:
+            return
+        due = simpledialog.askstring("Due Date", "Due date (YYYY-MM-DD, blank to clear):",
+                                     initialvalue=self.journal.get(todo_id)["due"] or "", parent=self)
+        if due is not None:
+            work = lambda _: self.journal.update(todo_id, due=due.strip() or None)
+            self.run(work, lambda todo: self.show_change(todo_id, todo))
+
+    def delete_task(self):
+        todo_id = self.selected_id()
+        if todo_id is not None:
+            self.run(lambda _: self.journal.delete(todo_id), lambda _: self.show_change(todo_id))
@@ -0,0 +1,66 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from bulk import import_notes, export_notes
+from stream import STREAM_MAGIC
+from vault import Vault, decrypt_note, encrypt_note
+
+class TestBulk(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = os.path.join(self.tmp.name, "notes")
+        os.makedirs(storage.NOTES_DIR)
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_import_then_export(self):
+        vault = Vault.open("master")
+        source = os.path.join(self.tmp.name, "in")
+        os.makedirs(source)
+        for i in range(5):
+            with open(os.path.join(source, f"n{i}.txt"), "w", encoding="utf-8") as f:
+                f.write(f"text {i}")
+        storage.save_note(encrypt_note(b'{"content": "mine"}', vault=vault), "n0")
+        imported, skipped = import_notes(source, vault=vault, workers=2, batch_size=2)
+        self.assertEqual(sorted(row[0] for row in imported), ["n1.enc", "n2.enc", "n3.enc", "n4.enc"])
+        self.assertEqual(skipped, ["n0.txt"])
+        self.assertIn(b"text 2", decrypt_note(storage.load_note("n2.enc"), vault=vault))
+        storage.save_note(encrypt_note(b"secret", "pw"), "protected")
+        target = os.path.join(self.tmp.name, "out")
+        exported, failed = export_notes(target, vault=vault, workers=2, batch_size=2)
+        self.assertEqual(failed, ["protected.enc"])
+        self.assertEqual(len(exported), 5)
+        with open(os.path.join(target, "n3.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "text 3")
+        with open(os.path.join(target, "n0.txt"), encoding="utf-8") as f:
+            self.assertEqual(f.read(), "mine")
+
+    def test_export_skips_attachments_on_their_header(self):
+        vault = Vault.open("master")
+        old_backend = storage.STORAGE_BACKEND
+        try:
+            for name in ("files", "container", "sqlite"):
+                storage.STORAGE_BACKEND = name
+                storage.save_note(encrypt_note(b'{"content": "kept"}', vault=vault), "note")
+                storage.save_note(STREAM_MAGIC + bytes(1024 * 1024), "attachment")
+                backend = storage.get_backend()
+                with mock.patch.object(backend, "read", wraps=backend.read) as read:
+                    exported, failed = export_notes(os.path.join(self.tmp.name, name), vault=vault)
+                self.assertEqual((exported, failed), (["note.enc"], []))
+                self.assertNotIn(mock.call("attachment.enc"), read.call_args_list)
+        finally:
+            storage.STORAGE_BACKEND = old_backend
+
+if __name__ == "__main__":
+    unittest.main()
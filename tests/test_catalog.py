@@ -0,0 +1,73 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import json
+import storage
+from vault import Vault, encrypt_note
+from catalog import Catalog
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.vault = Vault.open("master")
+
+    def tearDown(self):
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def add(self, catalog, name, content, tags=()):
+        note_obj = {"content": content, "tags": list(tags)}
+        plaintext = json.dumps(note_obj).encode()
+        encrypted = self.vault.encrypt(plaintext)
+        filename = storage.save_note(encrypted, name)
+        catalog.record(filename, plaintext, note_obj, encrypted)
+        return filename
+
+    def test_record_listing_and_remove(self):
+        catalog = Catalog.load(self.vault)
+        self.add(catalog, "b", "Short\nsecond line", ["x"])
+        self.add(catalog, "a", "A much longer first note")
+        storage.save_note(self.vault.encrypt(b"raw"), "c")
+        reloaded = Catalog.load(self.vault)
+        self.assertEqual(reloaded.entries["b.enc"]["title"], "Short")
+        self.assertEqual(reloaded.entries["b.enc"]["tags"], ["x"])
+        rows = reloaded.listing(storage.list_notes(), "size", reverse=True)
+        self.assertEqual([f for f, _ in rows], ["a.enc", "b.enc", "c.enc"])
+        self.assertIsNone(rows[-1][1])
+        reloaded.remove("a.enc")
+        self.assertNotIn("a.enc", Catalog.load(self.vault).entries)
+
+    def test_concurrent_instances_keep_each_others_entries(self):
+        first, second = Catalog.load(self.vault), Catalog.load(self.vault)
+        self.add(first, "a", "first")
+        self.add(second, "b", "second")
+        first.remove("a.enc")
+        self.assertEqual(list(Catalog.load(self.vault).entries), ["b.enc"])
+
+    def test_notes_with_their_own_password_are_not_catalogued(self):
+        catalog = Catalog.load(self.vault)
+        plaintext = b'{"content": "private title", "tags": ["secret"]}'
+        encrypted = encrypt_note(plaintext, "pw")
+        filename = storage.save_note(encrypted, "p")
+        catalog.record(filename, plaintext, json.loads(plaintext), encrypted)
+        self.assertEqual(Catalog.load(self.vault).entries, {})
+        self.assertEqual(catalog.rebuild(), [])
+        self.assertEqual(catalog.listing([filename]), [(filename, None)])
+
+    def test_rebuild_and_bad_sort_key(self):
+        storage.save_note(self.vault.encrypt(b'{"content": "hello", "tags": []}'), "h")
+        catalog = Catalog.load(self.vault)
+        self.assertEqual(catalog.rebuild(), [])
+        self.assertEqual(catalog.entries["h.enc"]["title"], "hello")
+        with self.assertRaises(ValueError):
+            catalog.listing(["h.enc"], "colour")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import json
+import storage
+from chunks import CHUNK_DIR, ChunkStore, chunk_boundaries, is_manifest
+from vault import Vault, decrypt_note, decrypt_notes, encrypt_note, encrypt_notes, needs_password
+
+def make_log(lines: int, seed: int = 0) -> bytes:
+    return b"".join(b"%06d worker-%d handled request %d in %d ms\n" % (i, (i * 7 + seed) % 13, i * 31, i % 97) for i in range(lines))
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.vault = Vault.open("master")
+        self.chunk_dir = os.path.join(self.tmp.name, CHUNK_DIR)
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_boundaries_follow_content(self):
+        data = make_log(20000)
+        cuts = chunk_boundaries(data)
+        self.assertEqual(cuts[-1], len(data))
+        self.assertTrue(all(b - a <= 64 * 1024 for a, b in zip([0] + cuts, cuts)))
+        # An insert near the start only moves the boundaries around it
+        edited = data[:1000] + b"inserted line\n" + data[1000:]
+        shifted = {cut - 14 for cut in chunk_boundaries(edited)}
+        self.assertGreater(len(shifted & set(cuts)), len(cuts) - 3)
+        self.assertEqual(chunk_boundaries(b""), [])
+
+    def test_json_notes_share_chunks_after_an_insert(self):
+        # Notes are stored as JSON, where every line break is escaped
+        text = make_log(20000).decode()
+        for content in (text, text.replace("\n", " ")):
+            chunks = []
+            for edited in (content, content[:1000] + "x" + content[1000:]):
+                data = json.dumps({"content": edited, "tags": []}).encode()
+                self.assertNotIn(b"\n", data)
+                cuts = chunk_boundaries(data)
+                chunks.append({data[a:b] for a, b in zip([0] + cuts, cuts)})
+            self.assertGreater(len(chunks[0]), 20)
+            self.assertGreaterEqual(len(chunks[0] & chunks[1]), len(chunks[0]) - 2)
+
+    def test_copies_and_edits_store_only_new_chunks(self):
+        data = make_log(20000)
+        token = encrypt_note(data, vault=self.vault)
+        self.assertTrue(is_manifest(token))
+        self.assertFalse(needs_password(token))
+        storage.save_note(token, "big")
+        stored = len(os.listdir(self.chunk_dir))
+        self.assertGreater(stored, 10)
+        store = ChunkStore(self.vault)
+        copy = data[:500000] + b"edited\n" + data[500000:]
+        storage.save_note(store.seal(copy), "edited")
+        self.assertLessEqual(store.written, 2)
+        self.assertEqual(len(os.listdir(self.chunk_dir)), stored + store.written)
+        self.assertEqual(decrypt_note(storage.load_note("big.enc"), vault=self.vault), data)
+        self.assertEqual(decrypt_notes([storage.load_note("edited.enc"), token], vault=self.vault), [copy, data])
+        # Another vault neither shares ids nor opens the manifest
+        other = ChunkStore(Vault.create("other", os.path.join(self.tmp.name, ".other")))
+        self.assertNotEqual(other.chunk_id(b"same"), store.chunk_id(b"same"))
+        with self.assertRaises(ValueError):
+            other.open(token)
+        small = encrypt_notes([b"small", data], vault=self.vault)
+        self.assertFalse(is_manifest(small[0]))
+        self.assertTrue(is_manifest(small[1]))
+
+    def test_garbage_collection_keeps_referenced_chunks(self):
+        data = make_log(20000)
+        storage.save_note(encrypt_note(data, vault=self.vault), "keep")
+        storage.save_note(encrypt_note(make_log(20000, seed=5), vault=self.vault), "drop")
+        storage.delete_note("drop.enc")
+        store = ChunkStore(self.vault)
+        self.assertEqual(store.collect_garbage(), 0)  # all still within the grace period
+        removed = store.collect_garbage(grace_seconds=-1)
+        self.assertGreater(removed, 0)
+        self.assertEqual(decrypt_note(storage.load_note("keep.enc"), vault=self.vault), data)
+        self.assertEqual(store.collect_garbage(grace_seconds=-1), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src and benchmarks directories to sys.path to allow importing modules from them
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import replay
+from cmdtrace import TraceRecorder, load_trace
+
+class TestCommandTrace(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "trace.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_records_shape_only(self):
+        recorder = TraceRecorder(self.path)
+        recorder.record("add", note=recorder.note("secret-plans.enc"), size=120, tags=2, vault=True)
+        recorder.record("read", note=recorder.note("older.enc"))
+        recorder.record("edit", note=recorder.note("secret-plans.enc"), size=None, tags=1)
+        recorder.close()
+        with open(self.path, "a") as f:
+            f.write('{"session": "torn", "op": "re')
+        with open(self.path) as f:
+            self.assertNotIn("secret", f.read())
+        sessions = load_trace(self.path)
+        self.assertEqual(list(sessions), [recorder.session])
+        events = sessions[recorder.session]
+        self.assertEqual([(e["op"], e["note"]) for e in events], [("add", 0), ("read", 1), ("edit", 0)])
+        TraceRecorder(None).record("add", size=1)  # disabled: nothing to write to
+
+    def test_replay_reports_every_command(self):
+        recorder = TraceRecorder(self.path)
+        recorder.record("add", note=0, size=300, tags=1, vault=True)
+        recorder.record("add", note=1, size=50, tags=0, vault=False)
+        recorder.record("read", note=1)
+        recorder.record("edit", note=0, size=400, tags=None)
+        recorder.record("read", note=2)
+        recorder.record("search", matches=0, vault=True)
+        recorder.record("history", note=0)
+        recorder.record("todo.add", size=10, priority="high", due=True, todo=5)
+        recorder.record("todo.done", todo=5)
+        recorder.record("delete", note=2)
+        recorder.record("import", count=3, vault=True)
+        recorder.close()
+        report = replay.replay(load_trace(self.path), notes=20, clients=2, loops=2, log=lambda line: None)
+        commands = report["commands"]
+        self.assertEqual(sum(c["errors"] for c in commands.values()), 0)
+        self.assertEqual(commands["add"]["count"], 8)
+        self.assertEqual(commands["read"]["count"], 8)
+        self.assertEqual(report["completed"], 40)
+        self.assertEqual(report["skipped"], 4)
+        self.assertLessEqual(commands["edit"]["p50"], commands["edit"]["p99"])
+
+if __name__ == "__main__":
+    unittest.main()
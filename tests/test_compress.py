@@ -0,0 +1,43 @@
+import unittest
+import json
+import os
+import sys
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import compress
+from encryption import COMPRESSED_MAGIC, PASSWORD_MAGIC, decrypt_data, decrypt_each, encrypt_data, encrypt_many, token_codec
+from vault import COMPRESSED_NOTE_MAGIC, NOTE_MAGIC, Vault
+
+LOG = json.dumps({"content": "\n".join(f"2024-01-01 12:00:{i % 60:02d} INFO request served in {i % 7} ms" for i in range(2000))}).encode()
+
+class TestCompression(unittest.TestCase):
+    def test_codec_recorded_and_round_trips(self):
+        for codec in compress.CODECS:
+            self.assertEqual(compress.decompress(*compress.compress(LOG, codec)), LOG)
+        token = encrypt_data(LOG, "pw")
+        self.assertTrue(token.startswith(COMPRESSED_MAGIC))
+        self.assertEqual(token_codec(token), compress.default_codec())
+        self.assertLess(len(token), len(LOG) / 3)
+        self.assertEqual(decrypt_data(token, "pw"), LOG)
+        vault = Vault(AESGCM.generate_key(bit_length=256))
+        sealed = vault.encrypt(LOG)
+        self.assertTrue(sealed.startswith(COMPRESSED_NOTE_MAGIC))
+        self.assertEqual(vault.decrypt(sealed), LOG)
+        self.assertEqual(vault.decrypt_many(vault.encrypt_many([LOG, b"short"])), [LOG, b"short"])
+
+    def test_small_and_incompressible_payloads_stay_raw(self):
+        noise = os.urandom(200 * 1024)
+        self.assertEqual(compress.compress(noise), (compress.NONE, noise))
+        self.assertEqual(compress.compress(b"{}"), (compress.NONE, b"{}"))
+        self.assertTrue(encrypt_data(noise, "pw").startswith(PASSWORD_MAGIC))
+        self.assertTrue(Vault(AESGCM.generate_key(bit_length=256)).encrypt(b"tiny").startswith(NOTE_MAGIC))
+        tokens = encrypt_many([LOG, noise, b"tiny"], "pw")
+        self.assertEqual({i: bytes(view) for i, view in decrypt_each(tokens, "pw")}, {0: LOG, 1: noise, 2: b"tiny"})
+        with self.assertRaises(ValueError):
+            compress.default_codec("brotli")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import zlib
+import storage
+from container import CONTAINER_MAGIC_V1, RECORD, RECORD_V1, ContainerBackend
+
+class TestContainerBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_put_overwrite_delete_and_reopen(self):
+        backend = ContainerBackend(self.tmp.name)
+        backend.write("a.enc", b"one")
+        backend.write("b.enc", b"two")
+        backend.write("a.enc", b"three")
+        self.assertTrue(backend.delete("b.enc"))
+        self.assertFalse(backend.delete("b.enc"))
+        backend.close()
+        reopened = ContainerBackend(self.tmp.name)
+        self.assertEqual(reopened.list(), ["a.enc"])
+        self.assertEqual(reopened.read("a.enc"), b"three")
+        with self.assertRaises(FileNotFoundError):
+            reopened.read("b.enc")
+        reopened.close()
+
+    def test_compaction_keeps_live_records(self):
+        backend = ContainerBackend(self.tmp.name)
+        for i in range(50):
+            backend.write("n.enc", b"x" * 1000 + bytes([i]))
+        backend.write("keep.enc", b"keep")
+        size_before = os.path.getsize(backend.path)
+        backend.compact()
+        self.assertLess(os.path.getsize(backend.path), size_before)
+        self.assertEqual(backend.dead_ratio(), 0.0)
+        self.assertEqual(backend.read("n.enc"), b"x" * 1000 + bytes([49]))
+        self.assertEqual(backend.read("keep.enc"), b"keep")
+        backend.close()
+
+    def test_torn_tail_is_dropped(self):
+        backend = ContainerBackend(self.tmp.name)
+        backend.write("a.enc", b"intact")
+        backend.close()
+        with open(backend.path, "ab") as f:
+            f.write(b"\x01\x05\x00garbage")
+        reopened = ContainerBackend(self.tmp.name)
+        self.assertEqual(reopened.list(), ["a.enc"])
+        reopened.write("b.enc", b"after")
+        self.assertEqual(reopened.read("b.enc"), b"after")
+        reopened.close()
+
+    def test_concurrent_writers_and_corrupt_records(self):
+        # Two backends on one container stand in for two processes
+        writers = [ContainerBackend(self.tmp.name), ContainerBackend(self.tmp.name)]
+        def fill(backend, prefix):
+            for i in range(100):
+                backend.write(f"{prefix}{i}.enc", prefix.encode() * (i + 1))
+        threads = [threading.Thread(target=fill, args=(backend, prefix)) for backend, prefix in zip(writers, "ab")]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(writers[0].list()), 200)
+        self.assertEqual(writers[1].read("a99.enc"), b"a" * 100)
+        # A damaged record in the middle is skipped; the records after it stay
+        offset = writers[0]._index["a50.enc"][0]
+        for backend in writers:
+            backend.close()
+        with open(writers[0].path, "r+b") as f:
+            f.seek(offset)
+            f.write(b"X")
+        reopened = ContainerBackend(self.tmp.name)
+        names = reopened.list()
+        self.assertNotIn("a50.enc", names)
+        self.assertEqual(len(names), 199)
+        self.assertEqual(reopened.read("b99.enc"), b"b" * 100)
+        reopened.write("c.enc", b"new")
+        self.assertEqual(len(ContainerBackend(self.tmp.name).list()), 200)
+        reopened.close()
+
+    def test_damaged_header_is_reported_not_truncated(self):
+        backend = ContainerBackend(self.tmp.name)
+        for name in ("a.enc", "b.enc", "c.enc"):
+            backend.write(name, name.encode() * 10)
+        offset = backend._index["b.enc"][0] - len("b.enc") - RECORD.size
+        backend.close()
+        with open(backend.path, "r+b") as f:
+            f.seek(offset + 3)  # data length
+            f.write(b"\xff")
+        size = os.path.getsize(backend.path)
+        with self.assertRaises(ValueError):
+            ContainerBackend(self.tmp.name)
+        self.assertEqual(os.path.getsize(backend.path), size)
+
+    def test_first_format_is_upgraded(self):
+        with open(os.path.join(self.tmp.name, ".notes.snc"), "wb") as f:
+            f.write(CONTAINER_MAGIC_V1)
+            for op, name, data in [(1, b"a.enc", b"one"), (1, b"b.enc", b"two"), (2, b"a.enc", b""), (1, b"c.enc", b"three")]:
+                crc = zlib.crc32(data, zlib.crc32(name, op))
+                f.write(RECORD_V1.pack(op, len(name), len(data), crc, 1.0) + name + data)
+        backend = ContainerBackend(self.tmp.name)
+        self.assertEqual(backend.list(), ["b.enc", "c.enc"])
+        self.assertEqual(backend.read("c.enc"), b"three")
+        self.assertEqual(backend.stat("b.enc"), (3, 1.0))
+        backend.close()
+
+    def test_storage_api_on_container(self):
+        storage.get_backend("files").write("old.enc", b"legacy")
+        self.assertEqual(storage.copy_notes("files", "container"), 1)
+        container = storage.get_backend("container")
+        self.assertEqual(container.read("old.enc"), b"legacy")
+        self.assertNotIn(".notes.snc", storage.get_backend("files").list())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import durable
+import storage
+from durable import GroupCommit, write_atomic
+
+class TestGroupCommit(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_batch_shares_one_commit(self):
+        committer = durable.committer(self.tmp.name)
+        before = committer.commits
+        storage.save_notes([(f"note {i}".encode(), f"n{i}") for i in range(200)])
+        self.assertEqual(committer.commits - before, 1)
+        self.assertEqual(storage.load_note("n199.enc"), b"note 199")
+        self.assertEqual([f for f in os.listdir(self.tmp.name) if f.endswith(".tmp")], [])
+
+    def test_concurrent_writers_join_the_running_commit(self):
+        committer = GroupCommit(self.tmp.name)
+        started, release = threading.Event(), threading.Event()
+        flush = committer._flush
+
+        def slow_flush(pairs):
+            started.set()
+            release.wait(5)
+            flush(pairs)
+        committer._flush = slow_flush
+
+        def write(name):
+            path = os.path.join(self.tmp.name, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(name.encode())
+            committer.commit([(path + ".tmp", path)])
+        leader = threading.Thread(target=write, args=("first",))
+        leader.start()
+        started.wait(5)
+        # These queue up behind the running commit and go out together in the next
+        followers = [threading.Thread(target=write, args=(f"f{i}",)) for i in range(8)]
+        for t in followers:
+            t.start()
+        while len(committer._pending) < 8:
+            threading.Event().wait(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+        self.assertEqual(committer.commits, 2)
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), sorted(["first"] + [f"f{i}" for i in range(8)]))
+
+    def test_failed_commit_reaches_every_caller_then_is_forgotten(self):
+        committer = GroupCommit(self.tmp.name)
+        started, release = threading.Event(), threading.Event()
+        flush = committer._flush
+
+        def failing_flush(pairs):
+            if any(path.endswith("bad") for _, path in pairs):
+                raise OSError("disk full")
+            started.set()
+            release.wait(5)
+            flush(pairs)
+        committer._flush = failing_flush
+        errors = []
+
+        def write(name):
+            path = os.path.join(self.tmp.name, name)
+            with open(path + ".tmp", "wb") as f:
+                f.write(name.encode())
+            try:
+                committer.commit([(path + ".tmp", path)])
+            except OSError as e:
+                errors.append(e)
+        leader = threading.Thread(target=write, args=("first",))
+        leader.start()
+        started.wait(5)
+        # These share the next batch, which fails
+        followers = [threading.Thread(target=write, args=(name,)) for name in ("a", "b", "bad")]
+        for t in followers:
+            t.start()
+        while len(committer._pending) < 3:
+            threading.Event().wait(0.001)
+        release.set()
+        for t in [leader] + followers:
+            t.join(5)
+        self.assertEqual(len(errors), 3)
+        self.assertEqual((committer._errors, committer._callers), ({}, {}))
+
+    def test_failed_batch_leaves_nothing_behind(self):
+        storage.write_note("keep.enc", b"old")
+        with self.assertRaises(RuntimeError):
+            def items():
+                yield "keep.enc", b"new"
+                yield "other.enc", b"other"
+                raise RuntimeError("import aborted")
+            storage.get_backend().write_many(items())
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["keep.enc"])
+        self.assertEqual(storage.load_note("keep.enc"), b"old")
+        path = os.path.join(self.tmp.name, ".meta")
+        write_atomic(path, b"meta")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), b"meta")
+
+    def test_open_writers_on_one_note_use_separate_temp_files(self):
+        backend = storage.get_backend()
+        with backend.open_writer("n.enc") as first, backend.open_writer("n.enc") as second:
+            self.assertNotEqual(first.tmp_path, second.tmp_path)
+            first.write(b"first")
+            second.write(b"second")
+        self.assertEqual(storage.load_note("n.enc"), b"first")
+        backend.write_many([("n.enc", b"a"), ("n.enc", b"b")])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ["n.enc"])
+        self.assertEqual(storage.load_note("n.enc"), b"b")
+
+if __name__ == "__main__":
+    unittest.main()
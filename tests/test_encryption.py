@@ -5,7 +5,9 @@ import sys
 # Add the src directory to sys.path to allow importing modules from it
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
 
-from encryption import encrypt_data, decrypt_data
+from encryption import (encrypt_data, encrypt_data_parts, decrypt_data, decrypt_data_into,
+                        encrypt_many, decrypt_many, decrypt_each)
+from keycache import key_cache
 
 class TestEncryption(unittest.TestCase):
     def test_encrypt_decrypt(self):
@@ -23,5 +25,28 @@ class TestEncryption(unittest.TestCase):
         with self.assertRaises(ValueError):
             decrypt_data(encrypted, wrong_password)
 
+    def test_buffer_paths(self):
+        password = "test_password"
+        header, ciphertext = encrypt_data_parts(b"buffered note", password)
+        token = header + ciphertext
+        self.assertEqual(decrypt_data(memoryview(bytearray(token)), password), b"buffered note")
+        out = bytearray(64)
+        self.assertEqual(bytes(decrypt_data_into(token, password, out)), b"buffered note")
+        with self.assertRaises(ValueError):
+            decrypt_data_into(token, password, bytearray(4))
+
+    def test_batch_round_trip_with_one_derivation(self):
+        payloads = [f"note {i}".encode() * (i + 1) for i in range(20)]
+        key_cache.clear()
+        misses = key_cache.misses
+        tokens = encrypt_many(payloads, "batch_password", workers=4)
+        self.assertEqual(key_cache.misses - misses, 1)
+        self.assertEqual(decrypt_data(tokens[3], "batch_password"), payloads[3])
+        mixed = tokens + [encrypt_data(b"other", "batch_password"), b"garbage"]
+        self.assertEqual(decrypt_many(mixed, "batch_password", workers=4), payloads + [b"other", None])
+        self.assertEqual([None] * 20, decrypt_many(tokens, "wrong_password"))
+        opened = {i: bytes(view) for i, view in decrypt_each(mixed, "batch_password")}
+        self.assertEqual(opened, dict(enumerate(payloads + [b"other"])))
+
 if __name__ == "__main__":
     unittest.main()
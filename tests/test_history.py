@@ -0,0 +1,101 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import threading
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from history import KEYFRAME, NoteHistory, apply_delta, delete_history, history_path, make_delta, record_edit
+from vault import Vault
+
+def note(lines) -> bytes:
+    return json.dumps({"content": "\n".join(lines), "tags": []}).encode()
+
+class TestNoteHistory(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.vault = Vault.open("master")
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_deltas_round_trip(self):
+        base = note(f"line {i}" for i in range(500))
+        cases = [base.replace(b"line 10\\n", b"changed\\n").replace(b"line 400", b"x"),
+                 b"", base + b"tail", b"head" + base, note(["other"])]
+        for text in cases:
+            delta = make_delta(base, text)
+            self.assertEqual(b"".join(apply_delta([memoryview(base)], delta)), text)
+        self.assertLess(len(make_delta(base, cases[0])), 100)
+
+    def test_revisions_cost_about_the_edits(self):
+        lines = [f"entry {i}: some log text that repeats" for i in range(5000)]
+        versions = [note(lines)]
+        for r in range(200):
+            lines[(r * 37) % len(lines)] = f"edit {r}"
+            versions.append(note(lines))
+        for previous, text in zip(versions, versions[1:]):
+            self.assertTrue(record_edit("a.enc", previous, text, vault=self.vault))
+        history = NoteHistory.open("a.enc", vault=self.vault)
+        self.assertEqual([r for r, _ in history.revisions()], list(range(1, 202)))
+        self.assertLess(os.path.getsize(history_path("a.enc")), len(versions[0]) + 200 * 100)
+        for revision in (1, 2, 100, 201):
+            self.assertEqual(history.get(revision), versions[revision - 1])
+        # Saving the same text again adds nothing
+        self.assertIsNone(history.record(versions[-1]))
+        with self.assertRaises(ValueError):
+            NoteHistory.open("a.enc", vault=Vault.create("other", os.path.join(self.tmp.name, ".other")))
+
+    def test_two_writers_share_one_history(self):
+        # Two instances opened before either wrote stand in for a CLI and a GUI
+        first, second = NoteHistory.open("s.enc", vault=self.vault), NoteHistory.open("s.enc", vault=self.vault)
+        self.assertEqual(first.record(note(["a"])), 1)
+        self.assertEqual(second.record(note(["b"])), 2)
+        self.assertEqual(first.record(note(["c"]), note(["a"])), 3)
+        texts = {}
+        def edit(history, prefix):
+            for i in range(20):
+                text = note([f"{prefix} {i}"] * 20)
+                texts[history.record(text)] = text
+        threads = [threading.Thread(target=edit, args=(history, prefix)) for history, prefix in ((first, "x"), (second, "y"))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reopened = NoteHistory.open("s.enc", vault=self.vault)
+        self.assertEqual([r for r, _ in reopened.revisions()], list(range(1, 44)))
+        self.assertEqual(reopened.get(2), note(["b"]))
+        for revision, text in texts.items():
+            self.assertEqual(reopened.get(revision), text)
+
+    def test_prune_and_torn_tail(self):
+        texts = [note([f"version {i}"] * 50) for i in range(10)]
+        history = NoteHistory.open("p.enc", "note password")
+        for text in texts:
+            history.record(text)
+        self.assertEqual(history.prune(keep=4), 6)
+        reopened = NoteHistory.open("p.enc", "note password")
+        self.assertEqual([r for r, _ in reopened.revisions()], [7, 8, 9, 10])
+        self.assertEqual(reopened.entries[0][1], KEYFRAME)
+        self.assertEqual(reopened.get(10), texts[9])
+        size = os.path.getsize(history_path("p.enc"))
+        reopened.record(note(["interrupted"]))
+        with open(history_path("p.enc"), "r+b") as f:
+            f.truncate(size + 10)
+        self.assertEqual(len(NoteHistory.open("p.enc", "note password").revisions()), 4)
+        self.assertEqual(os.path.getsize(history_path("p.enc")), size)
+        with self.assertRaises(ValueError):
+            NoteHistory.open("p.enc", "wrong password")
+        delete_history("p.enc")
+        self.assertEqual(NoteHistory.open("p.enc", "note password").revisions(), [])
+
+if __name__ == "__main__":
+    unittest.main()
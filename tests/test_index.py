@@ -0,0 +1,112 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import json
+import storage
+from vault import Vault, encrypt_note
+from index import NoteIndex
+
+class TestNoteIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.vault = Vault.open("master")
+
+    def tearDown(self):
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def add(self, index, name, content, tags=()):
+        note_obj = {"content": content, "tags": list(tags)}
+        encrypted = self.vault.encrypt(json.dumps(note_obj).encode())
+        filename = storage.save_note(encrypted, name)
+        index.update(filename, note_obj, encrypted)
+        return filename
+
+    def test_incremental_updates_persist(self):
+        index = NoteIndex.load(self.vault)
+        self.add(index, "a", "Hello world", ["work"])
+        self.add(index, "b", "Goodbye world")
+        reloaded = NoteIndex.load(self.vault)
+        self.assertEqual(reloaded.lookup("hello"), {"a.enc"})
+        self.assertEqual(reloaded.lookup("world"), {"a.enc", "b.enc"})
+        self.assertEqual(reloaded.lookup("WORK"), {"a.enc"})
+        self.assertEqual(reloaded.lookup("lo wor"), {"a.enc"})
+        reloaded.remove("a.enc")
+        self.assertEqual(NoteIndex.load(self.vault).lookup("world"), {"b.enc"})
+
+    def test_candidates_include_unindexed_notes(self):
+        index = NoteIndex.load(self.vault)
+        self.add(index, "a", "alpha")
+        self.add(index, "b", "beta")
+        storage.save_note(self.vault.encrypt(b"alpha too"), "c")
+        self.assertEqual(index.candidates("alpha", storage.list_notes()), ["a.enc", "c.enc"])
+        self.assertEqual(index.candidates("!!", storage.list_notes()), ["a.enc", "b.enc", "c.enc"])
+
+    def test_changes_append_and_merge_across_instances(self):
+        first, second = NoteIndex.load(self.vault), NoteIndex.load(self.vault)
+        self.add(first, "a", "alpha")
+        size = os.path.getsize(first.path)
+        self.add(second, "b", "beta")
+        self.assertLess(os.path.getsize(first.path) - size, 200)
+        self.add(first, "c", "gamma")
+        self.assertEqual(NoteIndex.load(self.vault).docs.keys(), {"a.enc", "b.enc", "c.enc"})
+        self.assertEqual(second.candidates("gamma", ["c.enc"]), ["c.enc"])
+
+    def test_notes_with_their_own_password_are_not_indexed(self):
+        index = NoteIndex.load(self.vault)
+        filename = self.add(index, "p", "private words")
+        encrypted = encrypt_note(b'{"content": "private words"}', "pw")
+        storage.save_note(encrypted, "p")
+        index.update(filename, {"content": "private words", "tags": []}, encrypted)
+        self.assertEqual(NoteIndex.load(self.vault).docs, {})
+        self.assertEqual(index.rebuild(), [])
+        self.assertEqual(NoteIndex.load(self.vault).docs, {})
+
+    def test_damaged_record_resets_the_log(self):
+        index = NoteIndex.load(self.vault)
+        self.add(index, "a", "alpha")
+        offset = os.path.getsize(index.path)
+        self.add(index, "b", "beta")
+        self.add(index, "c", "gamma")
+        with open(index.path, "r+b") as f:
+            f.seek(offset + 20)
+            f.write(b"X")  # inside the record for b, not at the end of the file
+        damaged = NoteIndex.load(self.vault)
+        self.assertTrue(damaged.damaged)
+        self.assertEqual(damaged.docs, {})
+        self.assertEqual(damaged.candidates("gamma", ["a.enc", "c.enc"]), ["a.enc", "c.enc"])
+        self.add(damaged, "d", "delta")
+        self.assertEqual(NoteIndex.load(self.vault).docs, {"d.enc": ["delta"]})
+        self.assertEqual(damaged.rebuild(), [])
+        self.assertFalse(damaged.damaged)
+        self.assertEqual(NoteIndex.load(self.vault).lookup("gamma"), {"c.enc"})
+
+    def test_torn_last_record_is_cut_off(self):
+        index = NoteIndex.load(self.vault)
+        self.add(index, "a", "alpha")
+        size = os.path.getsize(index.path)
+        self.add(index, "b", "beta")
+        with open(index.path, "r+b") as f:
+            f.truncate(os.path.getsize(index.path) - 5)
+        reloaded = NoteIndex.load(self.vault)
+        self.assertFalse(reloaded.damaged)
+        self.assertEqual(list(reloaded.docs), ["a.enc"])
+        self.add(reloaded, "c", "gamma")
+        self.assertEqual(list(NoteIndex.load(self.vault).docs), ["a.enc", "c.enc"])
+        self.assertGreater(os.path.getsize(index.path), size)
+
+    def test_rebuild(self):
+        storage.save_note(self.vault.encrypt(b'{"content": "gamma", "tags": ["x"]}'), "g")
+        index = NoteIndex.load(self.vault)
+        self.assertEqual(index.rebuild(), [])
+        self.assertEqual(NoteIndex.load(self.vault).lookup("gamma"), {"g.enc"})
+
+if __name__ == "__main__":
+    unittest.main()
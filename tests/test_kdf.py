@@ -0,0 +1,55 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from encryption import encrypt_data, decrypt_data, derive_key, token_kdf, PASSWORD_MAGIC
+from kdf import (LEGACY_PARAMS, MIN_ITERATIONS, calibrate, current_params, pack_params,
+                 pbkdf2_params, scrypt_params, unpack_params)
+from vault import LEGACY_VAULT_MAGIC, Vault
+
+class TestKdf(unittest.TestCase):
+    def test_params_round_trip_and_validation(self):
+        for params in (pbkdf2_params(200000), scrypt_params(2 ** 15, 8, 2)):
+            self.assertEqual(unpack_params(pack_params(params)), params)
+        for bad in (pbkdf2_params(1), scrypt_params(3000), scrypt_params(2 ** 14, 0, 1)):
+            with self.assertRaises(ValueError):
+                pack_params(bad)
+
+    def test_header_records_params(self):
+        token = encrypt_data(b"note", "pw", params=scrypt_params(2 ** 14))
+        self.assertTrue(token.startswith(PASSWORD_MAGIC))
+        self.assertEqual(token_kdf(token)[1], scrypt_params(2 ** 14))
+        self.assertEqual(decrypt_data(token, "pw"), b"note")
+        self.assertEqual(token_kdf(encrypt_data(b"note", "pw"))[1], current_params())
+        # The parameters are authenticated: a cheaper setting cannot be swapped in
+        tampered = token[:4] + pack_params(pbkdf2_params(MIN_ITERATIONS)) + token[17:]
+        with self.assertRaises(ValueError):
+            decrypt_data(tampered, "pw")
+
+    def test_legacy_formats_still_open(self):
+        salt, nonce = os.urandom(16), os.urandom(12)
+        key = derive_key("pw", salt, LEGACY_PARAMS)
+        legacy = salt + nonce + AESGCM(key).encrypt(nonce, b"old note", None)
+        self.assertEqual(decrypt_data(legacy, "pw"), b"old note")
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, ".vault")
+            vault_key = AESGCM.generate_key(bit_length=256)
+            wrapped = AESGCM(key).encrypt(nonce, vault_key, LEGACY_VAULT_MAGIC)
+            with open(path, "wb") as f:
+                f.write(LEGACY_VAULT_MAGIC + salt + nonce + wrapped)
+            vault = Vault.unlock("pw", path)
+            self.assertEqual(vault.decrypt(vault.encrypt(b"x")), b"x")
+
+    def test_calibrate_stays_in_bounds(self):
+        self.assertEqual(calibrate(0.0, "pbkdf2"), pbkdf2_params(MIN_ITERATIONS))
+        self.assertEqual(calibrate(0.0, "scrypt").cost, 2 ** 14)
+        with self.assertRaises(ValueError):
+            calibrate(0.1, "md5")
+
+if __name__ == "__main__":
+    unittest.main()
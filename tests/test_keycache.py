@@ -0,0 +1,44 @@
+import unittest
+import os
+import sys
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from keycache import KeyCache
+from encryption import encrypt_data, decrypt_data, get_salt, key_cache, lock
+
+class TestKeyCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = KeyCache(max_size=2, ttl=60)
+        cache.put("pw", b"a" * 16, b"k1")
+        cache.put("pw", b"b" * 16, b"k2")
+        cache.get("pw", b"a" * 16)
+        cache.put("pw", b"c" * 16, b"k3")
+        self.assertEqual(cache.get("pw", b"a" * 16), b"k1")
+        self.assertIsNone(cache.get("pw", b"b" * 16))
+        self.assertEqual(len(cache), 2)
+
+    def test_ttl_expiry(self):
+        cache = KeyCache(max_size=4, ttl=0)
+        cache.put("pw", b"a" * 16, b"k1")
+        self.assertIsNone(cache.get("pw", b"a" * 16))
+
+    def test_clear_wipes_keys(self):
+        cache = KeyCache(max_size=4, ttl=60)
+        cache.put("pw", b"a" * 16, b"k1")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get("pw", b"a" * 16))
+
+    def test_reencrypt_reuses_cached_key(self):
+        lock()
+        encrypted = encrypt_data(b"note", "pw")
+        misses = key_cache.misses
+        decrypted = decrypt_data(encrypted, "pw")
+        reencrypted = encrypt_data(decrypted + b"!", "pw", get_salt(encrypted))
+        self.assertEqual(decrypt_data(reencrypted, "pw"), b"note!")
+        self.assertEqual(key_cache.misses, misses)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+import os
+import subprocess
+import sys
+
+SRC = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+class TestHeadlessStartup(unittest.TestCase):
+    def test_cli_imports_are_quiet_and_headless(self):
+        # A fresh interpreter, so modules other tests imported do not count
+        code = ("import sys; sys.path.insert(0, sys.argv[1]); import launch, main; "
+                "print(sorted(m for m in ('tkinter', 'merged', 'cProfile', 'tracemalloc', 'ctypes') if m in sys.modules))")
+        result = subprocess.run([sys.executable, "-c", code, SRC], capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout, "[]\n")
+        self.assertEqual(result.stderr, "")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import sys
+import tempfile
+from unittest import mock
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import hashlib
+import json
+import tkinter as tk
+import merged
+import storage
+from catalog import Catalog
+from index import NoteIndex
+import vault
+from vault import Vault, decrypt_note
+
+class TestCLIFrame(unittest.TestCase):
+    # Drives the embedded CLI's commands without a display: the Tk widget calls
+    # are patched out, the dialogs answer from a list, and output is collected
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.answers = []
+        self.output = []
+        patches = [mock.patch.object(tk.Frame, "__init__", lambda frame, master=None: None),
+                   mock.patch.object(merged.CLIFrame, "pack", lambda frame, **kwargs: None),
+                   mock.patch.object(merged.CLIFrame, "create_widgets", lambda frame: None),
+                   mock.patch.object(merged.CLIFrame, "print_output", lambda frame, text: self.output.append(text)),
+                   mock.patch.object(merged, "ask_string", lambda *args, **kwargs: self.answers.pop(0))]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.frame = merged.CLIFrame(None, "master")
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def run_command(self, command, *answers):
+        self.answers = list(answers)
+        self.output.clear()
+        self.frame.process_command(command)
+        self.assertEqual(self.answers, [])
+        return "".join(self.output)
+
+    def test_add_and_edit_update_index_and_catalog(self):
+        self.assertIn("Note saved as plans.enc", self.run_command("add", "first draft", "", "plans", "work"))
+        self.assertEqual(NoteIndex.load(self.frame.vault).candidates("draft", storage.list_notes()), ["plans.enc"])
+        self.assertEqual(Catalog.load(self.frame.vault).entries["plans.enc"]["tags"], ["work"])
+        self.assertIn("Note updated.", self.run_command("edit", "plans.enc", "second version", ""))
+        vault = Vault.open("master")
+        note_obj = json.loads(decrypt_note(storage.load_note("plans.enc"), None, vault).decode())
+        self.assertEqual(note_obj, {"content": "second version", "tags": ["work"]})
+        self.assertEqual(NoteIndex.load(vault).candidates("second", storage.list_notes()), ["plans.enc"])
+        self.assertEqual(Catalog.load(vault).entries["plans.enc"]["title"], "second version")
+
+    def test_attachments_are_catalogued_and_never_opened_by_search(self):
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(source.cleanup)
+        path = os.path.join(source.name, "photo.bin")
+        data = bytes(range(256)) * 4096
+        with open(path, "wb") as f:
+            f.write(data)
+        with mock.patch.object(merged, "ask_open_filename", lambda **kwargs: path):
+            self.assertIn("File attached as photo.enc", self.run_command("attach", "", "photo"))
+        self.run_command("add", "holiday plans", "", "plans", "")
+        entry = Catalog.load(self.frame.vault).entries["photo.enc"]
+        self.assertEqual((entry["size"], entry["sha256"]), (len(data), hashlib.sha256(data).hexdigest()))
+        with mock.patch.object(vault, "decrypt_stream", side_effect=AssertionError("attachment decrypted")):
+            output = self.run_command("search", "holiday", "")
+        self.assertEqual(output, "Match found in: plans.enc\n")
+        # Without the index entry, search still skips the attachment on its header
+        self.frame.note_index.remove("photo.enc")
+        with mock.patch.object(vault, "decrypt_stream", side_effect=AssertionError("attachment decrypted")):
+            output = self.run_command("search", "holiday", "")
+        self.assertEqual(output, "Match found in: plans.enc\n")
+        self.frame.catalog.rebuild()
+        self.assertEqual(Catalog.load(self.frame.vault).entries["photo.enc"]["sha256"], entry["sha256"])
+
+if __name__ == "__main__":
+    unittest.main()
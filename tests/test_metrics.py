@@ -0,0 +1,66 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import time
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import metrics
+import storage
+from vault import Vault, decrypt_note, encrypt_note
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.vault = Vault.open("master")
+        metrics.reset()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.reset()
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_counts_crypto_and_storage(self):
+        metrics.enable(False)
+        storage.save_note(encrypt_note(b"unseen", vault=self.vault), "off")
+        self.assertEqual(metrics.snapshot()["stats"], {})
+        metrics.enable()
+        plaintext = b"x" * 100
+        filename = storage.save_note(encrypt_note(plaintext, vault=self.vault), "on")
+        self.assertEqual(decrypt_note(storage.load_note_view(filename), None, self.vault), plaintext)
+        encrypt_note(plaintext, "pw")
+        stats = metrics.snapshot()["stats"]
+        self.assertEqual((stats["vault.encrypt"]["calls"], stats["vault.encrypt"]["bytes"]), (1, 100))
+        self.assertEqual((stats["vault.decrypt"]["calls"], stats["vault.decrypt"]["bytes"]), (1, 100))
+        self.assertEqual(stats["storage.read"]["bytes"], stats["storage.write"]["bytes"])
+        self.assertEqual(stats["crypto.encrypt"]["bytes"], 100)
+        self.assertEqual(stats["kdf.derive"]["calls"], 1)
+        path = os.path.join(self.tmp.name, "stats.json")
+        self.assertIn("written", metrics.stats_command("json " + path))
+        with open(path) as f:
+            self.assertEqual(json.load(f)["stats"]["storage.read"]["calls"], 1)
+        metrics.stats_command("reset")
+        self.assertEqual(metrics.snapshot()["stats"], {})
+
+    def test_command_timer_excludes_prompts(self):
+        metrics.enable()
+        wait = metrics.untimed(time.sleep)
+        with metrics.CommandTimer("add"):
+            wait(0.05)
+        stat = metrics.snapshot()["stats"]["command.add"]
+        self.assertEqual(stat["calls"], 1)
+        self.assertLess(stat["max"], 0.05)
+        timer = metrics.CommandTimer("list", "cpu")
+        storage.list_notes()
+        self.assertIn("list_notes", timer.stop())
+        self.assertEqual(metrics.parse_capture("memprofile read"), ("read", "memory"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+
+# Add the src and benchmarks directories to sys.path to allow importing modules from them
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "benchmarks")))
+
+import microbench
+
+class TestMicrobench(unittest.TestCase):
+    def test_run_and_baseline_check(self):
+        results = microbench.run([50], repeat=1, only="vault50", log=lambda line: None)
+        self.assertEqual(sorted(results), ["vault50.list_notes", "vault50.search.index", "vault50.search.scan"])
+        slower_baseline = {name: dict(result, median=result["median"] * 2) for name, result in results.items()}
+        faster_baseline = {name: dict(result, median=result["median"] / 2) for name, result in results.items()}
+        self.assertEqual(microbench.compare(results, slower_baseline, 0.25), [])
+        self.assertEqual([r[0] for r in microbench.compare(results, faster_baseline, 0.25)], sorted(results))
+        self.assertEqual(microbench.compare(results, faster_baseline, 1.5), [])
+
+    def test_regression_fails_the_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = os.path.join(tmp, "baseline.json")
+            with open(baseline, "w") as f:
+                json.dump({"results": {"storage.load_note.1KiB": {"median": 1e-12}}}, f)
+            self.assertEqual(microbench.main(["--vaults", "", "--filter", "storage.load", "--repeat", "1",
+                                              "--baseline", baseline, "--json", os.path.join(tmp, "out.json")]), 1)
+            with open(os.path.join(tmp, "out.json")) as f:
+                self.assertIn("storage.load_note.1KiB", json.load(f)["results"])
+
+if __name__ == "__main__":
+    unittest.main()
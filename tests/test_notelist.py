@@ -0,0 +1,61 @@
+import unittest
+import os
+import sys
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from notelist import NoteList
+
+def entry(title, modified, tags=()):
+    return {"title": title, "modified": modified, "tags": list(tags)}
+
+class TestNoteList(unittest.TestCase):
+    def setUp(self):
+        self.entries = {
+            "a.enc": entry("Groceries", "2024-01-01T10:00:00", ["home"]),
+            "b.enc": entry("Meeting notes", "2024-03-01T10:00:00", ["work"]),
+            "c.enc": entry("Recipes", "2024-02-01T10:00:00"),
+        }
+        self.notes = NoteList()
+        self.notes.load(["a.enc", "b.enc", "c.enc", "z.enc", "y.enc"], self.entries)
+
+    def names(self):
+        return [self.notes.filename(i) for i in range(len(self.notes))]
+
+    def test_sorted_newest_first_then_uncatalogued(self):
+        self.assertEqual(self.names(), ["b.enc", "c.enc", "a.enc", "y.enc", "z.enc"])
+        self.assertEqual(self.notes.label(0), "b.enc  |  Meeting notes")
+        self.assertEqual(self.notes.label(4), "z.enc")
+        self.assertEqual(self.notes.position("a.enc"), 2)
+        self.assertIsNone(self.notes.position("missing.enc"))
+
+    def test_incremental_upsert_and_remove(self):
+        self.notes.upsert("a.enc", entry("Groceries", "2024-04-01T10:00:00"))
+        self.notes.upsert("new.enc", entry("Fresh", "2024-05-01T10:00:00"))
+        self.notes.remove("y.enc")
+        self.notes.remove("missing.enc")
+        self.assertEqual(self.names(), ["new.enc", "a.enc", "b.enc", "c.enc", "z.enc"])
+        self.assertEqual(len(self.notes.rows), 5)
+
+    def test_filter_matches_names_titles_and_tags(self):
+        self.assertTrue(self.notes.set_filter("es"))
+        self.assertEqual(self.names(), ["b.enc", "c.enc", "a.enc"])
+        # Narrowing re-checks only the current matches; widening starts over
+        self.assertTrue(self.notes.set_filter("ipes"))
+        self.assertEqual(self.names(), ["c.enc"])
+        self.assertFalse(self.notes.set_filter("IPES "))
+        self.assertTrue(self.notes.set_filter("work meeting"))
+        self.assertEqual(self.names(), ["b.enc"])
+        self.assertTrue(self.notes.set_filter("z.enc"))
+        self.assertEqual(self.names(), ["z.enc"])
+        # Changes respect the active filter
+        self.notes.upsert("zz.enc")
+        self.notes.upsert("other.enc")
+        self.assertEqual(self.names(), ["z.enc", "zz.enc"])
+        self.assertIsNone(self.notes.position("other.enc"))
+        self.assertTrue(self.notes.set_filter(""))
+        self.assertEqual(len(self.notes), 7)
+
+if __name__ == "__main__":
+    unittest.main()
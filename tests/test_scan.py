@@ -0,0 +1,47 @@
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from encryption import encrypt_data, decrypt_data
+from scan import scan_notes
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_results_and_per_note_errors(self):
+        for i in range(10):
+            storage.save_note(encrypt_data(b"note %d" % i, "pw"), "n%d" % i)
+        storage.save_note(encrypt_data(b"other", "different"), "x")
+        results = list(scan_notes(storage.list_notes(), lambda t: decrypt_data(t, "pw"), workers=4))
+        ok = {r.filename: r.data for r in results if r.error is None}
+        errors = [r.filename for r in results if r.error is not None]
+        self.assertEqual(len(ok), 10)
+        self.assertEqual(ok["n3.enc"], b"note 3")
+        self.assertEqual(errors, ["x.enc"])
+
+    def test_process_and_cancel(self):
+        for i in range(20):
+            storage.save_note(b"plain %d" % i, "n%d" % i)
+        cancel = threading.Event()
+        seen = []
+        for result in scan_notes(storage.list_notes(), bytes, lambda f, d: len(d), workers=2, cancel=cancel):
+            seen.append(result.value)
+            cancel.set()
+        self.assertLess(len(seen), 20)
+        self.assertTrue(all(v >= 7 for v in seen))
+
+if __name__ == "__main__":
+    unittest.main()
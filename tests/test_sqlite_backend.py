@@ -0,0 +1,65 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from config import SQLITE_POOL_SIZE
+from scan import scan_notes
+from sqlite_backend import SQLiteBackend
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+        self.backend = SQLiteBackend(self.tmp.name)
+
+    def tearDown(self):
+        self.backend.close()
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_crud(self):
+        self.backend.write("a.enc", b"one")
+        self.backend.write("a.enc", b"two")
+        self.assertEqual(self.backend.read("a.enc"), b"two")
+        self.assertEqual(self.backend.stat("a.enc")[0], 3)
+        self.assertTrue(self.backend.delete("a.enc"))
+        self.assertFalse(self.backend.exists("a.enc"))
+        with self.assertRaises(FileNotFoundError):
+            self.backend.read("a.enc")
+
+    def test_batch_write_and_paging(self):
+        self.backend.write_many(("n%03d.enc" % i, b"x" * i) for i in range(100))
+        self.assertEqual(len(self.backend.list()), 100)
+        self.assertEqual(self.backend.list_page("size", offset=0, limit=3, reverse=True), ["n099.enc", "n098.enc", "n097.enc"])
+        self.assertEqual(self.backend.list_page("name", offset=10, limit=2), ["n010.enc", "n011.enc"])
+        with self.assertRaises(ValueError):
+            self.backend.list_page("colour")
+
+    def test_scans_reuse_pooled_connections(self):
+        old_backend = storage.STORAGE_BACKEND
+        storage.STORAGE_BACKEND = "sqlite"
+        try:
+            backend = storage.get_backend()
+            backend.write_many(("n%03d.enc" % i, b"x" * i) for i in range(50))
+            for _ in range(5):
+                results = list(scan_notes(storage.list_notes(), lambda token: bytes(token), workers=8))
+                self.assertEqual(sorted(len(r.data) for r in results), list(range(50)))
+        finally:
+            storage.STORAGE_BACKEND = old_backend
+        self.assertLessEqual(backend._opened, SQLITE_POOL_SIZE)
+        self.assertEqual(backend._idle.qsize(), backend._opened)
+
+    def test_storage_save_notes_on_files_backend(self):
+        saved = storage.save_notes((b"data %d" % i, "bulk%d" % i) for i in range(5))
+        self.assertEqual(saved, ["bulk%d.enc" % i for i in range(5)])
+        self.assertEqual(storage.list_notes_page("name", limit=2), ["bulk0.enc", "bulk1.enc"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from vault import Vault, encrypt_note_parts, decrypt_note
+
+class TestStorage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        self.old_threshold = storage.MMAP_THRESHOLD
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.MMAP_THRESHOLD = self.old_threshold
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_parts_round_trip_through_views(self):
+        vault = Vault.open("master")
+        data = os.urandom(4096)
+        filename = storage.save_note_parts(encrypt_note_parts(data, vault=vault), "parts")
+        self.assertEqual(storage.list_notes(), ["parts.enc"])
+        for threshold in (1 << 30, 1):
+            # Buffered read below the threshold, mmap at or above it
+            storage.MMAP_THRESHOLD = threshold
+            view = storage.load_note_view(filename)
+            self.assertEqual(bytes(view), storage.load_note(filename))
+            self.assertEqual(decrypt_note(view, vault=vault), data)
+            view.release()
+
+    @unittest.skipIf(os.name == "nt", "Windows cannot replace a file that is mapped")
+    def test_rewrite_keeps_mapped_readers_valid(self):
+        storage.save_note(b"a" * 100, "note")
+        storage.MMAP_THRESHOLD = 1
+        view = storage.load_note_view("note.enc")
+        storage.write_note_parts("note.enc", [b"new ", b"body"])
+        self.assertEqual(bytes(view), b"a" * 100)
+        view.release()
+        self.assertEqual(storage.load_note("note.enc"), b"new body")
+        self.assertEqual(storage.list_notes(), ["note.enc"])
+
+if __name__ == "__main__":
+    unittest.main()
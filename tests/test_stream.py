@@ -0,0 +1,99 @@
+import unittest
+import io
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from stream import (encrypt_stream, decrypt_stream, is_stream, save_note_stream, load_note_stream,
+                    read_range, note_stream_size, iter_text)
+from vault import Vault, decrypt_note, needs_password
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def encrypt(self, data, segment_size=16, **kwargs):
+        out = io.BytesIO()
+        self.assertEqual(encrypt_stream(io.BytesIO(data), out, segment_size=segment_size, **kwargs), len(data))
+        return out.getvalue()
+
+    def decrypt(self, token, **kwargs):
+        out = io.BytesIO()
+        decrypt_stream(io.BytesIO(token), out, **kwargs)
+        return out.getvalue()
+
+    def test_round_trip_password_and_vault(self):
+        vault = Vault.open("master")
+        data = os.urandom(100)
+        for size in (0, 15, 16, 32, 100):
+            token = self.encrypt(data[:size], password="pw")
+            self.assertTrue(is_stream(token))
+            self.assertTrue(needs_password(token))
+            self.assertEqual(self.decrypt(token, password="pw"), data[:size])
+            token = self.encrypt(data[:size], vault=vault)
+            self.assertFalse(needs_password(token))
+            self.assertEqual(self.decrypt(token, vault=vault), data[:size])
+            self.assertEqual(decrypt_note(token, vault=vault), data[:size])
+
+    def test_tampering_is_detected(self):
+        token = self.encrypt(b"a" * 40, password="pw")
+        header_size = len(token) - 3 * (16 + 16) + 8
+        body = token[header_size:]
+        segments = [body[:32], body[32:64], body[64:]]
+        with self.assertRaises(ValueError):
+            self.decrypt(token, password="wrong")
+        with self.assertRaises(ValueError):
+            # Dropping the last segment must not look like a shorter note
+            self.decrypt(token[:header_size] + segments[0] + segments[1], password="pw")
+        with self.assertRaises(ValueError):
+            self.decrypt(token[:header_size] + segments[1] + segments[0] + segments[2], password="pw")
+
+    def test_note_store_round_trip(self):
+        vault = Vault.open("master")
+        data = os.urandom(200 * 1024)
+        filename = save_note_stream(io.BytesIO(data), "big", vault=vault)
+        self.assertEqual(filename, "big.enc")
+        self.assertEqual(storage.list_notes(), ["big.enc"])
+        out = io.BytesIO()
+        self.assertEqual(load_note_stream(filename, out, vault=vault), len(data))
+        self.assertEqual(out.getvalue(), data)
+
+    def test_read_range_decrypts_only_what_it_needs(self):
+        vault = Vault.open("master")
+        data = os.urandom(1000)
+        out = io.BytesIO()
+        encrypt_stream(io.BytesIO(data), out, vault=vault, segment_size=64)
+        storage.save_note(out.getvalue(), "ranged")
+        self.assertEqual(note_stream_size("ranged.enc"), 1000)
+        for offset, length in ((0, 10), (60, 10), (64, 64), (500, 300), (990, 50), (1000, 5)):
+            self.assertEqual(read_range("ranged.enc", offset, length, vault=vault), data[offset:offset + length])
+        # A damaged segment outside the range does not stop a preview of the start
+        token = bytearray(out.getvalue())
+        token[-1] ^= 1
+        storage.write_note("ranged.enc", bytes(token))
+        self.assertEqual(read_range("ranged.enc", 0, 64, vault=vault), data[:64])
+        with self.assertRaises(ValueError):
+            read_range("ranged.enc", 990, 5, vault=vault)
+
+    def test_iter_text_keeps_split_characters_whole(self):
+        text = "é" * 100
+        out = io.BytesIO()
+        encrypt_stream(io.BytesIO(text.encode()), out, password="pw", segment_size=7)
+        storage.save_note(out.getvalue(), "text")
+        chunks = list(iter_text("text.enc", "pw", chunk_size=5))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual("".join(chunks), text)
+
+if __name__ == "__main__":
+    unittest.main()
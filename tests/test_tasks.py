@@ -0,0 +1,72 @@
+import unittest
+import os
+import sys
+import threading
+import time
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+from tasks import TaskRunner
+
+class FakeRoot:
+    # Stands in for the Tk window: after() callbacks are queued and run by pump()
+    def __init__(self):
+        self.thread = threading.current_thread()
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def pump(self, runner, timeout=5):
+        deadline = time.monotonic() + timeout
+        while runner.busy and time.monotonic() < deadline:
+            callbacks, self.callbacks = self.callbacks, []
+            for callback in callbacks:
+                callback()
+            time.sleep(0.001)
+
+class TestTaskRunner(unittest.TestCase):
+    def setUp(self):
+        self.root = FakeRoot()
+        self.runner = TaskRunner(self.root, poll_ms=1)
+
+    def tearDown(self):
+        self.runner.shutdown()
+
+    def test_results_and_errors_arrive_on_the_calling_thread(self):
+        seen = []
+        def on_done(result):
+            seen.append(("done", result, threading.current_thread() is self.root.thread))
+        def on_error(e):
+            seen.append(("error", str(e), threading.current_thread() is self.root.thread))
+        def fail(task):
+            raise ValueError("bad password")
+        self.runner.submit(lambda task: threading.current_thread() is not self.root.thread, on_done, on_error)
+        self.runner.submit(fail, on_done, on_error)
+        self.root.pump(self.runner)
+        self.assertEqual(seen, [("done", True, True), ("error", "bad password", True)])
+
+    def test_progress_is_coalesced_and_cancel_stops_work(self):
+        started, progress, results = threading.Event(), [], []
+        def work(task):
+            started.set()
+            done = 0
+            while not task.cancelled:
+                done += 1
+                task.progress(done, None)
+            return done
+        task = self.runner.submit(work, results.append, on_progress=lambda done, total, message: progress.append(done))
+        started.wait(5)
+        time.sleep(0.01)
+        self.root.callbacks.pop()()
+        task.cancel()
+        self.root.pump(self.runner)
+        self.assertTrue(task.cancelled)
+        self.assertEqual(len(results), 1)
+        # At most one progress update per poll, never more than the work reported
+        self.assertLess(len(progress), results[0])
+        self.assertEqual(progress, sorted(progress))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import json
+import os
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from unittest import mock
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import todos
+from encryption import encrypt_data
+from todos import TodoJournal, TodoView, is_journal
+
+class TestTodoJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "todos.enc")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_changes_are_appended_and_replayed(self):
+        journal = TodoJournal.open(self.path, "pw")
+        a = journal.add("write tests")
+        b = journal.add("ship")
+        size = os.path.getsize(self.path)
+        journal.set_done(a["id"])
+        journal.delete(b["id"])
+        # Each change is one small record, not a rewrite of the list
+        self.assertLess(os.path.getsize(self.path) - size, 2 * 200)
+        reopened = TodoJournal.open(self.path, "pw")
+        self.assertEqual(reopened.items(), [{"id": 1, "task": "write tests", "status": "done", "priority": "normal", "due": None}])
+        self.assertEqual(reopened.add("next")["id"], 3)
+        with self.assertRaises(KeyError):
+            reopened.delete(2)
+        with self.assertRaises(ValueError):
+            TodoJournal.open(self.path, "wrong")
+
+    def test_torn_tail_is_dropped_and_other_writers_seen(self):
+        first = TodoJournal.open(self.path, "pw")
+        second = TodoJournal.open(self.path, "pw")
+        first.add("from first")
+        second.add("from second")
+        self.assertEqual([t["task"] for t in second.items()], ["from first", "from second"])
+        size = os.path.getsize(self.path)
+        second.add("interrupted")
+        with open(self.path, "r+b") as f:
+            f.truncate(size + 20)
+        reopened = TodoJournal.open(self.path, "pw")
+        self.assertEqual([t["id"] for t in reopened.items()], [1, 2])
+        self.assertEqual(os.path.getsize(self.path), size)
+        reopened.add("after crash")
+        self.assertEqual(len(TodoJournal.open(self.path, "pw").items()), 3)
+
+    def test_concurrent_writers_keep_every_record(self):
+        # Two journals on one file stand in for two processes
+        writers = [TodoJournal.open(self.path, "pw"), TodoJournal.open(self.path, "pw")]
+        def fill(journal, prefix):
+            for i in range(50):
+                journal.add(f"{prefix}{i}")
+        threads = [threading.Thread(target=fill, args=(journal, prefix)) for journal, prefix in zip(writers, "ab")]
+        # Compacting often makes the rewrites race the appends
+        old_limit, todos.TODO_COMPACT_MIN_RECORDS = todos.TODO_COMPACT_MIN_RECORDS, 4
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            todos.TODO_COMPACT_MIN_RECORDS = old_limit
+        items = TodoJournal.open(self.path, "pw").items()
+        self.assertEqual(len(items), 100)
+        self.assertEqual(sorted(t["id"] for t in items), list(range(1, 101)))
+
+    def test_durable_writes_setting_is_respected(self):
+        journal = TodoJournal.open(self.path, "pw")
+        with mock.patch.object(todos.os, "fsync") as fsync:
+            journal.add("synced")
+        self.assertEqual(fsync.call_count, 1)
+        with mock.patch.object(todos, "DURABLE_WRITES", False), \
+             mock.patch("durable.DURABLE_WRITES", False), mock.patch.object(todos.os, "fsync") as fsync:
+            journal.add("not synced")
+            journal.compact()
+        fsync.assert_not_called()
+        self.assertEqual(len(TodoJournal.open(self.path, "pw").items()), 2)
+
+    def test_compaction_and_legacy_conversion(self):
+        with open(self.path, "wb") as f:
+            f.write(encrypt_data(json.dumps([{"task": "old", "done": True}]).encode(), "pw"))
+        journal = TodoJournal.open(self.path, "pw")
+        with open(self.path, "rb") as f:
+            self.assertTrue(is_journal(f.read()))
+        self.assertEqual(journal.items(), [{"id": 1, "task": "old", "status": "done", "priority": "normal", "due": None}])
+        old_limit, todos.TODO_COMPACT_MIN_RECORDS = todos.TODO_COMPACT_MIN_RECORDS, 4
+        try:
+            for i in range(10):
+                journal.delete(journal.add(f"task {i}")["id"])
+        finally:
+            todos.TODO_COMPACT_MIN_RECORDS = old_limit
+        self.assertLessEqual(journal.records, 4)
+        self.assertEqual(TodoJournal.open(self.path, "pw").items(), journal.items())
+        self.assertEqual(journal.add("new")["id"], 12)
+
+    def test_queries_use_status_and_due_indexes(self):
+        journal = TodoJournal.open(self.path, "pw")
+        today = date.today()
+        soon = (today + timedelta(days=2)).isoformat()
+        later = (today + timedelta(days=30)).isoformat()
+        journal.add("later", due=later)
+        journal.add("soon, low", "low", soon)
+        journal.add("soon, high", "high", soon)
+        journal.add("undated")
+        done = journal.add("finished", due=soon)
+        journal.set_done(done["id"])
+        week = (today + timedelta(days=7)).isoformat()
+        self.assertEqual([t["task"] for t in journal.query("pending", week)], ["soon, high", "soon, low"])
+        self.assertEqual([t["task"] for t in journal.query("pending")], ["soon, high", "soon, low", "later", "undated"])
+        self.assertEqual([t["task"] for t in journal.query("done")], ["finished"])
+        journal.update(1, due=None)
+        reopened = TodoJournal.open(self.path, "pw")
+        self.assertEqual([t["task"] for t in reopened.query(due_to=later)], ["soon, high", "soon, low", "finished"])
+        with self.assertRaises(ValueError):
+            journal.add("bad", due="next week")
+        with self.assertRaises(ValueError):
+            journal.update(1, priority="urgent")
+
+    def test_view_moves_single_rows(self):
+        journal = TodoJournal.open(self.path, "pw")
+        for name in ("a", "b", "c"):
+            journal.add(name)
+        view = TodoView(journal, "pending")
+        self.assertEqual([view.todo_id(i) for i in range(len(view))], [1, 2, 3])
+        self.assertEqual(view.changed(3, journal.update(3, priority="high")), (2, 0))
+        self.assertEqual(view.changed(1, journal.set_done(1)), (1, None))
+        self.assertEqual(view.changed(4, journal.add("d")), (None, 2))
+        journal.delete(2)
+        self.assertEqual(view.changed(2), (1, None))
+        self.assertEqual([view.todo_id(i) for i in range(len(view))], [3, 4])
+
+if __name__ == "__main__":
+    unittest.main()
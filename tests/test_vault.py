@@ -0,0 +1,47 @@
+import unittest
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from encryption import encrypt_data
+from vault import Vault, decrypt_note, is_envelope, migrate_notes
+
+class TestVault(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_envelope_round_trip(self):
+        vault = Vault.open("master")
+        token = vault.encrypt(b"secret note")
+        self.assertTrue(is_envelope(token))
+        reopened = Vault.open("master")
+        self.assertEqual(reopened.decrypt(token), b"secret note")
+
+    def test_wrong_master_password(self):
+        Vault.create("master")
+        with self.assertRaises(ValueError):
+            Vault.unlock("wrong")
+
+    def test_old_format_still_readable_and_migrates(self):
+        vault = Vault.open("master")
+        storage.save_note(encrypt_data(b"old note", "notepw"), "old")
+        self.assertEqual(decrypt_note(storage.load_note("old.enc"), "notepw", vault), b"old note")
+        migrated, failed = migrate_notes(vault, "notepw")
+        self.assertEqual((migrated, failed), (["old.enc"], []))
+        token = storage.load_note("old.enc")
+        self.assertTrue(is_envelope(token))
+        self.assertEqual(decrypt_note(token, vault=vault), b"old note")
+        self.assertEqual(storage.list_notes(), ["old.enc"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import io
+import json
+import os
+import sys
+import tempfile
+
+# Add the src directory to sys.path to allow importing modules from it
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src")))
+
+import storage
+from catalog import Catalog
+from container import ContainerBackend
+from index import NoteIndex
+from stream import save_note_stream
+from vault import Vault
+from watch import ChangeWatcher, Change, ADDED, MODIFIED, DELETED, diff_snapshots, update_indexes
+
+class TestChangeWatcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.old_notes_dir = storage.NOTES_DIR
+        storage.NOTES_DIR = self.tmp.name
+
+    def tearDown(self):
+        storage.close_backends()
+        storage.NOTES_DIR = self.old_notes_dir
+        self.tmp.cleanup()
+
+    def test_reports_changes_with_and_without_inotify(self):
+        for use_inotify in (True, False):
+            storage.save_note(b"one", "a")
+            watcher = ChangeWatcher(use_inotify)
+            self.assertEqual(watcher.poll(), [])
+            storage.save_note(b"two", "b")
+            storage.write_note("a.enc", b"changed")
+            self.assertEqual(watcher.poll(), [Change(MODIFIED, "a.enc"), Change(ADDED, "b.enc")])
+            storage.delete_note("b.enc")
+            # Metadata files and temporary files are not notes
+            storage.write_note(".index", b"meta")
+            self.assertEqual(watcher.poll(), [Change(DELETED, "b.enc")])
+            self.assertEqual(watcher.poll(), [])
+            # Changes this process reports itself are not repeated
+            storage.save_note(b"three", "c")
+            watcher.acknowledge("c.enc")
+            storage.delete_note("a.enc")
+            watcher.acknowledge("a.enc")
+            self.assertEqual(watcher.poll(), [])
+            watcher.close()
+            storage.delete_note("c.enc")
+
+    def test_container_snapshot_matches_stat(self):
+        backend = ContainerBackend(self.tmp.name)
+        backend.write("a.enc", b"one")
+        old = backend.snapshot()
+        self.assertEqual(old["a.enc"], tuple(backend.stat("a.enc")))
+        backend.write("b.enc", b"two")
+        backend.delete("a.enc")
+        self.assertEqual(diff_snapshots(old, backend.snapshot()), [Change(DELETED, "a.enc"), Change(ADDED, "b.enc")])
+        backend.close()
+
+    def test_update_indexes_follows_vault_notes(self):
+        vault = Vault.open("master")
+        note_index, catalog = NoteIndex.load(vault), Catalog.load(vault)
+        watcher = ChangeWatcher()
+        note = {"content": "written elsewhere", "tags": ["cli"]}
+        storage.save_note(vault.encrypt(json.dumps(note).encode()), "vaulted")
+        storage.save_note(b"not a vault note", "protected")
+        save_note_stream(io.BytesIO(b"\xff" * 100000), "attached", vault=vault)
+        changes = watcher.poll()
+        update_indexes(changes, vault, note_index, catalog)
+        self.assertEqual(NoteIndex.load(vault).lookup("elsewhere"), {"vaulted.enc"})
+        self.assertEqual(Catalog.load(vault).entries["vaulted.enc"]["tags"], ["cli"])
+        self.assertNotIn("protected.enc", catalog.entries)
+        self.assertEqual(note_index.docs["attached.enc"], [])
+        self.assertEqual(catalog.entries["attached.enc"]["size"], 100000)
+        storage.delete_note("vaulted.enc")
+        update_indexes(watcher.poll(), vault, note_index, catalog)
+        self.assertEqual(NoteIndex.load(vault).lookup("elsewhere"), set())
+        self.assertNotIn("vaulted.enc", Catalog.load(vault).entries)
+        watcher.close()
+
+if __name__ == "__main__":
+    unittest.main()